@@ -2,7 +2,9 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 import requests
+import json
 import os
+import time
 
 default_args = {
     'owner': 'mpcostpulse',
@@ -68,16 +70,27 @@ def update_locality_stats(**context):
     """Update statistics for all localities"""
     api_url = os.getenv('API_BASE_URL', 'http://backend:8000/api/v1')
     try:
-        # Get all localities
-        response = requests.get(f"{api_url}/geospatial/localities", timeout=30)
-        localities = response.json()
+        # One server-side batch job; it streams a progress line per committed chunk
+        with requests.post(
+            f"{api_url}/geospatial/localities/update-stats",
+            stream=True,
+            timeout=(30, 600)
+        ) as response:
+            response.raise_for_status()
+            progress = {}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                progress = json.loads(line)
+                print(f"Locality stats: {progress['processed']}/{progress['total']} localities processed")
         
-        for locality in localities:
-            try:
-                requests.post(f"{api_url}/geospatial/localities/{locality['id']}/update-stats",
-                             timeout=30)
-            except Exception as e:
-                print(f"Error updating stats for locality {locality['id']}: {e}")
+        if progress.get('event') == 'completed':
+            print(
+                f"Updated stats for {progress['localities_updated']} localities "
+                f"({progress['neighborhoods_updated']} neighborhoods) in {progress['elapsed_seconds']}s"
+            )
+        else:
+            print(f"Locality stats update did not complete: {progress.get('error', progress)}")
     except Exception as e:
         print(f"Error updating locality stats: {e}")
 
@@ -85,21 +98,39 @@ def aggregate_neighborhood_data(**context):
     """Aggregate neighborhood data (AQI, delivery, hygiene, amenities) for all cities"""
     api_url = os.getenv('API_BASE_URL', 'http://backend:8000/api/v1')
     cities = ['Bhopal']  # Can be extended to multiple cities
+    poll_interval_seconds = 30
+    max_wait_seconds = 6 * 60 * 60  # Refresh jobs run in the backend, the task only polls them
     
     for city in cities:
         try:
             print(f"Aggregating neighborhood data for {city}...")
-            response = requests.post(
-                f"{api_url}/recommendations/refresh/{city}",
-                timeout=300  # 5 minutes timeout for aggregation
-            )
-            if response.status_code == 200:
-                result = response.json()
-                print(f"Successfully aggregated {result.get('refreshed_count', 0)} neighborhoods in {city}")
-                if result.get('errors'):
-                    print(f"Errors: {result.get('errors')}")
-            else:
+            response = requests.post(f"{api_url}/recommendations/refresh/{city}", timeout=30)
+            if response.status_code not in (200, 202):
                 print(f"Error aggregating data for {city}: {response.status_code} - {response.text}")
+                continue
+            
+            job_id = response.json()['job_id']
+            if response.json().get('already_running'):
+                print(f"A refresh of {city} is already running, following job {job_id}")
+            deadline = time.monotonic() + max_wait_seconds
+            while True:
+                job = requests.get(f"{api_url}/recommendations/refresh/jobs/{job_id}", timeout=30).json()
+                print(f"{city}: {job['processed_localities']}/{job['total_localities']} localities processed")
+                if job['status'] in ('completed', 'failed') or time.monotonic() > deadline:
+                    break
+                time.sleep(poll_interval_seconds)
+            
+            if job['status'] == 'completed':
+                print(
+                    f"Successfully aggregated {job.get('refreshed_count', 0)} neighborhoods in {city}, "
+                    f"{job.get('skipped_count', 0)} already up to date"
+                )
+                if job.get('unlocated'):
+                    print(f"{job['unlocated_count']} localities without coordinates were not refreshed: {job['unlocated']}")
+                if job.get('errors'):
+                    print(f"Errors: {job.get('errors')}")
+            else:
+                print(f"Refresh job {job_id} for {city} ended with status {job['status']}: {job.get('error')}")
         except Exception as e:
             print(f"Error aggregating neighborhood data for {city}: {e}")
 
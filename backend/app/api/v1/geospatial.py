@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.core.database import get_db
+from typing import Dict, Iterator, List, Optional
+from app.core.database import get_db, SessionLocal
+from app.core.ndjson import ndjson_response, wants_ndjson
 from app.services.geospatial_service import GeospatialService
 from app.schemas.geospatial import LocalityResponse, LocalityStatsResponse
 
@@ -49,12 +50,28 @@ def find_nearby_localities(
     )
     return {"center": {"latitude": latitude, "longitude": longitude}, "radius_km": radius_km, "localities": localities}
 
+def _stream_heatmap_points(data_type: str) -> Iterator[Dict]:
+    """Heatmap points read with a session owned by the stream, closed once the last row is sent"""
+    db = SessionLocal()
+    try:
+        yield from GeospatialService.iter_heatmap_data(db=db, data_type=data_type)
+    finally:
+        db.close()
+
 @router.get("/heatmap")
 def get_heatmap_data(
+    http_request: Request,
     data_type: str = Query("rent", regex="^(rent|grocery|transport|cost_burden)$"),
     db: Session = Depends(get_db)
 ):
-    """Generate heatmap data for localities"""
+    """
+    Generate heatmap data for localities
+    
+    Send Accept: application/x-ndjson to stream one point per line instead
+    """
+    if wants_ndjson(http_request):
+        return ndjson_response(_stream_heatmap_points(data_type))
+    
     data = GeospatialService.generate_heatmap_data(db=db, data_type=data_type)
     return {"data_type": data_type, "points": data}
 
@@ -76,6 +93,31 @@ def calculate_isochrone(
         return {"message": "Isochrone calculation failed or API key not configured"}
     return isochrone
 
+def _stream_locality_stats_update(city: Optional[str]) -> Iterator[Dict]:
+    """Bulk stats progress, on a session owned by the stream"""
+    db = SessionLocal()
+    try:
+        yield from GeospatialService.iter_update_locality_stats(db=db, city=city)
+    finally:
+        db.close()
+
+@router.post("/localities/update-stats")
+def update_all_locality_stats(
+    city: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Calculate and update statistics for every locality, or those of a city
+    
+    Runs as one server-side batch job of set-based queries and streams its
+    progress as NDJSON: one line per committed chunk of localities, then a
+    line with event "completed" (or "error").
+    """
+    if city and not GeospatialService.get_localities(db=db, city=city):
+        from fastapi import HTTPException
+        raise HTTPException(status_code=404, detail=f"No localities found for city: {city}")
+    return ndjson_response(_stream_locality_stats_update(city))
+
 @router.post("/localities/{locality_id}/update-stats", response_model=LocalityStatsResponse)
 def update_locality_stats(
     locality_id: int,
@@ -83,5 +125,8 @@ def update_locality_stats(
 ):
     """Calculate and update statistics for a locality"""
     stats = GeospatialService.update_locality_stats(db=db, locality_id=locality_id)
+    if not stats:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=404, detail="Locality not found")
     return stats
 
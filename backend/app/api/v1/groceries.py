@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.config import settings
+from app.services.basket_pricing import DEFAULT_GROCERY_BASKET, BasketPricingService
 from app.services.grocery_service import GroceryService
 from app.schemas.grocery import GroceryStoreResponse, GroceryItemResponse
 
@@ -35,28 +37,44 @@ def get_store_items(
     )
     return items
 
+@router.get("/items/search", response_model=List[GroceryItemResponse])
+def search_grocery_items(
+    q: str = Query(..., min_length=2),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Search grocery items by name, tolerating typos and partial words"""
+    return GroceryService.search_items(db=db, query=q, limit=limit)
+
 @router.get("/cost/{locality_id}")
 def calculate_monthly_cost(
     locality_id: int,
+    policy: Optional[str] = Query(None, regex="^(first|cheapest|median)$"),
     db: Session = Depends(get_db)
 ):
     """Calculate estimated monthly grocery cost for a locality"""
-    # Default grocery basket
-    default_basket = [
-        {"name": "Rice", "quantity": 10, "unit": "kg"},
-        {"name": "Wheat", "quantity": 10, "unit": "kg"},
-        {"name": "Milk", "quantity": 30, "unit": "liter"},
-        {"name": "Eggs", "quantity": 30, "unit": "dozen"},
-        {"name": "Vegetables", "quantity": 30, "unit": "kg"},
-        {"name": "Fruits", "quantity": 15, "unit": "kg"},
-    ]
-    
     cost = GroceryService.calculate_monthly_grocery_cost(
         db=db,
         locality_id=locality_id,
-        items=default_basket
+        items=DEFAULT_GROCERY_BASKET,
+        policy=policy
     )
-    return {"locality_id": locality_id, "monthly_cost": cost, "basket": default_basket}
+    return {"locality_id": locality_id, "monthly_cost": cost, "basket": DEFAULT_GROCERY_BASKET}
+
+@router.get("/cost/city/{city}")
+def calculate_city_monthly_costs(
+    city: str,
+    policy: Optional[str] = Query(None, regex="^(first|cheapest|median)$"),
+    db: Session = Depends(get_db)
+):
+    """Estimated monthly grocery cost of every locality of a city with priced items"""
+    costs = BasketPricingService.price_localities(db=db, basket=DEFAULT_GROCERY_BASKET, city=city, policy=policy)
+    return {
+        "city": city,
+        "policy": policy or settings.GROCERY_STORE_POLICY,
+        "costs": [{"locality_id": locality_id, "monthly_cost": cost} for locality_id, cost in costs.items()],
+        "basket": DEFAULT_GROCERY_BASKET
+    }
 
 @router.post("/fetch/bigbasket")
 def fetch_bigbasket(
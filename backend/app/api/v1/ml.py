@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
-from app.core.database import get_db
+from typing import Dict, Iterator, List, Optional
+from app.core.database import get_db, SessionLocal
+from app.core.ndjson import ndjson_response
 from app.services.ml_service import MLService
+from app.models.user import User
 from app.core.security import decode_access_token
 from fastapi.security import OAuth2PasswordBearer
-from app.schemas.ml import CostPredictionRequest, CostPredictionResponse
+from app.schemas.ml import (
+    CostPredictionRequest, CostPredictionResponse, CostPredictionBatchRequest, CostPredictionBatchResponse,
+    CityCostPredictionRequest, CityCostPredictionResponse, RentClassificationResponse
+)
 
 router = APIRouter(prefix="/ml", tags=["machine-learning"])
 
@@ -50,6 +56,56 @@ def predict_cost(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@router.post("/predict-cost/localities", response_model=CostPredictionBatchResponse)
+def predict_cost_localities(
+    request: CostPredictionBatchRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Predict monthly cost of living for a user in several localities
+    
+    Takes the same user_profile as /predict-cost; all localities are scored
+    in one model call, e.g. every locality of a city to compare them.
+    """
+    try:
+        predictions = ml_service.predict_cost_localities(
+            db=db,
+            user_id=user_id,
+            user_profile=request.user_profile,
+            locality_ids=request.locality_ids
+        )
+        return {'predictions': predictions, 'count': len(predictions)}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+@router.post("/predict-cost/city", response_model=CityCostPredictionResponse)
+def predict_cost_city(
+    request: CityCostPredictionRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Rank every locality of a city by predicted monthly cost of living for a user
+    
+    Takes the same user_profile as /predict-cost. Predictions are sorted
+    cheapest first; localities without stats are listed in
+    localities_without_stats instead of being computed on the fly.
+    """
+    try:
+        return ml_service.predict_cost_city(
+            db=db,
+            user_id=user_id,
+            user_profile=request.user_profile,
+            city=request.city
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
 @router.post("/classify-rent/{listing_id}")
 def classify_rent_listing(
     listing_id: int,
@@ -66,9 +122,79 @@ def classify_rent_listing(
         return classification
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except FutureTimeoutError:
+        raise HTTPException(status_code=503, detail="Rent classifier is busy, try again later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
+def _stream_rent_classification(city: Optional[str]) -> Iterator[Dict]:
+    """
+    Bulk classification progress, on a session owned by the stream
+    
+    The run lock is taken here, once the body is being streamed, so it is
+    always released by the finally below; a run that loses the race to
+    another one reports it as its only line.
+    """
+    lock = ml_service.acquire_rent_classification_lock()
+    if lock is None:
+        yield {
+            'event': 'error',
+            'city': city,
+            'status_code': 409,
+            'error': "A rent classification run is already in progress",
+            'processed': 0
+        }
+        return
+    db = None
+    try:
+        db = SessionLocal()
+        yield from ml_service.iter_classify_rent_listings(db=db, city=city)
+    finally:
+        if db is not None:
+            db.close()
+        ml_service.release_rent_classification_lock(lock)
+
+@router.post("/rent-classifications/refresh")
+def refresh_rent_classifications(
+    city: Optional[str] = Query(None),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Classify every rent listing, or those of a city, and store the labels
+    
+    Superusers only. Runs as one server-side batch job and streams its
+    progress as NDJSON: one line per committed page of listings, then a line
+    with event "completed" (or "error"). Only one run at a time, across API
+    workers and the CLI; a second one gets 409 (or, when it starts at the
+    same moment, an "error" line with status_code 409). Results are read
+    from /rent-classifications.
+    """
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user or not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Only superusers can classify all rent listings")
+    
+    if ml_service.rent_classification_running():
+        raise HTTPException(status_code=409, detail="A rent classification run is already in progress")
+    return ndjson_response(_stream_rent_classification(city))
+
+@router.get("/rent-classifications", response_model=List[RentClassificationResponse])
+def get_rent_classifications(
+    locality_id: Optional[int] = Query(None),
+    classification: Optional[str] = Query(None, regex="^(fair|overpriced)$"),
+    limit: int = Query(100, le=1000),
+    skip: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Stored fair/overpriced labels of rent listings, without running the model"""
+    return ml_service.get_rent_classifications(
+        db=db,
+        locality_id=locality_id,
+        classification=classification,
+        limit=limit,
+        skip=skip
+    )
+
 @router.get("/models/{model_name}/version")
 def get_model_version(
     model_name: str,
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.ndjson import ndjson_response, wants_ndjson
 from app.schemas.recommendation import (
     RecommendationRequest,
     RecommendationResponse,
-    RecommendationsResponse
+    RecommendationsResponse,
+    BatchRecommendationRequest,
+    BatchRecommendationsResponse
 )
 from app.services.recommendation_service import RecommendationService
 from app.services.neighborhood_service import NeighborhoodService
+from app.services.snapshot_cache import snapshot_cache
+from app.services.refresh_executor import refresh_executor
 from app.models.geospatial import Locality
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
@@ -15,6 +20,7 @@ router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 @router.post("/neighborhoods", response_model=RecommendationsResponse)
 def get_neighborhood_recommendations(
     request: RecommendationRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """
@@ -22,14 +28,37 @@ def get_neighborhood_recommendations(
     
     - **city**: City name
     - **number_of_people**: Number of people in household
-    - **max_travel_distance_km**: Maximum travel distance preference
+    - **max_travel_distance_km**: Maximum travel distance from the workplace
     - **budget**: Monthly budget in INR
     - **property_type**: Property type (1BHK, 2BHK, 3BHK)
     - **weights**: Optional weights for different factors
     - **top_n**: Number of top recommendations to return
+    - **include_all_scores**: Also return lightweight scores for every neighborhood
+    - **workplace_latitude**, **workplace_longitude**: Optional workplace location; when set,
+      only neighborhoods within max_travel_distance_km of it are scored
+    
+    Send Accept: application/x-ndjson to stream one recommendation per line
+    (followed by the score-only records when include_all_scores is set)
     """
     try:
-        recommendations = RecommendationService.get_top_recommendations(
+        if wants_ndjson(http_request):
+            # Scoring happens here, so errors still map to a 500; records are built while streaming
+            records = RecommendationService.stream_neighborhoods(
+                db=db,
+                city=request.city,
+                number_of_people=request.number_of_people,
+                max_travel_distance_km=request.max_travel_distance_km,
+                budget=request.budget,
+                weights=request.weights,
+                property_type=request.property_type,
+                top_n=request.top_n,
+                include_all_scores=request.include_all_scores,
+                workplace_latitude=request.workplace_latitude,
+                workplace_longitude=request.workplace_longitude
+            )
+            return ndjson_response(records)
+        
+        ranked = RecommendationService.rank_neighborhoods(
             db=db,
             city=request.city,
             number_of_people=request.number_of_people,
@@ -37,19 +66,26 @@ def get_neighborhood_recommendations(
             budget=request.budget,
             weights=request.weights,
             property_type=request.property_type,
-            top_n=request.top_n
+            top_n=request.top_n,
+            include_all_scores=request.include_all_scores,
+            workplace_latitude=request.workplace_latitude,
+            workplace_longitude=request.workplace_longitude
         )
+        recommendations = ranked['recommendations']
         
         return RecommendationsResponse(
             recommendations=recommendations,
-            total_neighborhoods=len(recommendations),
+            total_neighborhoods=ranked['total_neighborhoods'],
+            all_scores=ranked['all_scores'],
             filters_applied={
                 'city': request.city,
                 'number_of_people': request.number_of_people,
                 'max_travel_distance_km': request.max_travel_distance_km,
                 'budget': request.budget,
                 'property_type': request.property_type,
-                'weights': request.weights or {}
+                'weights': request.weights or {},
+                'workplace_latitude': request.workplace_latitude,
+                'workplace_longitude': request.workplace_longitude
             }
         )
     except Exception as e:
@@ -58,21 +94,55 @@ def get_neighborhood_recommendations(
             detail=f"Error generating recommendations: {str(e)}"
         )
 
+@router.post("/neighborhoods/batch", response_model=BatchRecommendationsResponse)
+def get_batch_neighborhood_recommendations(
+    request: BatchRecommendationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Get neighborhood recommendations for many user profiles in one call
+    
+    - **city**: City name
+    - **profiles**: List of profiles (number_of_people, max_travel_distance_km, budget, property_type, weights, workplace location)
+    - **top_n**: Number of top recommendations per profile
+    """
+    try:
+        batch = RecommendationService.recommend_batch(
+            db=db,
+            city=request.city,
+            profiles=[profile.model_dump() for profile in request.profiles],
+            top_n=request.top_n
+        )
+        
+        return BatchRecommendationsResponse(
+            city=request.city,
+            total_neighborhoods=batch['total_neighborhoods'],
+            results=batch['results']
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating batch recommendations: {str(e)}"
+        )
+
 @router.post("/aggregate/{locality_id}")
 def aggregate_neighborhood_data(
     locality_id: int,
     city: str,
+    force: bool = True,
     db: Session = Depends(get_db)
 ):
     """
     Trigger aggregation of neighborhood data for a specific locality
-    This scrapes and aggregates all data sources
+    This scrapes and aggregates all data sources, or only the stale ones
+    with force=false
     """
     try:
         neighborhood_data = NeighborhoodService.aggregate_neighborhood_data(
             db=db,
             locality_id=locality_id,
-            city=city
+            city=city,
+            force=force
         )
         
         if not neighborhood_data:
@@ -85,7 +155,8 @@ def aggregate_neighborhood_data(
             "message": "Neighborhood data aggregated successfully",
             "neighborhood_id": neighborhood_data.id,
             "locality_id": neighborhood_data.locality_id,
-            "last_scraped_at": neighborhood_data.last_scraped_at
+            "last_scraped_at": neighborhood_data.last_scraped_at,
+            "refreshed_sources": (neighborhood_data.data_source or {}).get('refreshed_sources', [])
         }
     except HTTPException:
         raise
@@ -95,55 +166,94 @@ def aggregate_neighborhood_data(
             detail=f"Error aggregating data: {str(e)}"
         )
 
-@router.post("/refresh/{city}")
+@router.post("/refresh/{city}", status_code=status.HTTP_202_ACCEPTED)
 def refresh_city_neighborhoods(
     city: str,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Refresh all neighborhood data for a city
-    This re-scrapes and aggregates data for all localities in the city
+    Start a refresh of all neighborhood data for a city
+    This re-scrapes and aggregates data for all localities in the city in a
+    background job; poll GET /recommendations/refresh/jobs/{job_id} for progress.
+    Only stale sources are refreshed unless force=true. When the city is
+    already being refreshed, the running job is returned instead.
     """
     try:
-        # Get all localities for the city
-        localities = db.query(Locality).filter(Locality.city == city).all()
+        # Check the city has localities before starting a job
+        locality_count = db.query(Locality).filter(Locality.city == city).count()
         
-        if not localities:
+        if not locality_count:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No localities found for city: {city}"
             )
         
-        refreshed = []
-        errors = []
-        
-        for locality in localities:
-            try:
-                neighborhood_data = NeighborhoodService.refresh_neighborhood_data(
-                    db=db,
-                    locality_id=locality.id,
-                    city=city
-                )
-                if neighborhood_data:
-                    refreshed.append(locality.id)
-            except Exception as e:
-                errors.append({
-                    'locality_id': locality.id,
-                    'locality_name': locality.name,
-                    'error': str(e)
-                })
+        job, created = refresh_executor.submit(db=db, cities=[city], force=force)
         
         return {
-            "message": f"Refreshed {len(refreshed)} neighborhoods",
-            "refreshed_count": len(refreshed),
-            "refreshed_localities": refreshed,
-            "errors": errors
+            "message": (
+                f"Refresh of {locality_count} localities started" if created
+                else f"A refresh of {city} is already running"
+            ),
+            "job_id": job.id,
+            "status": job.status,
+            "already_running": not created,
+            "status_url": f"/api/v1/recommendations/refresh/jobs/{job.id}"
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error refreshing neighborhoods: {str(e)}"
+            detail=f"Error starting neighborhood refresh: {str(e)}"
+        )
+
+@router.get("/refresh/jobs/{job_id}")
+def get_refresh_job(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the progress of a neighborhood refresh job"""
+    job = refresh_executor.get_job(db=db, job_id=job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Refresh job not found: {job_id}"
         )
+    return refresh_executor.job_status(job)
+
+
+@router.get("/normalization/{city}")
+def get_city_normalization(
+    city: str,
+    db: Session = Depends(get_db)
+):
+    """Get the normalization bounds materialized by the last refresh of a city"""
+    rows = RecommendationService.get_city_normalization(db=db, city=city)
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No normalization data for city: {city}"
+        )
+    return [
+        {
+            'property_type': row.property_type,
+            'rent_min': row.rent_min,
+            'rent_max': row.rent_max,
+            'grocery_min': row.grocery_min,
+            'grocery_max': row.grocery_max,
+            'aqi_min': row.aqi_min,
+            'aqi_max': row.aqi_max,
+            'hygiene_min': row.hygiene_min,
+            'hygiene_max': row.hygiene_max,
+            'neighborhoods_count': row.neighborhoods_count,
+            'computed_at': row.computed_at
+        }
+        for row in rows
+    ]
 
+@router.get("/cache/stats")
+def get_snapshot_cache_stats():
+    """Hit/miss counters and cached cities of the recommendation snapshot cache"""
+    return snapshot_cache.stats()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # Database
@@ -19,6 +19,10 @@ class Settings(BaseSettings):
     AQICN_TOKEN: str = "demo"  # For AQI data (free tier)
     ZOMATO_API_KEY: str = ""  # For restaurant ratings and delivery
     GOOGLE_PLACES_API_KEY: str = ""  # For amenities and restaurant data
+    GOOGLE_PLACES_BASE_URL: str = "https://maps.googleapis.com/maps/api/place"  # Point at a stub server in tests
+    GOOGLE_PLACES_DAILY_QUOTA: int = 5000  # Requests (pages) per UTC day across all processes (GEO_CACHE_BACKEND store), 0 for no limit
+    GOOGLE_PLACES_MAX_PAGES: int = 3  # Nearby Search returns at most 3 pages of 20
+    GOOGLE_PLACES_PAGE_DELAY_SECONDS: float = 2.0  # Wait before requesting a next_page_token
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173"]
@@ -26,6 +30,75 @@ class Settings(BaseSettings):
     # Scraping
     SCRAPY_DELAY: float = 1.0
     USER_AGENT: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    SCRAPING_TIMEOUT_SECONDS: float = 10.0  # Read timeout of external API calls
+    SCRAPING_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OVERPASS_QUERY_TIMEOUT_SECONDS: int = 60  # Server-side [timeout:N] of Overpass queries, the client waits a little longer
+    SCRAPING_MAX_RETRIES: int = 3  # Retries on connection errors and 429/5xx, with exponential backoff
+    SCRAPING_RETRY_BACKOFF_SECONDS: float = 0.5
+    SCRAPING_POOL_MAXSIZE: int = 10  # Kept-alive connections per external API host
+    SCRAPING_POOL_SIZES: Dict[str, int] = {"maps.googleapis.com": 20}  # Per-host overrides
+    SCRAPING_KEEPALIVE_SECONDS: float = 60.0
+    SCRAPING_MAX_CONCURRENCY_PER_HOST: int = 4  # Concurrent requests per external API host (async aggregation)
+    SCRAPING_DEFAULT_RATE_LIMIT: float = 10.0  # Requests per second per external API host
+    SCRAPING_RATE_LIMITS: Dict[str, float] = {"overpass-api.de": 2.0}  # Per-host overrides
+    
+    # Grid-cell cache of external geo API results, keyed by source, geohash, radius and query
+    GEO_CACHE_BACKEND: str = "postgres"  # 'postgres' (geo_api_cache table), 'sqlite' or 'none'
+    GEO_CACHE_SQLITE_PATH: str = "/tmp/mpcostpulse/geo_api_cache.sqlite3"
+    GEO_CACHE_TTL_SECONDS: Dict[str, int] = {
+        "aqi": 3600,
+        "delivery": 86400,
+        "hygiene": 604800,
+        "grocery": 2592000,
+        "amenities": 2592000,
+        "overpass": 2592000  # Raw Overpass elements (training runs)
+    }
+    GEO_CACHE_GEOHASH_PRECISION: Dict[str, int] = {"aqi": 4}  # ~20 km cells, one station reading per city
+    GEO_CACHE_DEFAULT_PRECISION: int = 6  # ~1.2 x 0.6 km cells
+    
+    # Local OSM points of interest (pois table, loaded by ingest_osm_pois.py)
+    POI_LOCAL_INDEX_ENABLED: bool = True  # Count amenities and grocery stores from pois when it has data
+    POI_AVAILABILITY_TTL_SECONDS: int = 300  # How long the "pois has data" check is cached
+    
+    # Neighborhood refresh jobs
+    REFRESH_MAX_WORKERS: int = 4  # Localities batches refreshed in parallel, each with its own session
+    REFRESH_BATCH_SIZE: int = 10  # Localities per commit
+    REFRESH_HEARTBEAT_SECONDS: int = 30  # How often a running job records that its process is alive
+    REFRESH_JOB_STALE_SECONDS: int = 300  # Pending/running jobs without a heartbeat this long are failed
+    # How long each external source of neighborhood_data stays fresh; rent and
+    # grocery cost are recomputed only when their rows change
+    NEIGHBORHOOD_SOURCE_MAX_AGE_SECONDS: Dict[str, int] = {
+        "aqi": 3600,
+        "delivery": 86400,
+        "hygiene": 604800,
+        "grocery": 604800,
+        "amenities": 2592000
+    }
+    NEIGHBORHOOD_SOURCE_SLACK_SECONDS: int = 1800  # Sources due this soon are refreshed now, runs drift a little
+    
+    # Bulk locality stats update
+    LOCALITY_STATS_CHUNK_SIZE: int = 500  # Localities per transaction
+    
+    # Grocery basket pricing
+    GROCERY_STORE_POLICY: str = "first"  # Unit price per basket item: 'first', 'cheapest' or 'median' store
+    GROCERY_MATCHER_REFRESH_SECONDS: int = 300  # How often the in-memory item index checks grocery_items for changes
+    
+    # Rent classifier inference, concurrent /ml/classify-rent requests share one forward pass
+    RENT_CLASSIFIER_DEVICE: str = "cpu"
+    RENT_CLASSIFIER_NUM_THREADS: int = 0  # torch intra-op threads, 0 keeps torch's default
+    RENT_CLASSIFIER_MAX_BATCH_SIZE: int = 16  # Listings per forward pass
+    RENT_CLASSIFIER_MAX_WAIT_MS: float = 5.0  # How long a request waits for others to join its batch
+    RENT_CLASSIFIER_TIMEOUT_SECONDS: float = 30.0  # How long a request waits for its classification
+    
+    # Bulk rent listing classification (rent_listing_classifications table)
+    RENT_CLASSIFICATION_PAGE_SIZE: int = 1000  # Listings per keyset page and transaction
+    RENT_CLASSIFICATION_FORWARD_BATCH_SIZE: int = 64  # Listings per forward pass, grouped by text length
+    
+    # Recommendations
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = 3600  # Safety net, snapshots are invalidated on refresh
+    SNAPSHOT_CACHE_BACKEND: str = "memory"  # 'memory' (per worker), 'mmap' (shared memory on one host) or 'redis'
+    SNAPSHOT_CACHE_DIR: str = "/dev/shm/mpcostpulse/snapshots"
+    REDIS_URL: str = "redis://localhost:6379/0"
     
     # Airflow
     AIRFLOW_HOME: str = "/opt/airflow"
@@ -28,14 +28,24 @@ def init_db():
     from app.models import (
         User, RentListing, GroceryStore, GroceryItem, 
         TransportRoute, TransportFare, InflationData, 
-        Locality, LocalityStats, MLModelVersion, Prediction, OTP, NeighborhoodData
+        Locality, LocalityStats, MLModelVersion, Prediction, RentListingClassification, OTP, NeighborhoodData,
+        CityNormalization, NeighborhoodFactors, RefreshJob, PointOfInterest, GeoApiCacheEntry, ApiQuotaUsage
     )
     
     with engine.connect() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis_topology;"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
         conn.commit()
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips columns and indexes added to tables that already exist
+    with engine.connect() as conn:
+        conn.execute(text("ALTER TABLE refresh_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;"))
+        conn.execute(text("ALTER TABLE refresh_jobs ADD COLUMN IF NOT EXISTS unlocated JSONB;"))
+        conn.commit()
+    for index in list(GroceryItem.__table__.indexes) + list(RefreshJob.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
 
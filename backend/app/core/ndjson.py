@@ -0,0 +1,56 @@
+"""
+Newline-delimited JSON streaming helpers
+Large list endpoints can stream one record per line instead of building one
+big JSON document, when the client sends Accept: application/x-ndjson
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(value: Any):
+    """Encode the non-JSON types found in service records (datetimes, numpy scalars)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def encode_line(record: Dict) -> bytes:
+        """Encode one record as a JSON line"""
+        return orjson.dumps(
+            record,
+            default=_default,
+            option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY
+        )
+else:
+    def encode_line(record: Dict) -> bytes:
+        """Encode one record as a JSON line"""
+        return (json.dumps(record, default=_default, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True when the client asked for an NDJSON stream"""
+    return NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
+
+
+def iter_ndjson(records: Iterable[Dict]) -> Iterator[bytes]:
+    """Encode records lazily, one line per record"""
+    for record in records:
+        yield encode_line(record)
+
+
+def ndjson_response(records: Iterable[Dict]) -> StreamingResponse:
+    """Stream records as NDJSON, bypassing response model validation"""
+    return StreamingResponse(iter_ndjson(records), media_type=NDJSON_MEDIA_TYPE)
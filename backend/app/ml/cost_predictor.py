@@ -18,6 +18,7 @@ class CostPredictor:
     def __init__(self, model_path: Optional[str] = None):
         self.model = None
         self.scaler = StandardScaler()
+        self._feature_importance = None
         self.feature_names = [
             'locality_avg_rent_2bhk',
             'locality_avg_grocery_cost',
@@ -42,7 +43,11 @@ class CostPredictor:
     
     def prepare_features(self, user_profile: Dict, locality_stats: Dict) -> np.ndarray:
         """Prepare feature vector from user profile and locality stats"""
-        features = np.array([
+        return self.prepare_features_batch([user_profile], [locality_stats])
+    
+    @staticmethod
+    def _feature_row(user_profile: Dict, locality_stats: Dict) -> List:
+        return [
             locality_stats.get('avg_rent_2bhk', 0),
             locality_stats.get('avg_grocery_cost_monthly', 0),
             locality_stats.get('avg_transport_cost_monthly', 0),
@@ -60,8 +65,27 @@ class CostPredictor:
             locality_stats.get('avg_restaurant_rating', 3.5),
             locality_stats.get('schools_count', 0),
             locality_stats.get('parks_count', 0),
-        ])
-        return features.reshape(1, -1)
+        ]
+    
+    def prepare_features_batch(self, user_profiles: List[Dict], locality_stats_list: List[Dict]) -> np.ndarray:
+        """Prepare one feature matrix, a row per (user profile, locality stats) pair"""
+        if len(user_profiles) != len(locality_stats_list):
+            raise ValueError("user_profiles and locality_stats_list must have the same length")
+        rows = [
+            self._feature_row(user_profile, locality_stats)
+            for user_profile, locality_stats in zip(user_profiles, locality_stats_list)
+        ]
+        # Missing values (None) become NaN, which XGBoost treats as missing
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(self.feature_names))
+    
+    @property
+    def feature_importance(self) -> Dict[str, float]:
+        """Feature importance of the loaded model, computed once per model"""
+        if self._feature_importance is None:
+            self._feature_importance = {
+                name: float(val) for name, val in zip(self.feature_names, self.model.feature_importances_)
+            }
+        return self._feature_importance
     
     def train(self, training_data: pd.DataFrame, target_column: str = 'total_monthly_cost'):
         """Train the cost prediction model"""
@@ -90,6 +114,7 @@ class CostPredictor:
         )
         
         self.model.fit(X_train_scaled, y_train)
+        self._feature_importance = None
         
         # Evaluate
         train_score = self.model.score(X_train_scaled, y_train)
@@ -97,42 +122,46 @@ class CostPredictor:
         
         logger.info(f"Model trained - Train R²: {train_score:.4f}, Test R²: {test_score:.4f}")
         
-        # Convert feature importance to native Python types
-        feature_importance = {
-            name: float(val) for name, val in zip(self.feature_names, self.model.feature_importances_)
-        }
-        
         return {
             'train_r2': float(train_score),
             'test_r2': float(test_score),
-            'feature_importance': feature_importance
+            'feature_importance': dict(self.feature_importance)
         }
     
     def predict(self, user_profile: Dict, locality_stats: Dict) -> Dict:
         """Predict monthly cost of living"""
+        return self.predict_batch([user_profile], [locality_stats])[0]
+    
+    def predict_batch(self, user_profiles: List[Dict], locality_stats_list: List[Dict]) -> List[Dict]:
+        """
+        Predict monthly cost of living for many (user profile, locality stats) pairs
+        
+        All pairs go through one scaler transform and one model call; results
+        are in input order.
+        """
         if self.model is None:
             raise ValueError("Model not loaded or trained")
+        if not locality_stats_list:
+            return []
         
-        features = self.prepare_features(user_profile, locality_stats)
+        features = self.prepare_features_batch(user_profiles, locality_stats_list)
         features_scaled = self.scaler.transform(features)
+        predictions = self.model.predict(features_scaled)
+        importance = self.feature_importance
         
-        prediction = self.model.predict(features_scaled)[0]
-        
-        # Get feature importance for explanation and convert numpy types to native Python types
-        importance = {
-            name: float(val) for name, val in zip(self.feature_names, self.model.feature_importances_)
-        }
-        
-        return {
-            'predicted_monthly_cost': float(prediction),
-            'breakdown': {
-                'rent': float(locality_stats.get('avg_rent_2bhk', 0)),
-                'groceries': float(locality_stats.get('avg_grocery_cost_monthly', 0)),
-                'transport': float(locality_stats.get('avg_transport_cost_monthly', 0)),
-            },
-            'feature_importance': importance,
-            'confidence': 0.85  # Placeholder - could calculate from prediction variance
-        }
+        return [
+            {
+                'predicted_monthly_cost': float(prediction),
+                'breakdown': {
+                    'rent': float(locality_stats.get('avg_rent_2bhk') or 0),
+                    'groceries': float(locality_stats.get('avg_grocery_cost_monthly') or 0),
+                    'transport': float(locality_stats.get('avg_transport_cost_monthly') or 0),
+                },
+                'feature_importance': dict(importance),
+                'confidence': 0.85  # Placeholder - could calculate from prediction variance
+            }
+            for prediction, locality_stats in zip(predictions, locality_stats_list)
+        ]
     
     def save_model(self, model_path: str):
         """Save model and scaler"""
@@ -153,5 +182,6 @@ class CostPredictor:
         self.model = model_data['model']
         self.scaler = model_data['scaler']
         self.feature_names = model_data.get('feature_names', self.feature_names)
+        self._feature_importance = None
         logger.info(f"Model loaded from {model_path}")
 
@@ -0,0 +1,115 @@
+"""
+Dynamic micro-batching for model inference
+Concurrent callers submit one item each; a worker thread collects items
+until max_batch_size is reached or max_wait_ms has passed since the first
+one, runs the batch handler once and hands every caller its own result.
+When the handler fails on a batch, its items are retried one by one so only
+the failing item's caller gets the exception.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+
+class MicroBatcher:
+    """Groups concurrent calls into batches for one batch handler"""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher"
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item; the future resolves to the handler's result for it"""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Queue an item and wait for its result, raising concurrent.futures.TimeoutError after timeout seconds"""
+        future = self.submit(item)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Dropped if the worker has not picked it up yet
+            future.cancel()
+            raise
+
+    def _collect(self) -> List:
+        """Block for a first item, then gather more until the batch is full or the wait is over"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _handle(self, batch: List) -> None:
+        """Run the handler on a batch and resolve its futures, raising when the handler fails"""
+        results = self.handler([item for item, _ in batch])
+        if len(results) != len(batch):
+            raise RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(batch)} items")
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            # Callers may cancel a queued future, those items are dropped
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._handle(batch)
+            except BaseException as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._retry_one_by_one(batch)
+
+    def _retry_one_by_one(self, batch: List):
+        """Isolate the items that made a batch fail, the others still get their results"""
+        with self._lock:
+            self.failed_batches += 1
+        for item, future in batch:
+            try:
+                self._handle([(item, future)])
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'failed_batches': self.failed_batches,
+                'queued': self._queue.qsize()
+            }
@@ -56,50 +56,71 @@ class RentClassifier:
     
     def classify(self, listing: Dict, locality_avg_rent: Optional[float] = None) -> Dict:
         """Classify a rent listing as fair or overpriced"""
+        return self.classify_batch([listing], [locality_avg_rent])[0]
+    
+    def classify_batch(
+        self,
+        listings: List[Dict],
+        locality_avg_rents: Optional[List[Optional[float]]] = None
+    ) -> List[Dict]:
+        """
+        Classify rent listings in one forward pass
+        
+        Sequences are padded to the longest listing of the batch rather than
+        to max_length; results are in input order.
+        """
+        if not listings:
+            return []
+        locality_avg_rents = locality_avg_rents or [None] * len(listings)
+        
         # Prepare text
-        text = self.prepare_text_features(listing)
+        texts = [self.prepare_text_features(listing) for listing in listings]
         
         # Tokenize
         inputs = self.tokenizer(
-            text,
+            texts,
             truncation=True,
-            padding=True,
+            padding='longest',
             max_length=512,
             return_tensors='pt'
         ).to(self.device)
         
-        # Get prediction
+        # Get predictions
         with torch.no_grad():
             outputs = self.model(**inputs)
-            logits = outputs.logits
-            probabilities = torch.softmax(logits, dim=-1)
-        
-        # Get predicted class and confidence
-        predicted_class = torch.argmax(probabilities, dim=-1).item()
-        confidence = probabilities[0][predicted_class].item()
-        
-        # Compare with locality average if available
-        price_comparison = None
-        if locality_avg_rent and listing.get('rent_amount'):
-            rent_amount = listing['rent_amount']
-            diff_percent = ((rent_amount - locality_avg_rent) / locality_avg_rent) * 100
-            price_comparison = {
-                'listing_rent': float(rent_amount),
-                'locality_avg': float(locality_avg_rent),
-                'difference_percent': float(diff_percent)
+            probabilities = torch.softmax(outputs.logits, dim=-1).cpu()
+        
+        # Get predicted classes and confidences
+        predicted_classes = torch.argmax(probabilities, dim=-1).tolist()
+        probabilities = probabilities.tolist()
+        
+        return [
+            {
+                'classification': 'fair' if predicted_class == 0 else 'overpriced',
+                'confidence': float(probs[predicted_class]),
+                'probabilities': {
+                    'fair': float(probs[0]),
+                    'overpriced': float(probs[1])
+                },
+                'price_comparison': self._price_comparison(listing, locality_avg_rent)
             }
-        
-        result = {
-            'classification': 'fair' if predicted_class == 0 else 'overpriced',
-            'confidence': float(confidence),
-            'probabilities': {
-                'fair': float(probabilities[0][0].item()),
-                'overpriced': float(probabilities[0][1].item())
-            },
-            'price_comparison': price_comparison
+            for listing, locality_avg_rent, predicted_class, probs in zip(
+                listings, locality_avg_rents, predicted_classes, probabilities
+            )
+        ]
+    
+    @staticmethod
+    def _price_comparison(listing: Dict, locality_avg_rent: Optional[float]) -> Optional[Dict]:
+        """Compare with locality average if available"""
+        if not locality_avg_rent or not listing.get('rent_amount'):
+            return None
+        rent_amount = listing['rent_amount']
+        diff_percent = ((rent_amount - locality_avg_rent) / locality_avg_rent) * 100
+        return {
+            'listing_rent': float(rent_amount),
+            'locality_avg': float(locality_avg_rent),
+            'difference_percent': float(diff_percent)
         }
-        
-        return result
     
     def train(self, training_data: List[Dict], labels: List[int], epochs: int = 3):
         """Fine-tune the model on training data"""
@@ -2,11 +2,11 @@ from app.models.rent import RentListing
 from app.models.grocery import GroceryItem, GroceryStore
 from app.models.transport import TransportRoute, TransportFare
 from app.models.inflation import InflationData
-from app.models.geospatial import Locality, LocalityStats
+from app.models.geospatial import Locality, LocalityStats, PointOfInterest
 from app.models.user import User
-from app.models.ml_models import MLModelVersion, Prediction
+from app.models.ml_models import MLModelVersion, Prediction, RentListingClassification
 from app.models.otp import OTP
-from app.models.neighborhood import NeighborhoodData
+from app.models.neighborhood import NeighborhoodData, CityNormalization, NeighborhoodFactors, RefreshJob, GeoApiCacheEntry, ApiQuotaUsage
 
 __all__ = [
     "RentListing",
@@ -17,10 +17,17 @@ __all__ = [
     "InflationData",
     "Locality",
     "LocalityStats",
+    "PointOfInterest",
     "User",
     "MLModelVersion",
     "Prediction",
+    "RentListingClassification",
     "OTP",
-    "NeighborhoodData"
+    "NeighborhoodData",
+    "CityNormalization",
+    "NeighborhoodFactors",
+    "RefreshJob",
+    "GeoApiCacheEntry",
+    "ApiQuotaUsage"
 ]
 
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
-from geoalchemy2 import Geometry
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Text, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from geoalchemy2 import Geometry, Geography
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -40,3 +41,20 @@ class LocalityStats(Base):
     
     locality = relationship("Locality", back_populates="stats")
 
+class PointOfInterest(Base):
+    """Amenity or store loaded from an OpenStreetMap extract (see ingest_osm_pois.py)"""
+    __tablename__ = "pois"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    osm_type = Column(String, nullable=False)  # node, way or relation
+    osm_id = Column(BigInteger, nullable=False)
+    category = Column(String, nullable=False, index=True)  # hospital, school, park, grocery_store, ...
+    name = Column(String)
+    location = Column(Geography('POINT', srid=4326), nullable=False)  # GiST indexed, distances in meters
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    tags = Column(JSONB)
+    source = Column(String)  # Extract file name
+    imported_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (UniqueConstraint('osm_type', 'osm_id', 'category'),)
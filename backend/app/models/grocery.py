@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -37,4 +37,9 @@ class GroceryItem(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     store = relationship("GroceryStore", back_populates="items")
+    
+    # Trigram index for substring and fuzzy name search (needs the pg_trgm extension)
+    __table_args__ = (
+        Index('ix_grocery_items_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
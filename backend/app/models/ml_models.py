@@ -30,3 +30,19 @@ class Prediction(Base):
     
     user = relationship("User", backref="predictions")
 
+
+class RentListingClassification(Base):
+    """Latest fair/overpriced label of a rent listing, written by the bulk classification job"""
+    __tablename__ = "rent_listing_classifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    listing_id = Column(Integer, ForeignKey("rent_listings.id", ondelete="CASCADE"), unique=True, nullable=False)
+    locality_id = Column(Integer, ForeignKey("localities.id"), index=True)
+    classification = Column(String, nullable=False, index=True)  # 'fair' or 'overpriced'
+    confidence = Column(Float)
+    probabilities = Column(JSON)  # {'fair': ..., 'overpriced': ...}, model predictions only
+    locality_avg_rent = Column(Float)  # Average rent of the locality and property type at classification time
+    difference_percent = Column(Float)  # Listing rent vs locality_avg_rent
+    model_name = Column(String, nullable=False)  # 'rent_classifier' or 'rule_based'
+    model_version = Column(String)
+    classified_at = Column(DateTime, server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -56,9 +56,90 @@ class NeighborhoodData(Base):
     
     # Metadata
     last_scraped_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    data_source = Column(JSONB)  # Store source URLs and timestamps
+    data_source = Column(JSONB)  # Sources and per-source refresh state (see NeighborhoodService.plan_refresh)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     locality = relationship("Locality", backref="neighborhood_data")
 
+class CityNormalization(Base):
+    """Min/max bounds used to normalize recommendation factors, per city and property type"""
+    __tablename__ = "city_normalization"
+    __table_args__ = (UniqueConstraint('city', 'property_type'),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    city = Column(String, nullable=False, index=True)
+    property_type = Column(String, nullable=False)  # '1BHK', '2BHK', '3BHK'
+    
+    rent_min = Column(Float)
+    rent_max = Column(Float)
+    grocery_min = Column(Float)
+    grocery_max = Column(Float)
+    aqi_min = Column(Float)
+    aqi_max = Column(Float)
+    hygiene_min = Column(Float)  # Over positive ratings only
+    hygiene_max = Column(Float)
+    neighborhoods_count = Column(Integer, default=0)
+    
+    computed_at = Column(DateTime, server_default=func.now())
+
+class NeighborhoodFactors(Base):
+    """Precomputed normalized recommendation factors (0-1) of a neighborhood"""
+    __tablename__ = "neighborhood_factors"
+    __table_args__ = (UniqueConstraint('neighborhood_id', 'property_type'),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    neighborhood_id = Column(Integer, ForeignKey("neighborhood_data.id", ondelete="CASCADE"), nullable=False)
+    city = Column(String, nullable=False, index=True)
+    property_type = Column(String, nullable=False)  # '1BHK', '2BHK', '3BHK'
+    
+    rent_factor = Column(Float)  # NULL when every neighborhood has the same rent (resolved against the budget)
+    grocery_factor = Column(Float)
+    aqi_factor = Column(Float)
+    hygiene_factor = Column(Float)
+    amenities_factor = Column(Float)
+    connectivity_factor = Column(Float)
+    delivery_factor = Column(Float)
+    
+    computed_at = Column(DateTime, server_default=func.now())
+
+class RefreshJob(Base):
+    """Background refresh of the neighborhood data of one or more cities"""
+    __tablename__ = "refresh_jobs"
+    
+    id = Column(String, primary_key=True)  # uuid4 hex
+    cities = Column(JSONB, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'running', 'completed', 'failed'
+    
+    total_localities = Column(Integer, default=0)
+    processed_localities = Column(Integer, default=0)
+    refreshed_count = Column(Integer, default=0)
+    errors = Column(JSONB)  # Per-locality errors
+    unlocated = Column(JSONB)  # Localities without coordinates, not refreshed
+    normalization = Column(JSONB)  # Materialized normalization summary per city
+    error = Column(Text)  # Set when the whole job failed
+    
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # Touched by the process running the job, stale jobs are failed
+    
+    __table_args__ = (Index('ix_refresh_jobs_status', 'status'),)
+
+class GeoApiCacheEntry(Base):
+    """Cached external geo API result for one grid cell (see services/geo_cache.py)"""
+    __tablename__ = "geo_api_cache"
+    
+    key = Column(String, primary_key=True)  # source:geohash:radius_m:query_type
+    source = Column(String, nullable=False, index=True)  # 'aqi', 'amenities', 'grocery', ...
+    response = Column(JSONB, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class ApiQuotaUsage(Base):
+    """Requests made to a rate-limited external API in one period, shared by every process"""
+    __tablename__ = "api_quota_usage"
+    
+    key = Column(String, primary_key=True)  # api:period, e.g. google_places:2024-01-31 (UTC day)
+    used = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
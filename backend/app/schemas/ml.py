@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+from datetime import datetime
+from typing import Dict, List, Optional
 
 class CostPredictionRequest(BaseModel):
     """Request schema for cost prediction"""
@@ -13,3 +14,52 @@ class CostPredictionResponse(BaseModel):
     confidence: float
     model_available: bool
 
+
+class CostPredictionBatchRequest(BaseModel):
+    """Request schema for cost prediction in several localities"""
+    user_profile: Dict = Field(..., description="User profile with income, family_size, etc.")
+    locality_ids: List[int] = Field(..., min_length=1, max_length=1000, description="Locality IDs for prediction")
+
+class LocalityCostPrediction(CostPredictionResponse):
+    """Cost prediction for one locality"""
+    locality_id: int
+    locality_name: str
+    feature_importance: Optional[Dict] = None
+
+class CostPredictionBatchResponse(BaseModel):
+    """Response schema for cost prediction in several localities"""
+    predictions: List[LocalityCostPrediction]
+    count: int
+
+class CityCostPredictionRequest(BaseModel):
+    """Request schema for cost prediction in every locality of a city"""
+    user_profile: Dict = Field(..., description="User profile with income, family_size, etc.")
+    city: str = Field(..., min_length=1, description="City whose localities are ranked")
+
+class RankedCostPrediction(LocalityCostPrediction):
+    """Cost prediction for one locality and its rank in the city, 1 = cheapest"""
+    rank: int
+
+class CityCostPredictionResponse(BaseModel):
+    """Response schema for cost prediction in every locality of a city"""
+    city: str
+    predictions: List[RankedCostPrediction]
+    count: int
+    feature_importance: Optional[Dict] = None
+    localities_without_stats: List[int] = []
+
+class RentClassificationResponse(BaseModel):
+    """Stored classification of a rent listing"""
+    listing_id: int
+    locality_id: Optional[int]
+    classification: str
+    confidence: Optional[float]
+    probabilities: Optional[Dict]
+    locality_avg_rent: Optional[float]
+    difference_percent: Optional[float]
+    model_name: str
+    model_version: Optional[str]
+    classified_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
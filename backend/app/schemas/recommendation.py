@@ -14,6 +14,9 @@ class RecommendationRequest(BaseModel):
         description="Optional weights for factors (rent, grocery_cost, delivery_availability, aqi, hygiene, amenities, connectivity)"
     )
     top_n: int = Field(default=10, ge=1, le=50, description="Number of top recommendations to return")
+    workplace_latitude: Optional[float] = Field(default=None, ge=-90, le=90, description="Workplace latitude; with workplace_longitude, limits results to max_travel_distance_km")
+    workplace_longitude: Optional[float] = Field(default=None, ge=-180, le=180, description="Workplace longitude")
+    include_all_scores: bool = Field(default=False, description="Also return lightweight scores for every neighborhood")
 
 class RecommendationResponse(BaseModel):
     """Response schema for a single neighborhood recommendation"""
@@ -39,11 +42,49 @@ class RecommendationResponse(BaseModel):
     grocery_stores_count: Optional[int] = 0
     latitude: Optional[float]
     longitude: Optional[float]
+    distance_km: Optional[float] = None
     normalized_scores: Dict[str, float]
 
+class NeighborhoodScore(BaseModel):
+    """Lightweight score of a neighborhood outside the detailed recommendations"""
+    neighborhood_id: int
+    locality_id: int
+    score: float
+
 class RecommendationsResponse(BaseModel):
     """Response schema for recommendations list"""
     recommendations: List[RecommendationResponse]
     total_neighborhoods: int
     filters_applied: Dict
+    all_scores: Optional[List[NeighborhoodScore]] = None
+
+
+class RecommendationProfile(BaseModel):
+    """One user profile in a batch recommendation request"""
+    number_of_people: int = Field(..., ge=1, le=10, description="Number of people in household")
+    max_travel_distance_km: float = Field(..., ge=0, le=50, description="Maximum travel distance in km")
+    budget: float = Field(..., ge=0, description="Monthly budget in INR")
+    property_type: str = Field(default="2BHK", description="Property type: 1BHK, 2BHK, or 3BHK")
+    weights: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Optional weights for factors (rent, grocery_cost, delivery_availability, aqi, hygiene, amenities, connectivity)"
+    )
+    workplace_latitude: Optional[float] = Field(default=None, ge=-90, le=90, description="Workplace latitude; with workplace_longitude, limits results to max_travel_distance_km")
+    workplace_longitude: Optional[float] = Field(default=None, ge=-180, le=180, description="Workplace longitude")
+
+class BatchRecommendationRequest(BaseModel):
+    """Request schema for scoring many user profiles against one city"""
+    city: str = Field(..., description="City name")
+    profiles: List[RecommendationProfile] = Field(..., min_length=1, max_length=1000, description="User profiles to score")
+    top_n: int = Field(default=10, ge=1, le=50, description="Number of top recommendations per profile")
+
+class ProfileRecommendations(BaseModel):
+    """Top recommendations for one profile of a batch request"""
+    profile_index: int
+    recommendations: List[RecommendationResponse]
 
+class BatchRecommendationsResponse(BaseModel):
+    """Response schema for batch recommendations"""
+    city: str
+    total_neighborhoods: int
+    results: List[ProfileRecommendations]
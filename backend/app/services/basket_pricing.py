@@ -0,0 +1,170 @@
+"""
+Grocery basket pricing for many localities at once
+Basket names are resolved to grocery item ids by the grocery matcher, the
+priced items of the active stores of the requested localities (or a whole
+city) are fetched in one query, and unit prices are picked per locality
+with NumPy group reductions according to a store-selection policy.
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from app.core.config import settings
+from app.models.geospatial import Locality
+from app.models.grocery import GroceryStore, GroceryItem
+from app.services.grocery_matcher import grocery_matcher, is_category_product
+
+# Standard monthly grocery basket, priced into locality stats and recommendations
+MONTHLY_GROCERY_BASKET = [
+    {"name": "Rice", "quantity": 10, "unit": "kg"},
+    {"name": "Wheat", "quantity": 10, "unit": "kg"},
+    {"name": "Milk", "quantity": 30, "unit": "liter"},
+    {"name": "Eggs", "quantity": 30, "unit": "dozen"},
+    {"name": "Onion", "quantity": 5, "unit": "kg"},
+    {"name": "Potato", "quantity": 5, "unit": "kg"},
+    {"name": "Tomato", "quantity": 5, "unit": "kg"},
+    {"name": "Cooking Oil", "quantity": 2, "unit": "liter"},
+]
+
+# Basket priced by the groceries cost endpoints, with whole-category lines
+DEFAULT_GROCERY_BASKET = [
+    {"name": "Rice", "quantity": 10, "unit": "kg"},
+    {"name": "Wheat", "quantity": 10, "unit": "kg"},
+    {"name": "Milk", "quantity": 30, "unit": "liter"},
+    {"name": "Eggs", "quantity": 30, "unit": "dozen"},
+    {"name": "Vegetables", "quantity": 30, "unit": "kg"},
+    {"name": "Fruits", "quantity": 15, "unit": "kg"},
+]
+
+# How the unit price of a basket item is chosen among the matching items of a locality:
+# first  - first matching item of the first store that has one (by store id, then item id)
+# cheapest - lowest price in any store
+# median - median price over every matching item
+STORE_POLICIES = ('first', 'cheapest', 'median')
+
+# Category lines (Vegetables, Fruits) match every item of the category, sold by
+# the kg, the bunch or the piece, so any single item is a poor unit price for
+# them; they are always priced at the median whatever the store policy
+CATEGORY_LINE_POLICY = 'median'
+
+
+class BasketCandidates:
+    """Grocery items matching a basket, as columns ordered by locality, store and item id"""
+
+    def __init__(self, rows: List):
+        self.locality_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.store_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        self.item_ids = np.array([row[2] for row in rows], dtype=np.int64)
+        self.prices = np.array([row[3] for row in rows], dtype=np.float64)
+
+    @property
+    def size(self) -> int:
+        return len(self.item_ids)
+
+    def match(self, item_ids: Iterable[int]) -> np.ndarray:
+        """Boolean mask of the candidates among item_ids"""
+        return np.isin(self.item_ids, np.fromiter(item_ids, dtype=np.int64))
+
+
+class BasketPricingService:
+    """Prices a grocery basket per locality from one candidate query"""
+
+    @staticmethod
+    def load_candidates(
+        db: Session,
+        item_ids: Iterable[int],
+        locality_ids: Optional[List[int]] = None,
+        city: Optional[str] = None
+    ) -> BasketCandidates:
+        """Priced items among item_ids in active stores, in one primary-key lookup"""
+        item_ids = sorted(set(item_ids))
+        if not item_ids or (locality_ids is not None and not locality_ids):
+            return BasketCandidates([])
+
+        query = db.query(
+            GroceryStore.locality_id,
+            GroceryStore.id,
+            GroceryItem.id,
+            GroceryItem.price
+        ).join(
+            GroceryItem, GroceryItem.store_id == GroceryStore.id
+        ).filter(
+            GroceryStore.is_active == "active",
+            GroceryStore.locality_id.isnot(None),
+            GroceryItem.price.isnot(None),
+            GroceryItem.id.in_(item_ids)
+        )
+        if locality_ids is not None:
+            query = query.filter(GroceryStore.locality_id.in_(locality_ids))
+        if city:
+            query = query.join(Locality, Locality.id == GroceryStore.locality_id).filter(Locality.city == city)
+
+        rows = query.order_by(GroceryStore.locality_id, GroceryStore.id, GroceryItem.id).all()
+        return BasketCandidates(rows)
+
+    @staticmethod
+    def price(
+        candidates: BasketCandidates,
+        basket: List[Dict],
+        resolved: Dict[str, FrozenSet[int]],
+        policy: str = "first"
+    ) -> Dict[int, float]:
+        """
+        Basket cost of every locality with at least one matching item
+
+        basket items are {name, quantity} and resolved maps each name to
+        its grocery item ids; items without a match in a locality add
+        nothing to its cost. Category lines use CATEGORY_LINE_POLICY.
+        """
+        if policy not in STORE_POLICIES:
+            raise ValueError(f"Unknown store policy: {policy}")
+
+        localities = np.unique(candidates.locality_ids)
+        totals = np.zeros(len(localities), dtype=np.float64)
+        for item in basket:
+            name = item.get("name", "")
+            item_ids = resolved.get(name)
+            if not item_ids or not candidates.size:
+                continue
+            item_policy = CATEGORY_LINE_POLICY if is_category_product(name) else policy
+            mask = candidates.match(item_ids)
+            if not mask.any():
+                continue
+
+            # Candidates are sorted by locality, so each locality is one contiguous run
+            item_localities = candidates.locality_ids[mask]
+            prices = candidates.prices[mask]
+            group_localities, starts = np.unique(item_localities, return_index=True)
+            if item_policy == "first":
+                unit_prices = prices[starts]
+            elif item_policy == "cheapest":
+                unit_prices = np.minimum.reduceat(prices, starts)
+            else:
+                unit_prices = np.array([np.median(group) for group in np.split(prices, starts[1:])])
+
+            totals[np.searchsorted(localities, group_localities)] += unit_prices * item.get("quantity", 1)
+
+        return {int(locality_id): float(total) for locality_id, total in zip(localities, totals)}
+
+    @staticmethod
+    def price_localities(
+        db: Session,
+        basket: List[Dict],
+        locality_ids: Optional[List[int]] = None,
+        city: Optional[str] = None,
+        policy: Optional[str] = None
+    ) -> Dict[int, float]:
+        """
+        Basket cost of many localities, or every locality of a city
+
+        Localities without any matching item are left out. policy defaults
+        to GROCERY_STORE_POLICY.
+        """
+        policy = policy or settings.GROCERY_STORE_POLICY
+        if policy not in STORE_POLICIES:
+            raise ValueError(f"Unknown store policy: {policy}")
+        grocery_matcher.ensure_loaded(db)
+        resolved = grocery_matcher.resolve_many(item.get("name", "") for item in basket)
+        candidates = BasketPricingService.load_candidates(
+            db, set().union(*resolved.values()), locality_ids=locality_ids, city=city
+        )
+        return BasketPricingService.price(candidates, basket, resolved, policy)
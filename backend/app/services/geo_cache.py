@@ -0,0 +1,420 @@
+"""
+Grid-cell cache of external geo API results
+Scraping-service results are cached per (source, geohash cell, radius,
+query type), so localities a few hundred metres apart share one AQI or
+Places lookup and repeat refreshes and training runs mostly skip the APIs.
+Entries expire after a per-source TTL (GEO_CACHE_TTL_SECONDS). The same
+stores keep the shared request counters of quota-limited APIs.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from app.core.config import settings
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Results of failed or partial API calls, refetched on the next request
+INCOMPLETE_SOURCES = {'fallback', 'default', 'error', 'google_places_partial'}
+# Local index answers are complete but cheaper to recompute than to cache
+UNCACHEABLE_SOURCES = INCOMPLETE_SOURCES | {'osm_local'}
+
+
+def geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Standard base32 geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def _sources_outside(result, excluded: set) -> bool:
+    """
+    Whether no source of a service result is in excluded
+    
+    Results with a source are checked directly; results made of several
+    sources (delivery) pass only when every part does.
+    """
+    if not isinstance(result, dict):
+        return False
+    if 'source' in result:
+        return result['source'] not in excluded
+    parts = [value for value in result.values() if isinstance(value, dict)]
+    return bool(parts) and all(_sources_outside(part, excluded) for part in parts)
+
+
+def is_cacheable(result) -> bool:
+    """Whether a service result came from a real API response"""
+    return _sources_outside(result, UNCACHEABLE_SOURCES)
+
+
+def is_complete(result) -> bool:
+    """Whether a service result is a full answer, from an API or the local index"""
+    return _sources_outside(result, INCOMPLETE_SOURCES)
+
+
+class GeoCacheStore:
+    """
+    No-op store, used when GEO_CACHE_BACKEND is 'none'
+    
+    Stores also hold the request counters of quota-limited APIs; this one
+    counts in process memory, which the other stores fall back to while
+    their backend is unavailable.
+    """
+    
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+    
+    def get(self, key: str) -> Optional[Dict]:
+        return None
+    
+    def set(self, key: str, source: str, response: Dict, ttl_seconds: int):
+        pass
+    
+    def invalidate(self, source: str) -> int:
+        return 0
+    
+    def increment_counter(self, key: str, limit: int) -> Optional[int]:
+        """Add one to a counter below limit and return its new value, None when the limit is reached"""
+        with self._counter_lock:
+            used = self._counters.get(key, 0)
+            if used >= limit:
+                return None
+            self._counters[key] = used + 1
+            return used + 1
+    
+    def get_counter(self, key: str) -> int:
+        with self._counter_lock:
+            return self._counters.get(key, 0)
+
+
+class PostgresGeoCacheStore(GeoCacheStore):
+    """
+    Entries in the geo_api_cache table, shared by the API, Airflow and training runs
+    
+    Expired rows are overwritten when their cell is fetched again.
+    The store backs off for a minute after a database error, so callers
+    without a database simply go to the APIs.
+    """
+    
+    RETRY_AFTER_SECONDS = 60
+    
+    def __init__(self):
+        super().__init__()
+        self._unavailable_until = 0.0
+    
+    def _available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+    
+    def _failed(self, e: Exception):
+        print(f"Geo API cache unavailable: {e}")
+        self._unavailable_until = time.monotonic() + self.RETRY_AFTER_SECONDS
+    
+    def get(self, key: str) -> Optional[Dict]:
+        if not self._available():
+            return None
+        from app.core.database import SessionLocal
+        from app.models.neighborhood import GeoApiCacheEntry
+        
+        db = SessionLocal()
+        try:
+            entry = db.query(GeoApiCacheEntry.response).filter(
+                GeoApiCacheEntry.key == key,
+                GeoApiCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            return entry[0] if entry else None
+        except Exception as e:
+            self._failed(e)
+            return None
+        finally:
+            db.close()
+    
+    def set(self, key: str, source: str, response: Dict, ttl_seconds: int):
+        if not self._available():
+            return
+        from sqlalchemy.dialects.postgresql import insert
+        from app.core.database import SessionLocal
+        from app.models.neighborhood import GeoApiCacheEntry
+        
+        now = datetime.utcnow()
+        values = {
+            'key': key,
+            'source': source,
+            'response': response,
+            'fetched_at': now,
+            'expires_at': now + timedelta(seconds=ttl_seconds)
+        }
+        db = SessionLocal()
+        try:
+            statement = insert(GeoApiCacheEntry).values(**values)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={name: value for name, value in values.items() if name != 'key'}
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._failed(e)
+        finally:
+            db.close()
+    
+    def invalidate(self, source: str) -> int:
+        from app.core.database import SessionLocal
+        from app.models.neighborhood import GeoApiCacheEntry
+        
+        db = SessionLocal()
+        try:
+            deleted = db.query(GeoApiCacheEntry).filter(
+                GeoApiCacheEntry.source == source
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+    
+    def increment_counter(self, key: str, limit: int) -> Optional[int]:
+        """Atomic conditional increment of an api_quota_usage row, shared by every process"""
+        if not self._available():
+            return super().increment_counter(key, limit)
+        from sqlalchemy.dialects.postgresql import insert
+        from app.core.database import SessionLocal
+        from app.models.neighborhood import ApiQuotaUsage
+        
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            statement = insert(ApiQuotaUsage).values(key=key, used=1, updated_at=now)
+            statement = statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'used': ApiQuotaUsage.used + 1, 'updated_at': now},
+                where=ApiQuotaUsage.used < limit
+            ).returning(ApiQuotaUsage.used)
+            used = db.execute(statement).scalar()
+            db.commit()
+            return used
+        except Exception as e:
+            db.rollback()
+            self._failed(e)
+            return super().increment_counter(key, limit)
+        finally:
+            db.close()
+    
+    def get_counter(self, key: str) -> int:
+        if not self._available():
+            return super().get_counter(key)
+        from app.core.database import SessionLocal
+        from app.models.neighborhood import ApiQuotaUsage
+        
+        db = SessionLocal()
+        try:
+            used = db.query(ApiQuotaUsage.used).filter(ApiQuotaUsage.key == key).scalar()
+            return used or 0
+        except Exception as e:
+            self._failed(e)
+            return super().get_counter(key)
+        finally:
+            db.close()
+
+
+class SqliteGeoCacheStore(GeoCacheStore):
+    """Entries in a local SQLite file, for scripts running without the database"""
+    
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geo_api_cache ("
+                "key TEXT PRIMARY KEY, source TEXT NOT NULL, response TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_quota_usage ("
+                "key TEXT PRIMARY KEY, used INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM geo_api_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set(self, key: str, source: str, response: Dict, ttl_seconds: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geo_api_cache (key, source, response, fetched_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, source, json.dumps(response), now, now + ttl_seconds)
+            )
+            self._conn.commit()
+    
+    def invalidate(self, source: str) -> int:
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM geo_api_cache WHERE source = ?", (source,)
+            ).rowcount
+            self._conn.commit()
+        return deleted
+    
+    def increment_counter(self, key: str, limit: int) -> Optional[int]:
+        # SQLite serializes writers, so processes sharing the file share the counter
+        with self._lock:
+            updated = self._conn.execute(
+                "INSERT INTO api_quota_usage (key, used, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET used = used + 1, updated_at = excluded.updated_at "
+                "WHERE used < ?",
+                (key, time.time(), limit)
+            ).rowcount
+            self._conn.commit()
+            if not updated:
+                return None
+            return self._conn.execute("SELECT used FROM api_quota_usage WHERE key = ?", (key,)).fetchone()[0]
+    
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT used FROM api_quota_usage WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+
+def create_geo_cache_store() -> GeoCacheStore:
+    """Build the store selected by GEO_CACHE_BACKEND"""
+    backend = settings.GEO_CACHE_BACKEND
+    if backend == "postgres":
+        return PostgresGeoCacheStore()
+    if backend == "sqlite":
+        return SqliteGeoCacheStore(settings.GEO_CACHE_SQLITE_PATH)
+    return GeoCacheStore()
+
+
+class GeoCache:
+    """Grid-cell keys, per-source TTLs and hit/miss counters over a GeoCacheStore"""
+    
+    def __init__(self, store: Optional[GeoCacheStore] = None):
+        self.store = store or GeoCacheStore()
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+    
+    @staticmethod
+    def key(source: str, latitude: float, longitude: float, radius_km: Optional[float], query_type: str) -> str:
+        """Cache key of a query: the point is quantized to its geohash cell"""
+        precision = settings.GEO_CACHE_GEOHASH_PRECISION.get(source, settings.GEO_CACHE_DEFAULT_PRECISION)
+        radius_m = int(radius_km * 1000) if radius_km is not None else 0
+        return f"{source}:{geohash(latitude, longitude, precision)}:{radius_m}:{query_type}"
+    
+    def get(self, source: str, key: str) -> Optional[Dict]:
+        response = self.store.get(key)
+        with self._lock:
+            counter = self.hits if response is not None else self.misses
+            counter[source] = counter.get(source, 0) + 1
+        return response
+    
+    def contains(self, key: str) -> bool:
+        """Whether a key is cached, without counting a hit or miss"""
+        return self.store.get(key) is not None
+    
+    def set(self, source: str, key: str, response: Dict):
+        ttl_seconds = settings.GEO_CACHE_TTL_SECONDS.get(source)
+        if ttl_seconds and is_cacheable(response):
+            self.store.set(key, source, response, ttl_seconds)
+    
+    def invalidate(self, source: str) -> int:
+        """Drop every entry of a source, e.g. after local data replaced it"""
+        return self.store.invalidate(source)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': type(self.store).__name__,
+                'hits': dict(self.hits),
+                'misses': dict(self.misses)
+            }
+
+
+geo_cache = GeoCache(store=create_geo_cache_store())
+
+
+def geo_cached(source: str, type_args: Tuple[str, ...] = ()) -> Callable:
+    """
+    Cache a scraping-service method by grid cell
+    
+    The method must take latitude and longitude (and optionally radius_km)
+    arguments. Its name, without an _async suffix, and the values of
+    type_args make up the query type, so the blocking and async variants
+    share entries. The wrapper has a cache_key(*args, **kwargs) attribute.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        name = func.__name__.removesuffix('_async')
+        
+        def cache_key(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            query_type = ":".join([name] + [str(arguments[arg]).lower() for arg in type_args])
+            return GeoCache.key(
+                source, arguments['latitude'], arguments['longitude'], arguments.get('radius_km'), query_type
+            )
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = cache_key(*args, **kwargs)
+                cached = await asyncio.to_thread(geo_cache.get, source, key)
+                if cached is not None:
+                    return cached
+                result = await func(*args, **kwargs)
+                await asyncio.to_thread(geo_cache.set, source, key, result)
+                return result
+            
+            async_wrapper.cache_key = cache_key
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(*args, **kwargs)
+            cached = geo_cache.get(source, key)
+            if cached is not None:
+                return cached
+            result = func(*args, **kwargs)
+            geo_cache.set(source, key, result)
+            return result
+        
+        wrapper.cache_key = cache_key
+        return wrapper
+    
+    return decorator
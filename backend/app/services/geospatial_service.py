@@ -1,12 +1,20 @@
+import json
+import time
+from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
-from typing import List, Optional, Dict
+from sqlalchemy.dialects.postgresql import insert
+from typing import Iterator, List, Optional, Dict
 from app.models.geospatial import Locality, LocalityStats
 from app.models.rent import RentListing
 from app.models.grocery import GroceryStore, GroceryItem
 from app.models.transport import TransportRoute, TransportFare
 import requests
 from app.core.config import settings
+from app.services.basket_pricing import MONTHLY_GROCERY_BASKET, BasketPricingService
+
+AVG_TRANSPORT_COST_MONTHLY = 2000.0  # Placeholder
+AVG_MONTHLY_INCOME = 50000.0  # Assumed average income (INR) behind the cost burden index
 
 class GeospatialService:
     @staticmethod
@@ -84,6 +92,14 @@ class GeospatialService:
         data_type: str = "rent"  # 'rent', 'grocery', 'transport', 'cost_burden'
     ) -> List[Dict]:
         """Generate heatmap data for localities"""
+        return list(GeospatialService.iter_heatmap_data(db, data_type))
+    
+    @staticmethod
+    def iter_heatmap_data(
+        db: Session,
+        data_type: str = "rent"  # 'rent', 'grocery', 'transport', 'cost_burden'
+    ) -> Iterator[Dict]:
+        """Yield heatmap points one at a time, streaming rows from the database cursor"""
         if data_type == "rent":
             query = text("""
                 SELECT 
@@ -99,9 +115,9 @@ class GeospatialService:
                 GROUP BY l.id, l.name, l.latitude, l.longitude
                 HAVING COUNT(r.id) > 0
             """)
-            result = db.execute(query)
-            return [
-                {
+            result = db.execute(query, execution_options={"stream_results": True})
+            for row in result:
+                yield {
                     "id": row[0],
                     "name": row[1],
                     "latitude": float(row[2]) if row[2] else None,
@@ -109,8 +125,6 @@ class GeospatialService:
                     "value": float(row[4]) if row[4] else None,
                     "metadata": {"listing_count": int(row[5]) if row[5] else 0}
                 }
-                for row in result
-            ]
         elif data_type == "cost_burden":
             query = text("""
                 SELECT 
@@ -128,9 +142,9 @@ class GeospatialService:
                   AND l.longitude IS NOT NULL
                   AND ls.cost_burden_index IS NOT NULL
             """)
-            result = db.execute(query)
-            return [
-                {
+            result = db.execute(query, execution_options={"stream_results": True})
+            for row in result:
+                yield {
                     "id": row[0],
                     "name": row[1],
                     "latitude": float(row[2]) if row[2] else None,
@@ -142,10 +156,6 @@ class GeospatialService:
                         "avg_transport_cost": float(row[7]) if row[7] else None,
                     }
                 }
-                for row in result
-            ]
-        else:
-            return []
     
     @staticmethod
     def calculate_isochrone(
@@ -177,78 +187,218 @@ class GeospatialService:
         return None
     
     @staticmethod
-    def update_locality_stats(db: Session, locality_id: int) -> LocalityStats:
+    def update_locality_stats(db: Session, locality_id: int) -> Optional[LocalityStats]:
         """Calculate and update statistics for a locality"""
+        GeospatialService.update_locality_stats_bulk(db, locality_ids=[locality_id])
+        return GeospatialService.get_locality_stats(db, locality_id)
+    
+    @staticmethod
+    def update_locality_stats_bulk(
+        db: Session,
+        city: Optional[str] = None,
+        locality_ids: Optional[List[int]] = None
+    ) -> Dict:
+        """
+        Calculate and update statistics for many localities with set-based queries
+        
+        Rent avg/median/count per (locality, property type) come from one
+        GROUP BY over rent_listings; locality_stats is upserted with one
+        INSERT ... ON CONFLICT and the rent columns of existing neighborhood
+        records with one UPDATE ... FROM. Scoped to a city, to locality_ids,
+        or every locality. Commits.
+        
+        Returns:
+            Dict with the number of localities and neighborhoods updated and
+            the stats of each locality, rent by property type included
+        """
         from app.services.rent_service import RentService
-        from app.services.grocery_service import GroceryService
-        from app.services.transport_service import TransportService
-        
-        # Calculate average rents
-        avg_rent_1bhk = RentService.get_avg_rent_by_locality(db, locality_id, "1BHK")
-        avg_rent_2bhk = RentService.get_avg_rent_by_locality(db, locality_id, "2BHK")
-        avg_rent_3bhk = RentService.get_avg_rent_by_locality(db, locality_id, "3BHK")
-        
-        # Calculate grocery cost from scraped data
-        stores = GroceryService.get_stores(db, locality_id=locality_id)
-        avg_grocery_cost = 0.0
-        if stores:
-            # Use actual scraped grocery items to calculate monthly cost
-            # Standard monthly grocery basket
-            monthly_basket = [
-                {"name": "Rice", "quantity": 10, "unit": "kg"},
-                {"name": "Wheat", "quantity": 10, "unit": "kg"},
-                {"name": "Milk", "quantity": 30, "unit": "liter"},
-                {"name": "Eggs", "quantity": 30, "unit": "dozen"},
-                {"name": "Onion", "quantity": 5, "unit": "kg"},
-                {"name": "Potato", "quantity": 5, "unit": "kg"},
-                {"name": "Tomato", "quantity": 5, "unit": "kg"},
-                {"name": "Cooking Oil", "quantity": 2, "unit": "liter"},
-            ]
+        from app.services.snapshot_cache import snapshot_cache
+        
+        query = db.query(Locality.id)
+        if city:
+            query = query.filter(Locality.city == city)
+        if locality_ids is not None:
+            query = query.filter(Locality.id.in_(locality_ids))
+        ids = [locality_id for (locality_id,) in query.order_by(Locality.id).all()]
+        if not ids:
+            return {'localities_updated': 0, 'neighborhoods_updated': 0, 'localities': []}
+        
+        rent_stats = RentService.get_rent_stats_by_locality(db, ids)
+        grocery_costs = GeospatialService._grocery_costs(db, ids)
+        now = datetime.utcnow()
+        
+        stats_rows = []
+        neighborhood_rows = []
+        summaries = []
+        for locality_id in ids:
+            rent = rent_stats[locality_id]
+            by_type = rent['by_type']
+            avg_rents = {
+                property_type: by_type.get(property_type, {}).get('avg')
+                for property_type in ('1BHK', '2BHK', '3BHK')
+            }
+            avg_grocery_cost = grocery_costs.get(locality_id, 0.0)
             
-            # Calculate using actual scraped prices
-            avg_grocery_cost = GroceryService.calculate_monthly_grocery_cost(
-                db, locality_id, monthly_basket
-            )
+            # Cost burden index: rent + groceries + transport as % of income
+            total_monthly_cost = (avg_rents['2BHK'] or 0) + avg_grocery_cost + AVG_TRANSPORT_COST_MONTHLY
+            cost_burden_index = (total_monthly_cost / AVG_MONTHLY_INCOME) * 100 if AVG_MONTHLY_INCOME > 0 else 0
             
-            # If no scraped data, use average price estimate
-            if avg_grocery_cost == 0:
-                total_items = db.query(GroceryItem).filter(
-                    GroceryItem.store_id.in_([s.id for s in stores])
-                ).count()
-                if total_items > 0:
-                    avg_price = db.query(func.avg(GroceryItem.price)).filter(
-                        GroceryItem.store_id.in_([s.id for s in stores])
-                    ).scalar()
-                    # Estimate: avg_price * typical monthly quantity (50 items)
-                    avg_grocery_cost = (avg_price or 0) * 50
-        
-        # Calculate transport cost (simplified)
-        avg_transport_cost = 2000.0  # Placeholder
-        
-        # Calculate cost burden index (rent + groceries + transport as % of income)
-        # Assuming average income of 50,000 INR
-        avg_income = 50000.0
-        total_monthly_cost = (avg_rent_2bhk or 0) + avg_grocery_cost + avg_transport_cost
-        cost_burden_index = (total_monthly_cost / avg_income) * 100 if avg_income > 0 else 0
-        
-        # Get or create stats
-        stats = db.query(LocalityStats).filter(
-            LocalityStats.locality_id == locality_id
-        ).first()
+            stats_rows.append({
+                'locality_id': locality_id,
+                'avg_rent_1bhk': avg_rents['1BHK'],
+                'avg_rent_2bhk': avg_rents['2BHK'],
+                'avg_rent_3bhk': avg_rents['3BHK'],
+                'avg_grocery_cost_monthly': avg_grocery_cost,
+                'avg_transport_cost_monthly': AVG_TRANSPORT_COST_MONTHLY,
+                'cost_burden_index': cost_burden_index,
+                # onupdate does not apply to INSERT ... ON CONFLICT
+                'last_updated': now
+            })
+            updated_at = rent['updated_at'].isoformat() if rent['updated_at'] else None
+            neighborhood_rows.append({
+                'locality_id': locality_id,
+                'avg_rent_1bhk': avg_rents['1BHK'],
+                'avg_rent_2bhk': avg_rents['2BHK'],
+                'avg_rent_3bhk': avg_rents['3BHK'],
+                'rent_listings_count': rent['count'],
+                # Same state as NeighborhoodService writes, so the next aggregation skips rent
+                'rent_state': {
+                    'refreshed_at': now.isoformat(),
+                    'inputs': {'count': rent['count'], 'updated_at': updated_at}
+                }
+            })
+            summaries.append({
+                'locality_id': locality_id,
+                'rent': {str(property_type): values for property_type, values in by_type.items()},
+                'rent_listings_count': rent['count'],
+                'avg_grocery_cost_monthly': avg_grocery_cost,
+                'cost_burden_index': cost_burden_index
+            })
         
-        if not stats:
-            stats = LocalityStats(locality_id=locality_id)
-            db.add(stats)
+        statement = insert(LocalityStats).values(stats_rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['locality_id'],
+            set_={
+                column: getattr(statement.excluded, column)
+                for column in stats_rows[0] if column != 'locality_id'
+            }
+        )
+        db.execute(statement)
         
-        stats.avg_rent_1bhk = avg_rent_1bhk
-        stats.avg_rent_2bhk = avg_rent_2bhk
-        stats.avg_rent_3bhk = avg_rent_3bhk
-        stats.avg_grocery_cost_monthly = avg_grocery_cost
-        stats.avg_transport_cost_monthly = avg_transport_cost
-        stats.cost_burden_index = cost_burden_index
+        neighborhoods_updated = db.execute(text("""
+            UPDATE neighborhood_data AS nd
+            SET avg_rent_1bhk = s.avg_rent_1bhk,
+                avg_rent_2bhk = s.avg_rent_2bhk,
+                avg_rent_3bhk = s.avg_rent_3bhk,
+                rent_listings_count = s.rent_listings_count,
+                data_source = CASE
+                    WHEN jsonb_typeof(nd.data_source -> 'sources') = 'object'
+                    THEN jsonb_set(nd.data_source, '{sources,rent}', s.rent_state)
+                    ELSE nd.data_source
+                END,
+                updated_at = :now
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS s(
+                locality_id integer,
+                avg_rent_1bhk double precision,
+                avg_rent_2bhk double precision,
+                avg_rent_3bhk double precision,
+                rent_listings_count integer,
+                rent_state jsonb
+            )
+            WHERE nd.locality_id = s.locality_id
+        """), {'rows': json.dumps(neighborhood_rows), 'now': now}).rowcount
         
         db.commit()
-        db.refresh(stats)
         
-        return stats
-
+        # Neighborhoods of any city may read these stats, so drop every recommendation snapshot
+        snapshot_cache.invalidate()
+        
+        return {
+            'localities_updated': len(ids),
+            'neighborhoods_updated': neighborhoods_updated,
+            'localities': summaries
+        }
+    
+    @staticmethod
+    def iter_update_locality_stats(
+        db: Session,
+        city: Optional[str] = None,
+        chunk_size: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Update the stats of every locality, or those of a city, chunk by chunk
+        
+        Each chunk of LOCALITY_STATS_CHUNK_SIZE localities is one
+        update_locality_stats_bulk call and one transaction. Yields a progress
+        record after every committed chunk and a final summary record; a
+        failing chunk is rolled back and ends the run with an error record.
+        """
+        chunk_size = chunk_size or settings.LOCALITY_STATS_CHUNK_SIZE
+        query = db.query(Locality.id)
+        if city:
+            query = query.filter(Locality.city == city)
+        ids = [locality_id for (locality_id,) in query.order_by(Locality.id).all()]
+        
+        started = time.monotonic()
+        totals = {'localities_updated': 0, 'neighborhoods_updated': 0}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                result = GeospatialService.update_locality_stats_bulk(db, locality_ids=chunk)
+            except Exception as e:
+                db.rollback()
+                yield {
+                    'event': 'error',
+                    'city': city,
+                    'processed': start,
+                    'total': len(ids),
+                    'error': str(e),
+                    **totals
+                }
+                return
+            totals['localities_updated'] += result['localities_updated']
+            totals['neighborhoods_updated'] += result['neighborhoods_updated']
+            yield {
+                'event': 'progress',
+                'city': city,
+                'processed': start + len(chunk),
+                'total': len(ids),
+                **totals
+            }
+        
+        yield {
+            'event': 'completed',
+            'city': city,
+            'processed': len(ids),
+            'total': len(ids),
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+            **totals
+        }
+    
+    @staticmethod
+    def _grocery_costs(db: Session, locality_ids: List[int]) -> Dict[int, float]:
+        """Monthly basket cost of each locality with active grocery stores"""
+        # Calculate using actual scraped prices, all localities in one query
+        basket_costs = BasketPricingService.price_localities(db, MONTHLY_GROCERY_BASKET, locality_ids=locality_ids)
+        
+        rows = db.query(
+            GroceryStore.locality_id,
+            func.count(GroceryItem.id),
+            func.avg(GroceryItem.price)
+        ).outerjoin(
+            GroceryItem, GroceryItem.store_id == GroceryStore.id
+        ).filter(
+            GroceryStore.is_active == "active",
+            GroceryStore.locality_id.in_(locality_ids)
+        ).group_by(GroceryStore.locality_id).all()
+        
+        costs = {}
+        for locality_id, items_count, avg_price in rows:
+            cost = basket_costs.get(locality_id, 0.0)
+            
+            # If no scraped data, use average price estimate
+            if cost == 0 and items_count > 0:
+                # Estimate: avg_price * typical monthly quantity (50 items)
+                cost = (avg_price or 0) * 50
+            costs[locality_id] = cost
+        return costs
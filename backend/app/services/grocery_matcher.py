@@ -0,0 +1,246 @@
+"""
+Grocery item matching
+Basket names ("Rice", "Cooking Oil") resolve to grocery item ids through a
+canonical product dictionary and an in-memory token index of every item
+name, matching whole words only: "Price Tag" is not rice, "Aashirvaad Atta"
+is wheat. The index is built at startup and rebuilt when grocery_items
+changes; free-text search goes to the pg_trgm index on grocery_items.name.
+"""
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.grocery import GroceryItem
+
+# Canonical product -> phrases naming it in item names, phrases ruling a name
+# out, and item categories that belong to it
+CANONICAL_PRODUCTS = {
+    'rice': {
+        'phrases': ['rice', 'chawal', 'basmati'],
+        'exclude': ['rice bran', 'rice flour', 'puffed rice', 'rice flakes', 'poha']
+    },
+    'wheat': {
+        'phrases': ['wheat', 'atta', 'gehun'],
+        'exclude': ['wheat flakes', 'wheat biscuit']
+    },
+    'milk': {
+        'phrases': ['milk', 'doodh'],
+        'exclude': ['milk chocolate', 'milk powder', 'coconut milk', 'milk biscuit']
+    },
+    'egg': {
+        'phrases': ['egg', 'anda'],
+        'exclude': ['egg noodle']
+    },
+    'onion': {
+        'phrases': ['onion', 'pyaz', 'pyaaz'],
+        'exclude': ['onion powder', 'onion ring']
+    },
+    'potato': {
+        'phrases': ['potato', 'aloo', 'alu'],
+        'exclude': ['potato chip', 'potato wafer', 'aloo bhujia', 'alu bhujia']
+    },
+    'tomato': {
+        'phrases': ['tomato', 'tamatar'],
+        'exclude': ['tomato ketchup', 'tomato sauce', 'tomato puree', 'tomato soup']
+    },
+    'cooking oil': {
+        'phrases': [
+            'cooking oil', 'refined oil', 'sunflower oil', 'mustard oil', 'groundnut oil',
+            'soybean oil', 'soyabean oil', 'rice bran oil', 'palm oil', 'sarso tel'
+        ],
+        'exclude': ['hair oil']
+    },
+    'vegetable': {'phrases': ['vegetable', 'sabzi'], 'categories': ['vegetables']},
+    'fruit': {'phrases': ['fruit', 'phal'], 'categories': ['fruits'], 'exclude': ['fruit juice', 'fruit jam']}
+}
+
+
+def _stem(token: str) -> str:
+    """Singular form of a token, enough for grocery names (tomatoes, eggs, berries)"""
+    if len(token) > 4 and token.endswith('oes'):
+        return token[:-2]
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Lowercase alphanumeric words of a name, singularized"""
+    return tuple(_stem(token) for token in re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def normalize(text: str) -> str:
+    """Canonical spelling of a name: its tokens joined by single spaces"""
+    return " ".join(tokenize(text))
+
+
+def _contains(tokens: Tuple[str, ...], phrase: Tuple[str, ...]) -> bool:
+    """Whether phrase occurs as consecutive whole words of tokens"""
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+
+# Normalized phrase or product key -> canonical product
+_ALIASES = {
+    normalize(alias): product
+    for product, entry in CANONICAL_PRODUCTS.items()
+    for alias in [product] + entry['phrases']
+}
+
+
+def canonical_product(name: str) -> Optional[str]:
+    """Canonical product of a basket name, None when the dictionary does not know it"""
+    return _ALIASES.get(normalize(name))
+
+
+def is_category_product(name: str) -> bool:
+    """Whether a basket name also matches whole item categories (Vegetables, Fruits)"""
+    product = canonical_product(name)
+    return product is not None and bool(CANONICAL_PRODUCTS[product].get('categories'))
+
+
+def match_rules(name: str) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]], List[str]]:
+    """(phrases, excluded phrases, categories) that decide whether an item is a basket name"""
+    product = canonical_product(name)
+    if product is None:
+        # Unknown names match as a phrase of their own
+        return [tokenize(name)], [], []
+    entry = CANONICAL_PRODUCTS[product]
+    return (
+        [tokenize(phrase) for phrase in entry['phrases']],
+        [tokenize(phrase) for phrase in entry.get('exclude', [])],
+        [category.lower() for category in entry.get('categories', [])]
+    )
+
+
+def matches(item_name: str, name: str, category: Optional[str] = None) -> bool:
+    """Whether an item (name and category) is the product a basket name asks for"""
+    tokens = tokenize(item_name)
+    phrases, excluded, categories = match_rules(name)
+    found = any(phrase and _contains(tokens, phrase) for phrase in phrases)
+    found = found or bool(category and category.lower() in categories)
+    return found and not any(_contains(tokens, phrase) for phrase in excluded)
+
+
+class GroceryMatcher:
+    """
+    Token index of every grocery item name, kept in memory
+
+    resolve() intersects the posting lists of a phrase's tokens and checks
+    word order on the few remaining items, so a lookup touches only items
+    sharing its words. Results are cached until the next rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[int, Tuple[str, ...]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._categories: Dict[str, Set[int]] = {}
+        self._resolved: Dict[str, FrozenSet[int]] = {}
+        self._signature: Optional[Tuple] = None
+        self._checked_at: Optional[float] = None
+
+    def build(self, items: Iterable[Tuple[int, str, Optional[str]]], signature: Optional[Tuple] = None):
+        """Replace the index with (id, name, category) items"""
+        tokens: Dict[int, Tuple[str, ...]] = {}
+        postings: Dict[str, Set[int]] = {}
+        categories: Dict[str, Set[int]] = {}
+        for item_id, name, category in items:
+            item_tokens = tokenize(name)
+            tokens[item_id] = item_tokens
+            for token in set(item_tokens):
+                postings.setdefault(token, set()).add(item_id)
+            if category:
+                categories.setdefault(category.lower(), set()).add(item_id)
+
+        with self._lock:
+            self._tokens = tokens
+            self._postings = postings
+            self._categories = categories
+            self._resolved = {}
+            self._signature = signature
+            self._checked_at = time.monotonic()
+
+    @staticmethod
+    def _table_signature(db: Session) -> Tuple:
+        count, updated_at = db.query(func.count(GroceryItem.id), func.max(GroceryItem.updated_at)).one()
+        return count, updated_at
+
+    def ensure_loaded(self, db: Session):
+        """
+        Build the index on first use, and rebuild it when grocery_items changed
+
+        The table is checked at most every GROCERY_MATCHER_REFRESH_SECONDS.
+        """
+        with self._lock:
+            checked_at = self._checked_at
+            if checked_at is not None and time.monotonic() - checked_at < settings.GROCERY_MATCHER_REFRESH_SECONDS:
+                return
+
+        signature = self._table_signature(db)
+        if signature == self._signature:
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return
+        rows = db.query(GroceryItem.id, GroceryItem.name, GroceryItem.category).yield_per(10000)
+        self.build(rows, signature)
+
+    def invalidate(self):
+        """Force a table check on the next lookup, e.g. after items were imported"""
+        with self._lock:
+            self._checked_at = None
+            self._signature = None
+
+    def warm(self):
+        """Build the index on a session of its own; failures only delay it to the first lookup"""
+        db = SessionLocal()
+        try:
+            self.ensure_loaded(db)
+            print(f"Grocery item index ready: {len(self._tokens)} items")
+        except Exception as e:
+            print(f"Grocery item index not built: {e}")
+        finally:
+            db.close()
+
+    def _phrase_ids(self, phrase: Tuple[str, ...]) -> Set[int]:
+        if not phrase:
+            return set()
+        postings = sorted((self._postings.get(token, set()) for token in set(phrase)), key=len)
+        candidates = set.intersection(*postings) if postings[0] else set()
+        if len(phrase) == 1:
+            return candidates
+        return {item_id for item_id in candidates if _contains(self._tokens[item_id], phrase)}
+
+    def resolve(self, name: str) -> FrozenSet[int]:
+        """Ids of the grocery items that are the product a basket name asks for"""
+        key = normalize(name)
+        with self._lock:
+            cached = self._resolved.get(key)
+            if cached is not None:
+                return cached
+
+            phrases, excluded, categories = match_rules(name)
+            found: Set[int] = set()
+            for phrase in phrases:
+                found |= self._phrase_ids(phrase)
+            for category in categories:
+                found |= self._categories.get(category, set())
+            for phrase in excluded:
+                found -= self._phrase_ids(phrase)
+
+            resolved = frozenset(found)
+            self._resolved[key] = resolved
+            return resolved
+
+    def resolve_many(self, names: Iterable[str]) -> Dict[str, FrozenSet[int]]:
+        """resolve() for each basket name"""
+        return {name: self.resolve(name) for name in names}
+
+
+grocery_matcher = GroceryMatcher()
@@ -1,3 +1,4 @@
+from sqlalchemy import func, literal
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.models.grocery import GroceryStore, GroceryItem
@@ -36,6 +37,18 @@ class GroceryService:
         
         return query.all()
     
+    @staticmethod
+    def search_items(
+        db: Session,
+        query: str,
+        limit: int = 20
+    ) -> List[GroceryItem]:
+        """Items whose name has words similar to query, best matches first (pg_trgm index)"""
+        similarity = func.word_similarity(query, GroceryItem.name)
+        return db.query(GroceryItem).filter(
+            literal(query).op('<%')(GroceryItem.name)
+        ).order_by(similarity.desc(), GroceryItem.id).limit(limit).all()
+    
     @staticmethod
     def fetch_bigbasket_products(locality: str, city: str = "Bhopal") -> List[dict]:
         """Fetch products from BigBasket API"""
@@ -83,32 +96,11 @@ class GroceryService:
     def calculate_monthly_grocery_cost(
         db: Session,
         locality_id: int,
-        items: List[dict]  # List of {item_name, quantity, unit}
+        items: List[dict],  # List of {item_name, quantity, unit}
+        policy: Optional[str] = None
     ) -> float:
         """Calculate monthly grocery cost for a locality"""
-        stores = db.query(GroceryStore).filter(
-            GroceryStore.locality_id == locality_id,
-            GroceryStore.is_active == "active"
-        ).all()
+        from app.services.basket_pricing import BasketPricingService
         
-        if not stores:
-            return 0.0
-        
-        total_cost = 0.0
-        for item_req in items:
-            item_name = item_req.get("name", "").lower()
-            quantity = item_req.get("quantity", 1)
-            
-            # Find the item in stores
-            for store in stores:
-                items_in_store = db.query(GroceryItem).filter(
-                    GroceryItem.store_id == store.id,
-                    GroceryItem.name.ilike(f"%{item_name}%")
-                ).first()
-                
-                if items_in_store:
-                    total_cost += items_in_store.price * quantity
-                    break
-        
-        return total_cost
-
+        costs = BasketPricingService.price_localities(db, items, locality_ids=[locality_id], policy=policy)
+        return costs.get(locality_id, 0.0)
@@ -0,0 +1,177 @@
+"""
+Shared HTTP client layer for the scraping services
+One pooled requests.Session (blocking calls) and pooled httpx clients (async
+calls) keep connections to each external API alive across calls, retry
+transient failures with backoff and pace requests per host.
+"""
+import asyncio
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+from app.core.config import settings
+
+# Transient statuses worth retrying; other errors are returned to the caller
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def default_timeout() -> httpx.Timeout:
+    """Connect and read timeouts from Settings"""
+    return httpx.Timeout(settings.SCRAPING_TIMEOUT_SECONDS, connect=settings.SCRAPING_CONNECT_TIMEOUT_SECONDS)
+
+
+class SourceRateLimiter:
+    """
+    Request pacing per external API host, shared by every thread and event loop
+    
+    Each host gets a request rate (SCRAPING_RATE_LIMITS, falling back to
+    SCRAPING_DEFAULT_RATE_LIMIT requests per second); callers reserve the
+    next free slot and wait until it comes up.
+    """
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None):
+        self.rates = rates if rates is not None else settings.SCRAPING_RATE_LIMITS
+        self.default_rate = default_rate if default_rate is not None else settings.SCRAPING_DEFAULT_RATE_LIMIT
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+    
+    def reserve(self, url: str) -> float:
+        """Reserve a request slot for the host of url and return the seconds to wait for it"""
+        host = urlsplit(url).netloc
+        rate = self.rates.get(host, self.default_rate)
+        if not rate or rate <= 0:
+            return 0.0
+        
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / rate
+        return slot - now
+    
+    def wait(self, url: str):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def wait_async(self, url: str):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def create_session() -> requests.Session:
+    """
+    Build a pooled requests.Session for the scraping services
+    
+    Hosts listed in SCRAPING_POOL_SIZES get their own adapter with that
+    pool size; every other host uses SCRAPING_POOL_MAXSIZE. Retries cover
+    connection errors and transient statuses, honouring Retry-After.
+    """
+    def adapter(pool_size: int) -> HTTPAdapter:
+        retry = Retry(
+            total=settings.SCRAPING_MAX_RETRIES,
+            backoff_factor=settings.SCRAPING_RETRY_BACKOFF_SECONDS,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'POST']),  # Overpass queries are read-only POSTs
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('http://', adapter(settings.SCRAPING_POOL_MAXSIZE))
+    session.mount('https://', adapter(settings.SCRAPING_POOL_MAXSIZE))
+    for host, pool_size in settings.SCRAPING_POOL_SIZES.items():
+        session.mount(f'http://{host}', adapter(pool_size))
+        session.mount(f'https://{host}', adapter(pool_size))
+    return session
+
+
+rate_limiter = SourceRateLimiter()
+http_session = create_session()
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared session, paced per host, with the Settings timeouts by default"""
+    kwargs.setdefault('timeout', (settings.SCRAPING_CONNECT_TIMEOUT_SECONDS, settings.SCRAPING_TIMEOUT_SECONDS))
+    rate_limiter.wait(url)
+    return http_session.get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """POST through the shared session, paced per host, with the Settings timeouts by default"""
+    kwargs.setdefault('timeout', (settings.SCRAPING_CONNECT_TIMEOUT_SECONDS, settings.SCRAPING_TIMEOUT_SECONDS))
+    rate_limiter.wait(url)
+    return http_session.post(url, **kwargs)
+
+
+class AsyncScrapingClient:
+    """
+    Shared httpx.AsyncClient with a concurrency limit per host
+    
+    One client is shared by every source call of an aggregation run, so
+    connections are reused and no single API gets more than
+    max_per_host requests in flight. Requests are paced by the shared
+    per-host rate limiter and retried with backoff like the blocking session.
+    """
+    
+    def __init__(self, max_per_host: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_per_host = max_per_host or settings.SCRAPING_MAX_CONCURRENCY_PER_HOST
+        # Connection errors are retried by the transport, transient statuses in request()
+        transport = httpx.AsyncHTTPTransport(
+            retries=settings.SCRAPING_MAX_RETRIES,
+            limits=httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=settings.SCRAPING_POOL_MAXSIZE,
+                keepalive_expiry=settings.SCRAPING_KEEPALIVE_SECONDS
+            )
+        )
+        self.client = httpx.AsyncClient(
+            timeout=timeout or default_timeout(),
+            follow_redirects=True,
+            transport=transport
+        )
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+    
+    def _limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+    
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self._limit(url):
+            for attempt in range(settings.SCRAPING_MAX_RETRIES + 1):
+                await rate_limiter.wait_async(url)
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == settings.SCRAPING_MAX_RETRIES:
+                    return response
+                await asyncio.sleep(self._retry_delay(response, attempt))
+            return response
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """Retry-After when the server sent one, exponential backoff otherwise"""
+        retry_after = response.headers.get('retry-after')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return settings.SCRAPING_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+    
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+    
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+    
+    async def aclose(self):
+        await self.client.aclose()
+    
+    async def __aenter__(self) -> 'AsyncScrapingClient':
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
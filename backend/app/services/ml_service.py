@@ -1,20 +1,51 @@
 from sqlalchemy.orm import Session
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from pathlib import Path
+from datetime import datetime
 import logging
+import time
 from app.ml.cost_predictor import CostPredictor
 from app.ml.rent_classifier import RentClassifier
-from app.models.ml_models import MLModelVersion, Prediction
+from app.ml.micro_batcher import MicroBatcher
+from app.core.config import settings
+from app.models.geospatial import LocalityStats
+from app.models.ml_models import MLModelVersion, Prediction, RentListingClassification
 from app.models.user import User
 
 logger = logging.getLogger(__name__)
 
+# Locality stats column holding the rent of each preferred property type
+RENT_FIELDS = {
+    1: 'avg_rent_1bhk',
+    2: 'avg_rent_2bhk',
+    3: 'avg_rent_3bhk'
+}
+
+def convert_to_native(obj):
+    """Recursively convert numpy types to native Python types"""
+    import numpy as np
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {key: convert_to_native(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_to_native(item) for item in obj]
+    return obj
+
+# Postgres advisory lock held for the whole of a bulk rent classification run
+RENT_CLASSIFICATION_LOCK_KEY = 725_100_025
+
 class MLService:
     def __init__(self):
         self.models_dir = Path("/app/models")
         self.models_dir.mkdir(parents=True, exist_ok=True)
         self.cost_predictor = None
         self.rent_classifier = None
+        self.rent_batcher = None
         self._cost_predictor_loaded = False
         self._rent_classifier_loaded = False
         # Don't load models at startup - load lazily when needed
@@ -42,19 +73,78 @@ class MLService:
         if self._rent_classifier_loaded:
             return
         try:
+            if settings.RENT_CLASSIFIER_NUM_THREADS > 0:
+                import torch
+                torch.set_num_threads(settings.RENT_CLASSIFIER_NUM_THREADS)
             rent_model_path = self.models_dir / "rent_classifier" / "latest"
             if rent_model_path.exists():
-                self.rent_classifier = RentClassifier(str(rent_model_path))
+                self.rent_classifier = RentClassifier(str(rent_model_path), device=settings.RENT_CLASSIFIER_DEVICE)
                 logger.info("Rent classifier model loaded")
             else:
                 # Initialize with pretrained DistilBERT
-                self.rent_classifier = RentClassifier()
+                self.rent_classifier = RentClassifier(device=settings.RENT_CLASSIFIER_DEVICE)
                 logger.info("Rent classifier initialized with pretrained model")
+            # Concurrent requests are classified together, one forward pass per batch
+            self.rent_batcher = MicroBatcher(
+                self._classify_rent_batch,
+                max_batch_size=settings.RENT_CLASSIFIER_MAX_BATCH_SIZE,
+                max_wait_ms=settings.RENT_CLASSIFIER_MAX_WAIT_MS,
+                name="rent-classifier-batcher"
+            )
             self._rent_classifier_loaded = True
         except Exception as e:
             logger.error(f"Error loading rent classifier: {e}")
             self._rent_classifier_loaded = True  # Mark as attempted to avoid retry loops
     
+    def _classify_rent_batch(self, items: List) -> List[Dict]:
+        """Batch handler of the rent batcher, items are (listing data, locality average rent)"""
+        return self.rent_classifier.classify_batch(
+            [listing_data for listing_data, _ in items],
+            [locality_avg_rent for _, locality_avg_rent in items]
+        )
+    
+    @staticmethod
+    def _locality_data(locality_stats: LocalityStats, property_type: int) -> Dict:
+        """Model inputs of a locality, with the rent of the preferred property type"""
+        rent_field = RENT_FIELDS.get(property_type, 'avg_rent_2bhk')
+        rent_value = getattr(locality_stats, rent_field) or locality_stats.avg_rent_2bhk or 0
+        return {
+            'avg_rent_2bhk': rent_value,  # Use the appropriate rent for property type
+            'avg_grocery_cost_monthly': locality_stats.avg_grocery_cost_monthly or 0,
+            'avg_transport_cost_monthly': locality_stats.avg_transport_cost_monthly or 0,
+            'cost_burden_index': locality_stats.cost_burden_index or 0,
+        }
+    
+    def _predict_costs(self, user_profiles: List[Dict], locality_data_list: List[Dict]) -> List[Dict]:
+        """Cost predictions for (user profile, locality data) pairs, in one model call"""
+        # Load model if needed
+        self._load_cost_predictor()
+        
+        if not self.cost_predictor or not self.cost_predictor.model:
+            # Return simple calculation if model not available
+            results = []
+            for locality_data in locality_data_list:
+                rent = locality_data['avg_rent_2bhk']
+                groceries = locality_data['avg_grocery_cost_monthly']
+                transport = locality_data['avg_transport_cost_monthly']
+                results.append({
+                    'predicted_monthly_cost': rent + groceries + transport,
+                    'breakdown': {
+                        'rent': rent,
+                        'groceries': groceries,
+                        'transport': transport
+                    },
+                    'confidence': 0.5,
+                    'model_available': False
+                })
+        else:
+            results = self.cost_predictor.predict_batch(user_profiles, locality_data_list)
+            for result in results:
+                result['model_available'] = True
+        
+        # Convert all numpy types to native Python types for JSON serialization
+        return [convert_to_native(result) for result in results]
+    
     def predict_cost(
         self,
         db: Session,
@@ -64,7 +154,6 @@ class MLService:
     ) -> Dict:
         """Predict cost of living for a user in a locality"""
         from app.services.geospatial_service import GeospatialService
-        from app.services.rent_service import RentService
         from app.models.geospatial import Locality
         
         # Check if locality exists
@@ -80,66 +169,9 @@ class MLService:
         
         # Prepare locality data - use property type from user profile
         property_type = user_profile.get('property_type_preference', 2)  # 1, 2, or 3
-        rent_field_map = {
-            1: 'avg_rent_1bhk',
-            2: 'avg_rent_2bhk',
-            3: 'avg_rent_3bhk'
-        }
-        rent_field = rent_field_map.get(property_type, 'avg_rent_2bhk')
-        
-        # Get rent based on property type preference
-        rent_value = getattr(locality_stats, rent_field) or locality_stats.avg_rent_2bhk or 0
-        
-        # Prepare locality data with scraped data
-        locality_data = {
-            'avg_rent_2bhk': rent_value,  # Use the appropriate rent for property type
-            'avg_grocery_cost_monthly': locality_stats.avg_grocery_cost_monthly or 0,
-            'avg_transport_cost_monthly': locality_stats.avg_transport_cost_monthly or 0,
-            'cost_burden_index': locality_stats.cost_burden_index or 0,
-        }
-        
-        # Load model if needed
-        self._load_cost_predictor()
+        locality_data = self._locality_data(locality_stats, property_type)
         
-        # Make prediction
-        if not self.cost_predictor or not self.cost_predictor.model:
-            # Return simple calculation if model not available
-            rent = locality_data['avg_rent_2bhk']
-            groceries = locality_data['avg_grocery_cost_monthly']
-            transport = locality_data['avg_transport_cost_monthly']
-            total = rent + groceries + transport
-            
-            prediction_result = {
-                'predicted_monthly_cost': total,
-                'breakdown': {
-                    'rent': rent,
-                    'groceries': groceries,
-                    'transport': transport
-                },
-                'confidence': 0.5,
-                'model_available': False
-            }
-        else:
-            prediction_result = self.cost_predictor.predict(user_profile, locality_data)
-            prediction_result['model_available'] = True
-        
-        # Convert all numpy types to native Python types for JSON serialization
-        def convert_to_native(obj):
-            """Recursively convert numpy types to native Python types"""
-            import numpy as np
-            if isinstance(obj, np.integer):
-                return int(obj)
-            elif isinstance(obj, np.floating):
-                return float(obj)
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()
-            elif isinstance(obj, dict):
-                return {key: convert_to_native(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_native(item) for item in obj]
-            return obj
-        
-        prediction_result = convert_to_native(prediction_result)
+        prediction_result = self._predict_costs([user_profile], [locality_data])[0]
         
         # Save prediction to database
         prediction = Prediction(
@@ -154,6 +186,132 @@ class MLService:
         
         return prediction_result
     
+    def predict_cost_localities(
+        self,
+        db: Session,
+        user_id: int,
+        user_profile: Dict,
+        locality_ids: List[int]
+    ) -> List[Dict]:
+        """
+        Predict cost of living for a user in many localities
+        
+        Localities and their stats are loaded in one query, stats missing for
+        some localities are computed in one bulk update, and every locality is
+        scored in one model call. Results are in request order.
+        """
+        from app.services.geospatial_service import GeospatialService
+        from app.models.geospatial import Locality
+        
+        locality_ids = list(dict.fromkeys(locality_ids))
+        rows = db.query(Locality, LocalityStats).outerjoin(
+            LocalityStats, LocalityStats.locality_id == Locality.id
+        ).filter(Locality.id.in_(locality_ids)).all()
+        
+        localities = {locality.id: locality for locality, _ in rows}
+        missing = [locality_id for locality_id in locality_ids if locality_id not in localities]
+        if missing:
+            raise ValueError(f"Localities not found: {', '.join(str(locality_id) for locality_id in missing)}")
+        
+        stats = {locality.id: locality_stats for locality, locality_stats in rows if locality_stats}
+        without_stats = [locality_id for locality_id in locality_ids if locality_id not in stats]
+        if without_stats:
+            # Create stats if they don't exist
+            GeospatialService.update_locality_stats_bulk(db, locality_ids=without_stats)
+            stats.update({
+                locality_stats.locality_id: locality_stats
+                for locality_stats in db.query(LocalityStats).filter(LocalityStats.locality_id.in_(without_stats))
+            })
+        
+        property_type = user_profile.get('property_type_preference', 2)  # 1, 2, or 3
+        locality_data = [self._locality_data(stats[locality_id], property_type) for locality_id in locality_ids]
+        results = self._predict_costs([user_profile] * len(locality_ids), locality_data)
+        
+        self._save_cost_predictions(db, user_id, user_profile, locality_ids, results)
+        
+        return [
+            {'locality_id': locality_id, 'locality_name': localities[locality_id].name, **result}
+            for locality_id, result in zip(locality_ids, results)
+        ]
+    
+    def predict_cost_city(
+        self,
+        db: Session,
+        user_id: int,
+        user_profile: Dict,
+        city: str
+    ) -> Dict:
+        """
+        Predict cost of living for a user in every locality of a city, cheapest first
+        
+        Localities and their stats are loaded in one query and scored in one
+        model call, and the predictions are saved with one bulk insert.
+        Localities without stats are skipped rather than computed on demand
+        (see POST /geospatial/localities/update-stats).
+        """
+        from app.models.geospatial import Locality
+        
+        rows = db.query(Locality.id, Locality.name, LocalityStats).outerjoin(
+            LocalityStats, LocalityStats.locality_id == Locality.id
+        ).filter(Locality.city == city).order_by(Locality.id).all()
+        if not rows:
+            raise ValueError(f"No localities found in {city}")
+        
+        scored = [(locality_id, name, stats) for locality_id, name, stats in rows if stats]
+        without_stats = [locality_id for locality_id, _, stats in rows if not stats]
+        
+        property_type = user_profile.get('property_type_preference', 2)  # 1, 2, or 3
+        locality_data = [self._locality_data(stats, property_type) for _, _, stats in scored]
+        results = self._predict_costs([user_profile] * len(scored), locality_data)
+        
+        locality_ids = [locality_id for locality_id, _, _ in scored]
+        self._save_cost_predictions(db, user_id, user_profile, locality_ids, results)
+        
+        # Feature importance is the same for every locality, return it once
+        feature_importance = results[0].get('feature_importance') if results else None
+        predictions = [
+            {
+                'locality_id': locality_id,
+                'locality_name': name,
+                **{key: value for key, value in result.items() if key != 'feature_importance'}
+            }
+            for (locality_id, name, _), result in zip(scored, results)
+        ]
+        predictions.sort(key=lambda prediction: prediction['predicted_monthly_cost'])
+        for rank, prediction in enumerate(predictions, start=1):
+            prediction['rank'] = rank
+        
+        return {
+            'city': city,
+            'predictions': predictions,
+            'count': len(predictions),
+            'feature_importance': feature_importance,
+            'localities_without_stats': without_stats
+        }
+    
+    @staticmethod
+    def _save_cost_predictions(
+        db: Session,
+        user_id: int,
+        user_profile: Dict,
+        locality_ids: List[int],
+        results: List[Dict]
+    ):
+        """Save cost predictions to database with one bulk insert"""
+        if not results:
+            return
+        db.bulk_insert_mappings(Prediction, [
+            {
+                'user_id': user_id,
+                'model_name': 'cost_predictor',
+                'input_data': {'user_profile': user_profile, 'locality_id': locality_id},
+                'prediction': result,
+                'confidence': float(result.get('confidence', 0.5))
+            }
+            for locality_id, result in zip(locality_ids, results)
+        ])
+        db.commit()
+    
     def classify_rent_listing(
         self,
         db: Session,
@@ -181,7 +339,28 @@ class MLService:
             )
         
         # Prepare listing data
-        listing_data = {
+        listing_data = self._listing_data(listing)
+        
+        # Load model if needed
+        self._load_rent_classifier()
+        
+        # Classify
+        if not self.rent_classifier:
+            # Simple rule-based classification if model not available
+            result = self._rule_based_classification(listing.rent_amount, locality_avg_rent)
+            result['model_available'] = False
+        else:
+            result = self.rent_batcher(
+                (listing_data, locality_avg_rent), timeout=settings.RENT_CLASSIFIER_TIMEOUT_SECONDS
+            )
+            result['model_available'] = True
+        
+        return result
+    
+    @staticmethod
+    def _listing_data(listing) -> Dict:
+        """Classifier input of a rent listing (model instance or row with the same attributes)"""
+        return {
             'title': listing.title,
             'description': listing.description or '',
             'property_type': listing.property_type,
@@ -189,31 +368,234 @@ class MLService:
             'furnished': listing.furnished,
             'rent_amount': listing.rent_amount,
         }
+    
+    @staticmethod
+    def _rule_based_classification(rent_amount: float, locality_avg_rent: Optional[float]) -> Dict:
+        """Overpriced when more than 20% above the locality average, used without a model"""
+        if locality_avg_rent:
+            diff_percent = ((rent_amount - locality_avg_rent) / locality_avg_rent) * 100
+            return {'classification': 'overpriced' if diff_percent > 20 else 'fair', 'confidence': 0.6}
+        return {'classification': 'fair', 'confidence': 0.5}
+    
+    def _classify_listings(self, listings: List[Dict], locality_avg_rents: List[Optional[float]]) -> List[Dict]:
+        """
+        Classify many listings, in forward passes of RENT_CLASSIFICATION_FORWARD_BATCH_SIZE
+        
+        Listings are grouped by text length so each pass pads little;
+        results are in input order.
+        """
+        if not self.rent_classifier:
+            return [
+                self._rule_based_classification(listing['rent_amount'], locality_avg_rent)
+                for listing, locality_avg_rent in zip(listings, locality_avg_rents)
+            ]
+        
+        order = sorted(
+            range(len(listings)),
+            key=lambda i: len(self.rent_classifier.prepare_text_features(listings[i]))
+        )
+        batch_size = max(1, settings.RENT_CLASSIFICATION_FORWARD_BATCH_SIZE)
+        results: List[Optional[Dict]] = [None] * len(listings)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            batch_results = self.rent_classifier.classify_batch(
+                [listings[i] for i in indices],
+                [locality_avg_rents[i] for i in indices]
+            )
+            for i, result in zip(indices, batch_results):
+                results[i] = result
+        return results
+    
+    @staticmethod
+    def acquire_rent_classification_lock():
+        """
+        Connection holding the bulk rent classification lock, None when another run holds it
+        
+        The lock is session-level, so it is held on this one connection (not
+        a Session, which may switch connections between commits) until
+        release_rent_classification_lock; it is shared by API workers and the CLI.
+        """
+        from sqlalchemy import text
+        from app.core.database import engine
+        
+        connection = engine.connect()
+        try:
+            locked = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {'key': RENT_CLASSIFICATION_LOCK_KEY}
+            ).scalar()
+        except Exception:
+            connection.close()
+            raise
+        if not locked:
+            connection.close()
+            return None
+        return connection
+    
+    @staticmethod
+    def release_rent_classification_lock(connection):
+        """Unlock and close; a connection that cannot unlock is discarded, which ends its session and the lock"""
+        from sqlalchemy import text
+        try:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': RENT_CLASSIFICATION_LOCK_KEY})
+        except Exception:
+            connection.invalidate()
+            raise
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def rent_classification_running() -> bool:
+        """Whether another bulk rent classification run holds the lock, probed without keeping it"""
+        connection = MLService.acquire_rent_classification_lock()
+        if connection is None:
+            return True
+        MLService.release_rent_classification_lock(connection)
+        return False
+    
+    def iter_classify_rent_listings(
+        self,
+        db: Session,
+        city: Optional[str] = None,
+        page_size: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Classify every rent listing, or those of a city, into rent_listing_classifications
+        
+        Locality averages are computed once with one GROUP BY query. Listings
+        are read in keyset-paginated pages of RENT_CLASSIFICATION_PAGE_SIZE
+        (by id, so pages stay cheap however deep the job gets), classified in
+        large batches and upserted one page per transaction. Yields a progress
+        record after every committed page and a final summary record; a
+        failing page is rolled back and ends the run with an error record.
+        """
+        from sqlalchemy import func
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models.geospatial import Locality
+        from app.models.rent import RentListing
+        from app.services.rent_service import RentService
+        
+        page_size = page_size or settings.RENT_CLASSIFICATION_PAGE_SIZE
+        started = time.monotonic()
         
-        # Load model if needed
         self._load_rent_classifier()
+        if self.rent_classifier:
+            model_name = 'rent_classifier'
+            model_version = self.get_active_model_version(db, model_name)
+            model_version = model_version.version if model_version else None
+        else:
+            model_name, model_version = 'rule_based', None
         
-        # Classify
-        if not self.rent_classifier:
-            # Simple rule-based classification if model not available
-            if locality_avg_rent:
-                diff_percent = ((listing.rent_amount - locality_avg_rent) / locality_avg_rent) * 100
-                classification = 'overpriced' if diff_percent > 20 else 'fair'
-                confidence = 0.6
-            else:
-                classification = 'fair'
-                confidence = 0.5
+        query = db.query(
+            RentListing.id,
+            RentListing.locality_id,
+            RentListing.title,
+            RentListing.description,
+            RentListing.property_type,
+            RentListing.area_sqft,
+            RentListing.furnished,
+            RentListing.rent_amount
+        )
+        if city:
+            query = query.join(Locality, Locality.id == RentListing.locality_id).filter(Locality.city == city)
+        total = query.with_entities(func.count(RentListing.id)).scalar() or 0
+        averages = RentService.get_avg_rents(db, city=city)
+        
+        # One upsert statement, executed with a page of rows (batched into multi-row VALUES)
+        upsert = insert(RentListingClassification)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['listing_id'],
+            set_={
+                column: upsert.excluded[column]
+                for column in (
+                    'locality_id', 'classification', 'confidence', 'probabilities', 'locality_avg_rent',
+                    'difference_percent', 'model_name', 'model_version', 'classified_at'
+                )
+            }
+        )
+        
+        totals = {'processed': 0, 'fair': 0, 'overpriced': 0}
+        last_id = 0
+        while True:
+            listings = query.filter(RentListing.id > last_id).order_by(RentListing.id).limit(page_size).all()
+            if not listings:
+                break
+            try:
+                listing_data = [self._listing_data(listing) for listing in listings]
+                locality_avg_rents = [
+                    averages.get((listing.locality_id, listing.property_type or None)) if listing.locality_id else None
+                    for listing in listings
+                ]
+                results = self._classify_listings(listing_data, locality_avg_rents)
+                
+                now = datetime.utcnow()
+                rows = []
+                for listing, locality_avg_rent, result in zip(listings, locality_avg_rents, results):
+                    rows.append({
+                        'listing_id': listing.id,
+                        'locality_id': listing.locality_id,
+                        'classification': result['classification'],
+                        'confidence': float(result['confidence']),
+                        'probabilities': result.get('probabilities'),
+                        'locality_avg_rent': locality_avg_rent,
+                        'difference_percent': (
+                            (listing.rent_amount - locality_avg_rent) / locality_avg_rent * 100
+                            if locality_avg_rent else None
+                        ),
+                        'model_name': model_name,
+                        'model_version': model_version,
+                        'classified_at': now
+                    })
+                db.execute(upsert, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                yield {
+                    'event': 'error',
+                    'city': city,
+                    'total': total,
+                    'last_listing_id': last_id,
+                    'error': str(e),
+                    **totals
+                }
+                return
             
-            result = {
-                'classification': classification,
-                'confidence': confidence,
-                'model_available': False
+            last_id = listings[-1].id
+            totals['processed'] += len(listings)
+            for result in results:
+                totals[result['classification']] = totals.get(result['classification'], 0) + 1
+            yield {
+                'event': 'progress',
+                'city': city,
+                'total': total,
+                'last_listing_id': last_id,
+                **totals
             }
-        else:
-            result = self.rent_classifier.classify(listing_data, locality_avg_rent)
-            result['model_available'] = True
         
-        return result
+        yield {
+            'event': 'completed',
+            'city': city,
+            'total': total,
+            'model_name': model_name,
+            'model_version': model_version,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+            **totals
+        }
+    
+    @staticmethod
+    def get_rent_classifications(
+        db: Session,
+        locality_id: Optional[int] = None,
+        classification: Optional[str] = None,
+        limit: int = 100,
+        skip: int = 0
+    ) -> List[RentListingClassification]:
+        """Stored classifications of rent listings, written by iter_classify_rent_listings"""
+        query = db.query(RentListingClassification)
+        if locality_id:
+            query = query.filter(RentListingClassification.locality_id == locality_id)
+        if classification:
+            query = query.filter(RentListingClassification.classification == classification)
+        return query.order_by(RentListingClassification.listing_id).offset(skip).limit(limit).all()
     
     def get_active_model_version(self, db: Session, model_name: str) -> Optional[MLModelVersion]:
         """Get the active version of a model"""
@@ -1,34 +1,147 @@
 """
 Service to aggregate and store neighborhood data from various sources
+Aggregation is incremental: data_source records when each source of a
+locality was last refreshed, and only stale sources are fetched again.
 """
+import asyncio
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List
 from datetime import datetime
+from app.core.config import settings
 from app.models.neighborhood import NeighborhoodData
 from app.models.geospatial import Locality
 from app.models.rent import RentListing
-from app.models.grocery import GroceryStore
-from app.services.scraping_service import (
-    AQIScrapingService,
-    DeliveryAvailabilityService,
-    HygieneIndicatorService,
-    AmenitiesService,
-    GroceryStoresService
-)
+from app.models.grocery import GroceryStore, GroceryItem
+from app.services.basket_pricing import MONTHLY_GROCERY_BASKET
+from app.services.geo_cache import is_complete
+from app.services.places import PlacesFetcher
+from app.services.scraping_service import SCRAPED_SOURCES, scrape_locality, scrape_localities_async
 from app.services.rent_service import RentService
 from app.services.grocery_service import GroceryService
+from app.services.snapshot_cache import snapshot_cache
+
+# Sources computed from our own tables, recomputed when their rows change
+DERIVED_SOURCES = ('rent', 'grocery_cost')
+ALL_SOURCES = SCRAPED_SOURCES + DERIVED_SOURCES
 
 class NeighborhoodService:
     """Service to aggregate and manage neighborhood data"""
     
+    @staticmethod
+    def source_states(neighborhood_data: Optional[NeighborhoodData]) -> Dict[str, Dict]:
+        """Per-source refresh state kept in data_source['sources'], empty for older records"""
+        if neighborhood_data is None or not isinstance(neighborhood_data.data_source, dict):
+            return {}
+        return neighborhood_data.data_source.get('sources') or {}
+    
+    @staticmethod
+    def input_signatures(db: Session, locality_ids: List[int]) -> Dict[int, Dict[str, Dict]]:
+        """
+        Row count and latest update of the rows behind rent and grocery cost
+        
+        Two grouped queries for all localities; a signature changes whenever
+        a row is added, updated or removed.
+        """
+        signatures = {
+            locality_id: {
+                'rent': {'count': 0, 'updated_at': None},
+                'grocery_cost': {'stores': 0, 'items': 0, 'updated_at': None}
+            }
+            for locality_id in locality_ids
+        }
+        if not locality_ids:
+            return signatures
+        
+        rent_rows = db.query(
+            RentListing.locality_id,
+            func.count(RentListing.id),
+            func.max(RentListing.updated_at)
+        ).filter(
+            RentListing.locality_id.in_(locality_ids)
+        ).group_by(RentListing.locality_id).all()
+        for locality_id, count, updated_at in rent_rows:
+            signatures[locality_id]['rent'] = {
+                'count': count,
+                'updated_at': updated_at.isoformat() if updated_at else None
+            }
+        
+        grocery_rows = db.query(
+            GroceryStore.locality_id,
+            func.count(func.distinct(GroceryStore.id)),
+            func.count(GroceryItem.id),
+            func.greatest(func.max(GroceryStore.updated_at), func.max(GroceryItem.updated_at))
+        ).outerjoin(
+            GroceryItem, GroceryItem.store_id == GroceryStore.id
+        ).filter(
+            GroceryStore.locality_id.in_(locality_ids)
+        ).group_by(GroceryStore.locality_id).all()
+        for locality_id, stores, items, updated_at in grocery_rows:
+            signatures[locality_id]['grocery_cost'] = {
+                'stores': stores,
+                'items': items,
+                'updated_at': updated_at.isoformat() if updated_at else None
+            }
+        
+        return signatures
+    
+    @staticmethod
+    def plan_refresh(
+        neighborhood_data: Optional[NeighborhoodData],
+        signatures: Dict[str, Dict],
+        now: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        Sources of a locality that need refreshing, in ALL_SOURCES order
+        
+        An external source is stale once its NEIGHBORHOOD_SOURCE_MAX_AGE_SECONDS
+        is (nearly) up, or when its last result was a fallback. Rent and
+        grocery cost are stale when their input signature (see
+        input_signatures) differs from the one they were computed from.
+        Records without per-source state are refreshed entirely.
+        """
+        states = NeighborhoodService.source_states(neighborhood_data)
+        if not states:
+            return list(ALL_SOURCES)
+        
+        now = now or datetime.utcnow()
+        stale = []
+        for source in SCRAPED_SOURCES:
+            state = states.get(source)
+            if not state or not state.get('complete'):
+                stale.append(source)
+                continue
+            max_age = settings.NEIGHBORHOOD_SOURCE_MAX_AGE_SECONDS.get(source, 0)
+            age = (now - datetime.fromisoformat(state['refreshed_at'])).total_seconds()
+            if age >= max_age - settings.NEIGHBORHOOD_SOURCE_SLACK_SECONDS:
+                stale.append(source)
+        
+        for source in DERIVED_SOURCES:
+            state = states.get(source)
+            if not state or state.get('inputs') != signatures[source]:
+                stale.append(source)
+        
+        return stale
+    
     @staticmethod
     def aggregate_neighborhood_data(
         db: Session,
         locality_id: int,
-        city: str
+        city: str,
+        scraped: Optional[Dict] = None,
+        commit: bool = True,
+        sources: Optional[Iterable[str]] = None,
+        force: bool = False
     ) -> Optional[NeighborhoodData]:
         """
-        Aggregate all data for a neighborhood and store in NeighborhoodData
+        Aggregate the stale data of a neighborhood and store in NeighborhoodData
+        
+        sources lists the sources to refresh (see ALL_SOURCES); by default
+        plan_refresh picks them, or all of them with force=True. The other
+        columns keep their values. scraped holds the external source results
+        of the locality (see scrape_locality); they are fetched here when not
+        given. With commit=False the changes are only flushed, and the caller
+        commits and invalidates the city's recommendation snapshot.
         """
         # Get locality
         locality = db.query(Locality).filter(Locality.id == locality_id).first()
@@ -43,6 +156,19 @@ class NeighborhoodService:
             NeighborhoodData.locality_id == locality_id
         ).first()
         
+        signatures = NeighborhoodService.input_signatures(db, [locality_id])[locality_id]
+        if sources is None:
+            sources = ALL_SOURCES if force else NeighborhoodService.plan_refresh(neighborhood_data, signatures)
+        sources = set(sources)
+        if neighborhood_data and not sources:
+            # Everything is up to date
+            return neighborhood_data
+        
+        if scraped is None:
+            scraped = scrape_locality(
+                latitude, longitude, city, sources=[s for s in SCRAPED_SOURCES if s in sources]
+            )
+        
         if not neighborhood_data:
             neighborhood_data = NeighborhoodData(
                 locality_id=locality_id,
@@ -50,117 +176,232 @@ class NeighborhoodService:
             )
             db.add(neighborhood_data)
         
-        # 1. Aggregate rent prices
-        avg_rent_1bhk = RentService.get_avg_rent_by_locality(db, locality_id, '1BHK')
-        avg_rent_2bhk = RentService.get_avg_rent_by_locality(db, locality_id, '2BHK')
-        avg_rent_3bhk = RentService.get_avg_rent_by_locality(db, locality_id, '3BHK')
-        
-        rent_count = db.query(RentListing).filter(
-            RentListing.locality_id == locality_id
-        ).count()
+        now = datetime.utcnow()
+        refreshed_at = now.isoformat()
+        states = dict(NeighborhoodService.source_states(neighborhood_data))
         
-        neighborhood_data.avg_rent_1bhk = avg_rent_1bhk
-        neighborhood_data.avg_rent_2bhk = avg_rent_2bhk
-        neighborhood_data.avg_rent_3bhk = avg_rent_3bhk
-        neighborhood_data.rent_listings_count = rent_count
+        # 1. Aggregate rent prices
+        if 'rent' in sources:
+            rent_by_type = RentService.get_rent_stats_by_locality(db, [locality_id])[locality_id]['by_type']
+            neighborhood_data.avg_rent_1bhk = rent_by_type.get('1BHK', {}).get('avg')
+            neighborhood_data.avg_rent_2bhk = rent_by_type.get('2BHK', {}).get('avg')
+            neighborhood_data.avg_rent_3bhk = rent_by_type.get('3BHK', {}).get('avg')
+            neighborhood_data.rent_listings_count = signatures['rent']['count']
+            states['rent'] = {'refreshed_at': refreshed_at, 'inputs': signatures['rent']}
         
         # 2. Aggregate grocery costs
-        # First try database stores
-        grocery_stores = db.query(GroceryStore).filter(
-            GroceryStore.locality_id == locality_id
-        ).all()
-        
-        # Also fetch from Google Places API for more accurate count
-        grocery_places_data = GroceryStoresService.get_nearby_grocery_stores(
-            latitude, longitude, city, radius_km=2.0
-        )
-        
-        # Use Google Places count if available and higher, otherwise use database count
-        places_count = grocery_places_data.get('grocery_stores_count', 0)
-        db_count = len(grocery_stores)
-        neighborhood_data.grocery_stores_count = max(places_count, db_count) if places_count > 0 else db_count
-        
-        # Calculate average monthly grocery cost from database items
-        from app.models.grocery import GroceryItem
-        from sqlalchemy import func
-        
-        if grocery_stores:
-            # Calculate from actual scraped grocery items
-            monthly_basket = [
-                {"name": "Rice", "quantity": 10},
-                {"name": "Wheat", "quantity": 10},
-                {"name": "Milk", "quantity": 30},
-                {"name": "Eggs", "quantity": 30},
-                {"name": "Onion", "quantity": 5},
-                {"name": "Potato", "quantity": 5},
-                {"name": "Tomato", "quantity": 5},
-                {"name": "Cooking Oil", "quantity": 2},
-            ]
-            grocery_cost = GroceryService.calculate_monthly_grocery_cost(
-                db, locality_id, monthly_basket
-            )
-            neighborhood_data.avg_grocery_cost_monthly = grocery_cost if grocery_cost > 0 else None
-        else:
-            neighborhood_data.avg_grocery_cost_monthly = None
+        if 'grocery' in sources or 'grocery_cost' in sources:
+            # Google Places count, kept in the state between refreshes
+            if 'grocery' in sources:
+                grocery_places_data = scraped['grocery']
+                places_count = grocery_places_data.get('grocery_stores_count', 0)
+                states['grocery'] = {
+                    'refreshed_at': refreshed_at,
+                    'source': grocery_places_data.get('source'),
+                    'complete': is_complete(grocery_places_data),
+                    'count': places_count
+                }
+            else:
+                places_count = states.get('grocery', {}).get('count', 0)
+            
+            # Use Google Places count if available and higher, otherwise use database count
+            db_count = signatures['grocery_cost']['stores']
+            neighborhood_data.grocery_stores_count = max(places_count, db_count) if places_count > 0 else db_count
+        
+        if 'grocery_cost' in sources:
+            if signatures['grocery_cost']['stores']:
+                # Calculate from actual scraped grocery items
+                grocery_cost = GroceryService.calculate_monthly_grocery_cost(
+                    db, locality_id, MONTHLY_GROCERY_BASKET
+                )
+                neighborhood_data.avg_grocery_cost_monthly = grocery_cost if grocery_cost > 0 else None
+            else:
+                neighborhood_data.avg_grocery_cost_monthly = None
+            states['grocery_cost'] = {'refreshed_at': refreshed_at, 'inputs': signatures['grocery_cost']}
         
         # 3. Get delivery availability
-        delivery_data = DeliveryAvailabilityService.get_all_delivery_services(
-            latitude, longitude, city
-        )
-        
-        neighborhood_data.blinkit_available = delivery_data.get('blinkit', {}).get('available', False)
-        neighborhood_data.zomato_available = delivery_data.get('zomato', {}).get('available', False)
-        neighborhood_data.swiggy_available = delivery_data.get('swiggy', {}).get('available', False)
-        neighborhood_data.delivery_services = delivery_data
+        if 'delivery' in sources:
+            delivery_data = scraped['delivery']
+            neighborhood_data.blinkit_available = delivery_data.get('blinkit', {}).get('available', False)
+            neighborhood_data.zomato_available = delivery_data.get('zomato', {}).get('available', False)
+            neighborhood_data.swiggy_available = delivery_data.get('swiggy', {}).get('available', False)
+            neighborhood_data.delivery_services = delivery_data
+            states['delivery'] = {
+                'refreshed_at': refreshed_at,
+                'source': delivery_data.get('blinkit', {}).get('source'),
+                'complete': is_complete(delivery_data)
+            }
         
         # 4. Get AQI data
-        aqi_data = AQIScrapingService.get_aqi_by_location(latitude, longitude, city)
-        neighborhood_data.aqi_value = aqi_data.get('aqi_value')
-        neighborhood_data.aqi_category = aqi_data.get('aqi_category')
-        neighborhood_data.aqi_pm25 = aqi_data.get('aqi_pm25')
-        neighborhood_data.aqi_pm10 = aqi_data.get('aqi_pm10')
-        neighborhood_data.aqi_no2 = aqi_data.get('aqi_no2')
+        if 'aqi' in sources:
+            aqi_data = scraped['aqi']
+            neighborhood_data.aqi_value = aqi_data.get('aqi_value')
+            neighborhood_data.aqi_category = aqi_data.get('aqi_category')
+            neighborhood_data.aqi_pm25 = aqi_data.get('aqi_pm25')
+            neighborhood_data.aqi_pm10 = aqi_data.get('aqi_pm10')
+            neighborhood_data.aqi_no2 = aqi_data.get('aqi_no2')
+            states['aqi'] = {
+                'refreshed_at': refreshed_at,
+                'source': aqi_data.get('source'),
+                'complete': is_complete(aqi_data)
+            }
         
         # 5. Get hygiene indicators (restaurant ratings) - Use Google Places API
-        hygiene_data = HygieneIndicatorService.get_restaurant_ratings(
-            latitude, longitude, city, radius_km=2.0
-        )
-        neighborhood_data.avg_restaurant_rating = hygiene_data.get('avg_restaurant_rating')
-        neighborhood_data.restaurants_count = hygiene_data.get('restaurants_count', 0)
-        neighborhood_data.highly_rated_restaurants_count = hygiene_data.get('highly_rated_restaurants_count', 0)
+        if 'hygiene' in sources:
+            hygiene_data = scraped['hygiene']
+            neighborhood_data.avg_restaurant_rating = hygiene_data.get('avg_restaurant_rating')
+            neighborhood_data.restaurants_count = hygiene_data.get('restaurants_count', 0)
+            neighborhood_data.highly_rated_restaurants_count = hygiene_data.get('highly_rated_restaurants_count', 0)
+            states['hygiene'] = {
+                'refreshed_at': refreshed_at,
+                'source': hygiene_data.get('source'),
+                'complete': is_complete(hygiene_data)
+            }
         
         # 6. Get amenities
-        amenities_data = AmenitiesService.get_nearby_amenities(
-            latitude, longitude, city
-        )
-        neighborhood_data.hospitals_count = amenities_data.get('hospitals_count', 0)
-        neighborhood_data.schools_count = amenities_data.get('schools_count', 0)
-        neighborhood_data.parks_count = amenities_data.get('parks_count', 0)
-        neighborhood_data.shopping_malls_count = amenities_data.get('shopping_malls_count', 0)
-        neighborhood_data.metro_stations_count = amenities_data.get('metro_stations_count', 0)
-        neighborhood_data.bus_stops_count = amenities_data.get('bus_stops_count', 0)
-        neighborhood_data.amenities = amenities_data
+        if 'amenities' in sources:
+            amenities_data = scraped['amenities']
+            neighborhood_data.hospitals_count = amenities_data.get('hospitals_count', 0)
+            neighborhood_data.schools_count = amenities_data.get('schools_count', 0)
+            neighborhood_data.parks_count = amenities_data.get('parks_count', 0)
+            neighborhood_data.shopping_malls_count = amenities_data.get('shopping_malls_count', 0)
+            neighborhood_data.metro_stations_count = amenities_data.get('metro_stations_count', 0)
+            neighborhood_data.bus_stops_count = amenities_data.get('bus_stops_count', 0)
+            neighborhood_data.amenities = amenities_data
+            states['amenities'] = {
+                'refreshed_at': refreshed_at,
+                'source': amenities_data.get('source'),
+                'complete': is_complete(amenities_data)
+            }
         
         # 7. Calculate scores
         neighborhood_data.safety_score = NeighborhoodService._calculate_safety_score(neighborhood_data)
         neighborhood_data.connectivity_score = NeighborhoodService._calculate_connectivity_score(neighborhood_data)
         neighborhood_data.amenities_score = NeighborhoodService._calculate_amenities_score(neighborhood_data)
         
-        # 8. Store metadata
-        neighborhood_data.last_scraped_at = datetime.utcnow()
+        # 8. Store metadata, a new dict so the JSONB column is written
+        neighborhood_data.last_scraped_at = now
         neighborhood_data.data_source = {
-            'aqi_source': aqi_data.get('source'),
-            'delivery_source': delivery_data.get('blinkit', {}).get('source'),
-            'hygiene_source': hygiene_data.get('source'),
-            'amenities_source': amenities_data.get('source'),
-            'scraped_at': datetime.utcnow().isoformat()
+            'aqi_source': states.get('aqi', {}).get('source'),
+            'delivery_source': states.get('delivery', {}).get('source'),
+            'hygiene_source': states.get('hygiene', {}).get('source'),
+            'amenities_source': states.get('amenities', {}).get('source'),
+            'scraped_at': refreshed_at,
+            'refreshed_sources': [source for source in ALL_SOURCES if source in sources],
+            'sources': states
         }
         
+        if not commit:
+            db.flush()
+            return neighborhood_data
+        
         db.commit()
         db.refresh(neighborhood_data)
         
+        # Recommendation snapshots of this city are now stale
+        snapshot_cache.invalidate(neighborhood_data.city)
+        
         return neighborhood_data
     
+    @staticmethod
+    def aggregate_localities(
+        db: Session,
+        localities: List[Locality],
+        city: str,
+        places: Optional[PlacesFetcher] = None,
+        force: bool = False
+    ) -> Dict:
+        """
+        Aggregate many localities, fetching their external data concurrently
+        
+        Each locality is planned first (see plan_refresh, or every source
+        with force=True) and localities with nothing stale are skipped.
+        The stale source calls of all localities run on one shared async HTTP
+        client with per-host concurrency limits; the database writes then
+        happen one locality at a time on this session, each in a savepoint,
+        and are committed together. Google Places calls go through places,
+        so a refresh sharing one fetcher across batches dedups and counts
+        them as a whole.
+        
+        Localities without coordinates cannot be scraped; they are reported
+        in unlocated, so refreshed, skipped, errors and unlocated add up to
+        the localities passed in.
+        
+        Returns:
+            Dict with refreshed and skipped locality ids, per-locality errors,
+            localities without coordinates and the Places API counters of the fetcher
+        """
+        places = places or PlacesFetcher()
+        located = [l for l in localities if l.latitude and l.longitude]
+        unlocated = [
+            {'locality_id': l.id, 'locality_name': l.name}
+            for l in localities if not (l.latitude and l.longitude)
+        ]
+        located_ids = [l.id for l in located]
+        
+        existing = {
+            n.locality_id: n for n in db.query(NeighborhoodData).filter(
+                NeighborhoodData.locality_id.in_(located_ids)
+            ).all()
+        } if located_ids else {}
+        signatures = NeighborhoodService.input_signatures(db, located_ids)
+        now = datetime.utcnow()
+        plans = {
+            l.id: list(ALL_SOURCES) if force else NeighborhoodService.plan_refresh(
+                existing.get(l.id), signatures[l.id], now
+            )
+            for l in located
+        }
+        due = [l for l in located if plans[l.id]]
+        skipped = [l.id for l in located if not plans[l.id]]
+        
+        scraped = asyncio.run(scrape_localities_async([
+            {
+                'latitude': l.latitude,
+                'longitude': l.longitude,
+                'city': city,
+                'sources': [s for s in plans[l.id] if s in SCRAPED_SOURCES]
+            }
+            for l in due
+        ], places=places)) if due else []
+        
+        refreshed = []
+        errors = []
+        for locality, locality_scraped in zip(due, scraped):
+            savepoint = db.begin_nested()
+            try:
+                neighborhood_data = NeighborhoodService.aggregate_neighborhood_data(
+                    db=db,
+                    locality_id=locality.id,
+                    city=city,
+                    scraped=locality_scraped,
+                    commit=False,
+                    sources=plans[locality.id]
+                )
+                savepoint.commit()
+                if neighborhood_data:
+                    refreshed.append(locality.id)
+            except Exception as e:
+                savepoint.rollback()
+                errors.append({
+                    'locality_id': locality.id,
+                    'locality_name': locality.name,
+                    'error': str(e)
+                })
+        
+        db.commit()
+        if refreshed:
+            # Recommendation snapshots of this city are now stale
+            snapshot_cache.invalidate(city)
+        
+        return {
+            'refreshed': refreshed,
+            'skipped': skipped,
+            'errors': errors,
+            'unlocated': unlocated,
+            'places_api': places.stats()
+        }
+    
     @staticmethod
     def _calculate_safety_score(neighborhood_data: NeighborhoodData) -> float:
         """Calculate safety score (0-10) based on AQI and other factors"""
@@ -260,6 +501,6 @@ class NeighborhoodService:
         locality_id: int,
         city: str
     ) -> Optional[NeighborhoodData]:
-        """Refresh/update neighborhood data by re-scraping"""
-        return NeighborhoodService.aggregate_neighborhood_data(db, locality_id, city)
+        """Refresh/update neighborhood data by re-scraping every source"""
+        return NeighborhoodService.aggregate_neighborhood_data(db, locality_id, city, force=True)
 
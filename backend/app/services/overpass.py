@@ -0,0 +1,154 @@
+"""
+Batched OpenStreetMap (Overpass API) queries
+One query fetches every requested amenity class around a point, or inside the
+bounding box of a whole city, and the elements are bucketed client-side by
+tag and distance, instead of one remote query per amenity class.
+"""
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+import httpx
+from app.core.config import settings
+from app.services.http_client import AsyncScrapingClient, http_post
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+# Overpass runs a query for up to its [timeout:N] (180 s when unset); the
+# client read timeout is that plus a margin, so city-wide queries are not cut
+# short by the SCRAPING_TIMEOUT_SECONDS default of other APIs
+OVERPASS_DEFAULT_SERVER_TIMEOUT = 180
+READ_TIMEOUT_MARGIN_SECONDS = 10
+
+# Amenity classes: count key -> OSM tag and the element types that carry it
+OSM_AMENITY_CLASSES = {
+    'hospitals_count': {'tag': ('amenity', 'hospital'), 'elements': ('node', 'way')},
+    'schools_count': {'tag': ('amenity', 'school'), 'elements': ('node', 'way')},
+    'parks_count': {'tag': ('leisure', 'park'), 'elements': ('node', 'way')},
+}
+
+OSM_RESIDENTIAL_CLASSES = {
+    'residential_buildings': {'tag': ('building', 'residential'), 'elements': ('way', 'relation')},
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def build_query(
+    classes: Dict[str, Dict],
+    around: Optional[Tuple[float, float, float]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    timeout: Optional[int] = None
+) -> str:
+    """
+    Overpass query for every class in one request
+    
+    Pass around=(latitude, longitude, radius_km) for one locality, or
+    bbox=(south, west, north, east) for a whole city. Elements are returned
+    with their tags and a center point, so they can be bucketed locally.
+    The server-side timeout defaults to OVERPASS_QUERY_TIMEOUT_SECONDS.
+    """
+    timeout = timeout or settings.OVERPASS_QUERY_TIMEOUT_SECONDS
+    if around:
+        latitude, longitude, radius_km = around
+        area = f"(around:{int(radius_km * 1000)},{latitude},{longitude})"
+    elif bbox:
+        area = "({:.6f},{:.6f},{:.6f},{:.6f})".format(*bbox)
+    else:
+        raise ValueError("Either around or bbox is required")
+    
+    statements = []
+    for osm_class in classes.values():
+        key, value = osm_class['tag']
+        for element in osm_class['elements']:
+            statement = f'{element}["{key}"="{value}"]{area};'
+            if statement not in statements:
+                statements.append(statement)
+    
+    body = "\n  ".join(statements)
+    return f"[out:json][timeout:{timeout}];\n(\n  {body}\n);\nout tags center qt;"
+
+
+def bounding_box(points: List[Tuple[float, float]], radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) box around all points, padded by radius_km"""
+    lat_pad = radius_km / 111.32
+    south = min(lat for lat, _ in points) - lat_pad
+    north = max(lat for lat, _ in points) + lat_pad
+    lon_pad = radius_km / (111.32 * math.cos(math.radians(max(abs(south), abs(north)))))
+    west = min(lon for _, lon in points) - lon_pad
+    east = max(lon for _, lon in points) + lon_pad
+    return south, west, north, east
+
+
+def parse_elements(data: Dict) -> List[Dict]:
+    """Elements of an Overpass response as dicts with type, id, lat, lon and tags"""
+    elements = []
+    for element in data.get('elements', []):
+        center = element.get('center', element)
+        if 'lat' not in center or 'lon' not in center:
+            continue
+        elements.append({
+            'type': element.get('type'),
+            'id': element.get('id'),
+            'lat': center['lat'],
+            'lon': center['lon'],
+            'tags': element.get('tags', {})
+        })
+    return elements
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def count_by_class(
+    elements: List[Dict],
+    classes: Dict[str, Dict],
+    latitude: float,
+    longitude: float,
+    radius_km: float
+) -> Dict[str, int]:
+    """Count the elements of each class within radius_km of a point"""
+    counts = {name: 0 for name in classes}
+    for element in elements:
+        if distance_km(latitude, longitude, element['lat'], element['lon']) > radius_km:
+            continue
+        for name, osm_class in classes.items():
+            key, value = osm_class['tag']
+            if element['type'] in osm_class['elements'] and element['tags'].get(key) == value:
+                counts[name] += 1
+    return counts
+
+
+def read_timeout(query: str) -> float:
+    """Client read timeout for a query, a margin above its server-side [timeout:N]"""
+    match = re.search(r'\[timeout:(\d+)\]', query)
+    server_timeout = int(match.group(1)) if match else OVERPASS_DEFAULT_SERVER_TIMEOUT
+    return server_timeout + READ_TIMEOUT_MARGIN_SECONDS
+
+
+def fetch_elements(query: str) -> List[Dict]:
+    """Run a query through the shared HTTP session, raising on a failed response"""
+    response = http_post(
+        OVERPASS_URL,
+        data=query,
+        timeout=(settings.SCRAPING_CONNECT_TIMEOUT_SECONDS, read_timeout(query))
+    )
+    response.raise_for_status()
+    return parse_elements(response.json())
+
+
+async def fetch_elements_async(client: AsyncScrapingClient, query: str) -> List[Dict]:
+    """Async variant of fetch_elements"""
+    response = await client.post(
+        OVERPASS_URL,
+        content=query,
+        timeout=httpx.Timeout(read_timeout(query), connect=settings.SCRAPING_CONNECT_TIMEOUT_SECONDS)
+    )
+    response.raise_for_status()
+    return parse_elements(response.json())
@@ -0,0 +1,297 @@
+"""
+Google Places Nearby Search fetcher
+Follows next_page_token past the 20-result first page, deduplicates places
+by place_id across place types and neighboring localities, and keeps every
+call within a per-day quota shared by every process. Each fetcher counts
+its own calls and latency, so a refresh run can report what it spent.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.services.geo_cache import GeoCacheStore, geo_cache
+from app.services.http_client import AsyncScrapingClient, http_get
+
+
+class PlacesQuotaExceeded(Exception):
+    """The daily Places API budget is spent"""
+
+
+class PlacesQuota:
+    """
+    Per-day budget of Places API requests, shared by every process
+
+    Each page is one request. The counter lives in the geo cache store
+    (GEO_CACHE_BACKEND), so API workers, refresh scripts and Airflow-triggered
+    jobs spend one budget; with the 'none' backend it is per process. Days
+    are UTC dates, so the budget resets at midnight UTC.
+    """
+
+    def __init__(self, daily_limit: int, store: Optional[GeoCacheStore] = None, name: str = "google_places"):
+        self.daily_limit = daily_limit
+        self.store = store or geo_cache.store
+        self.name = name
+
+    def _key(self) -> str:
+        return f"{self.name}:{datetime.utcnow().date().isoformat()}"
+
+    def acquire(self):
+        """Take one request from today's budget, raising PlacesQuotaExceeded when none is left"""
+        if not self.daily_limit:
+            return
+        if self.store.increment_counter(self._key(), self.daily_limit) is None:
+            raise PlacesQuotaExceeded(f"Daily Places API quota of {self.daily_limit} requests reached")
+
+    def remaining(self) -> Optional[int]:
+        if not self.daily_limit:
+            return None
+        return max(0, self.daily_limit - self.store.get_counter(self._key()))
+
+
+places_quota = PlacesQuota(settings.GOOGLE_PLACES_DAILY_QUOTA)
+
+
+class PlacesFetcher:
+    """
+    Paginated, deduplicated Nearby Search with call and latency counters
+
+    One fetcher per refresh run: places seen for one locality or type are
+    kept once by place_id, and stats() reports the requests of that run.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        quota: Optional[PlacesQuota] = None,
+        max_pages: Optional[int] = None,
+        page_delay: Optional[float] = None,
+        dedup_across_calls: bool = True
+    ):
+        self._api_key = api_key
+        self._base_url = base_url
+        self.quota = quota or places_quota
+        self.max_pages = max_pages or settings.GOOGLE_PLACES_MAX_PAGES
+        # A next_page_token only becomes valid a short while after it is issued
+        self.page_delay = page_delay if page_delay is not None else settings.GOOGLE_PLACES_PAGE_DELAY_SECONDS
+        # Off for long-lived fetchers, whose registry would grow without bound
+        self.dedup_across_calls = dedup_across_calls
+        self._lock = threading.Lock()
+        self.places: Dict[str, Dict] = {}
+        self.reset_stats()
+    
+    @property
+    def api_key(self) -> str:
+        return self._api_key if self._api_key is not None else settings.GOOGLE_PLACES_API_KEY
+    
+    @property
+    def url(self) -> str:
+        base_url = self._base_url or settings.GOOGLE_PLACES_BASE_URL
+        return f"{base_url.rstrip('/')}/nearbysearch/json"
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {
+                'requests': 0,
+                'pages': 0,
+                'failed_requests': 0,
+                'quota_rejections': 0,
+                'duplicate_places': 0,
+                'latency_total_ms': 0.0,
+                'latency_max_ms': 0.0,
+                'requests_by_type': {}
+            }
+
+    def stats(self) -> Dict:
+        """Counters of this fetcher plus the unique places seen and the remaining daily quota"""
+        with self._lock:
+            stats = dict(self._stats, requests_by_type=dict(self._stats['requests_by_type']))
+            stats['unique_places'] = len(self.places)
+        requests = stats['requests']
+        stats['latency_avg_ms'] = stats['latency_total_ms'] / requests if requests else 0.0
+        stats['quota_remaining'] = self.quota.remaining()
+        return stats
+
+    def _first_page_params(self, latitude: float, longitude: float, radius_km: float, place_type: str) -> Dict:
+        return {
+            'location': f"{latitude},{longitude}",
+            'radius': int(radius_km * 1000),
+            'type': place_type,
+            'key': self.api_key
+        }
+
+    def _acquire(self):
+        try:
+            self.quota.acquire()
+        except PlacesQuotaExceeded:
+            with self._lock:
+                self._stats['quota_rejections'] += 1
+            raise
+
+    def _record(self, place_type: str, elapsed: float, ok: bool):
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self._stats
+            stats['requests'] += 1
+            stats['requests_by_type'][place_type] = stats['requests_by_type'].get(place_type, 0) + 1
+            stats['latency_total_ms'] += elapsed_ms
+            stats['latency_max_ms'] = max(stats['latency_max_ms'], elapsed_ms)
+            if ok:
+                stats['pages'] += 1
+            else:
+                stats['failed_requests'] += 1
+
+    def _merge(self, results: List[Dict], found: Dict[str, Dict]):
+        """Add a page of results, keeping one dict per place_id across the whole run"""
+        with self._lock:
+            for place in results:
+                place_id = place.get('place_id')
+                if not place_id:
+                    continue
+                if place_id in self.places or place_id in found:
+                    self._stats['duplicate_places'] += 1
+                if self.dedup_across_calls:
+                    place = self.places.setdefault(place_id, place)
+                found.setdefault(place_id, place)
+
+    @staticmethod
+    def _page_status(data: Dict) -> str:
+        return data.get('status', 'OK')
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float, place_type: str) -> List[Dict]:
+        """
+        Every place of a type within radius_km, following next_page_token
+
+        Raises PlacesQuotaExceeded when the budget runs out before the first
+        page; later pages stop quietly and the places found so far are returned.
+        """
+        found: Dict[str, Dict] = {}
+        params = self._first_page_params(latitude, longitude, radius_km, place_type)
+        page = 0
+        retries = 0
+        while page < self.max_pages:
+            try:
+                self._acquire()
+            except PlacesQuotaExceeded:
+                if page == 0:
+                    raise
+                break
+            start = time.perf_counter()
+            response = http_get(self.url, params=params)
+            ok = response.status_code == 200
+            self._record(place_type, time.perf_counter() - start, ok)
+            if not ok:
+                break
+
+            data = response.json()
+            status = self._page_status(data)
+            if status == 'INVALID_REQUEST' and page > 0 and retries < 2:
+                # Token not active yet
+                retries += 1
+                time.sleep(self.page_delay)
+                continue
+            if status not in ('OK', 'ZERO_RESULTS'):
+                break
+
+            self._merge(data.get('results', []), found)
+            page += 1
+            token = data.get('next_page_token')
+            if not token:
+                break
+            params = {'pagetoken': token, 'key': self.api_key}
+            retries = 0
+            time.sleep(self.page_delay)
+        return list(found.values())
+
+    async def nearby_async(
+        self,
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        place_type: str
+    ) -> List[Dict]:
+        """Async variant of nearby"""
+        found: Dict[str, Dict] = {}
+        params = self._first_page_params(latitude, longitude, radius_km, place_type)
+        page = 0
+        retries = 0
+        while page < self.max_pages:
+            try:
+                # The shared counter may be a database round trip
+                await asyncio.to_thread(self._acquire)
+            except PlacesQuotaExceeded:
+                if page == 0:
+                    raise
+                break
+            start = time.perf_counter()
+            response = await client.get(self.url, params=params)
+            ok = response.status_code == 200
+            self._record(place_type, time.perf_counter() - start, ok)
+            if not ok:
+                break
+
+            data = response.json()
+            status = self._page_status(data)
+            if status == 'INVALID_REQUEST' and page > 0 and retries < 2:
+                retries += 1
+                await asyncio.sleep(self.page_delay)
+                continue
+            if status not in ('OK', 'ZERO_RESULTS'):
+                break
+
+            self._merge(data.get('results', []), found)
+            page += 1
+            token = data.get('next_page_token')
+            if not token:
+                break
+            params = {'pagetoken': token, 'key': self.api_key}
+            retries = 0
+            await asyncio.sleep(self.page_delay)
+        return list(found.values())
+
+    def nearby_types(self, latitude: float, longitude: float, radius_km: float, place_types: Iterable[str]) -> List[Dict]:
+        """Union of several place types, one entry per place_id in type order"""
+        found: Dict[str, Dict] = {}
+        for place_type in place_types:
+            try:
+                for place in self.nearby(latitude, longitude, radius_km, place_type):
+                    found.setdefault(place['place_id'], place)
+            except PlacesQuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Error fetching {place_type}: {e}")
+        return list(found.values())
+
+    async def nearby_types_async(
+        self,
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        place_types: Iterable[str]
+    ) -> List[Dict]:
+        """Async variant of nearby_types, fetching the types concurrently"""
+        place_types = list(place_types)
+
+        async def fetch(place_type: str) -> List[Dict]:
+            try:
+                return await self.nearby_async(client, latitude, longitude, radius_km, place_type)
+            except PlacesQuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Error fetching {place_type}: {e}")
+                return []
+
+        # Merged in type order, so the result matches nearby_types
+        found: Dict[str, Dict] = {}
+        for places in await asyncio.gather(*[fetch(t) for t in place_types]):
+            for place in places:
+                found.setdefault(place['place_id'], place)
+        return list(found.values())
+
+
+# Fetcher for calls outside a refresh run
+places_fetcher = PlacesFetcher(dedup_across_calls=False)
@@ -0,0 +1,239 @@
+"""
+Local points of interest from an OpenStreetMap extract
+The pois table (filled by ingest_osm_pois.py) answers amenity and grocery
+store radius counts with GiST-indexed PostGIS queries, so refreshes only
+call Google Places/Overpass when no extract has been loaded.
+"""
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.geospatial import PointOfInterest
+
+# POI category -> OSM tags that put an element in it
+POI_CATEGORIES = {
+    'hospital': [('amenity', 'hospital')],
+    'school': [('amenity', 'school')],
+    'park': [('leisure', 'park')],
+    'shopping_mall': [('shop', 'mall')],
+    'metro_station': [('station', 'subway'), ('railway', 'subway_entrance')],
+    'bus_stop': [('highway', 'bus_stop'), ('amenity', 'bus_station')],
+    'grocery_store': [
+        ('shop', 'supermarket'),
+        ('shop', 'convenience'),
+        ('shop', 'greengrocer'),
+        ('shop', 'grocery')
+    ]
+}
+
+
+def classify(tags: Dict) -> List[str]:
+    """POI categories of an OSM element, from its tags"""
+    return [
+        category for category, rules in POI_CATEGORIES.items()
+        if any(tags.get(key) == value for key, value in rules)
+    ]
+
+
+class PoiService:
+    """Radius queries over the pois table"""
+    
+    _availability_lock = threading.Lock()
+    _availability = {'checked_at': None, 'available': False}
+    
+    @staticmethod
+    def has_local_data(db: Session) -> bool:
+        """
+        Whether an extract has been loaded, cached for POI_AVAILABILITY_TTL_SECONDS
+        
+        A failing check (no database, no pois table) counts as no data.
+        """
+        with PoiService._availability_lock:
+            cached = PoiService._availability
+            checked_at = cached['checked_at']
+            if checked_at is not None and time.monotonic() - checked_at < settings.POI_AVAILABILITY_TTL_SECONDS:
+                return cached['available']
+        
+        try:
+            available = bool(db.execute(text("SELECT EXISTS (SELECT 1 FROM pois)")).scalar())
+        except Exception as e:
+            print(f"Local POI index unavailable: {e}")
+            db.rollback()
+            available = False
+        with PoiService._availability_lock:
+            PoiService._availability = {'checked_at': time.monotonic(), 'available': available}
+        return available
+    
+    @staticmethod
+    def invalidate_availability():
+        """Forget the cached availability check, e.g. after an import"""
+        with PoiService._availability_lock:
+            PoiService._availability = {'checked_at': None, 'available': False}
+    
+    @staticmethod
+    def count_nearby(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        categories: Iterable[str]
+    ) -> Dict[str, int]:
+        """Number of POIs of each category within radius_km, in one query"""
+        categories = list(categories)
+        counts = {category: 0 for category in categories}
+        
+        query = text("""
+            SELECT category, COUNT(*)
+            FROM pois
+            WHERE category = ANY(:categories)
+              AND ST_DWithin(
+                  location,
+                  ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography,
+                  :radius * 1000
+              )
+            GROUP BY category
+        """)
+        result = db.execute(
+            query,
+            {"categories": categories, "lat": latitude, "lon": longitude, "radius": radius_km}
+        )
+        for category, count in result:
+            counts[category] = count
+        return counts
+    
+    @staticmethod
+    def find_nearby(
+        db: Session,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        category: str,
+        limit: int = 20
+    ) -> List[Dict]:
+        """Nearest POIs of a category within radius_km"""
+        query = text("""
+            SELECT osm_type, osm_id, name, latitude, longitude,
+                   ST_Distance(
+                       location,
+                       ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography
+                   ) / 1000.0 as distance_km
+            FROM pois
+            WHERE category = :category
+              AND ST_DWithin(
+                  location,
+                  ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography,
+                  :radius * 1000
+              )
+            ORDER BY distance_km
+            LIMIT :limit
+        """)
+        result = db.execute(
+            query,
+            {"category": category, "lat": latitude, "lon": longitude, "radius": radius_km, "limit": limit}
+        )
+        return [
+            {
+                "place_id": f"osm:{row[0]}/{row[1]}",
+                "name": row[2],
+                "latitude": row[3],
+                "longitude": row[4],
+                "distance_km": row[5]
+            }
+            for row in result
+        ]
+    
+    @staticmethod
+    def local_available() -> bool:
+        """has_local_data on a session of its own, False when the index is disabled"""
+        if not settings.POI_LOCAL_INDEX_ENABLED:
+            return False
+        db = SessionLocal()
+        try:
+            return PoiService.has_local_data(db)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def local_counts(
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        categories: Iterable[str]
+    ) -> Optional[Dict[str, int]]:
+        """
+        count_nearby on a session of its own, for the scraping services
+        
+        Returns None when the local index is disabled, empty or unreachable,
+        so the caller falls back to the external APIs.
+        """
+        if not settings.POI_LOCAL_INDEX_ENABLED:
+            return None
+        db = SessionLocal()
+        try:
+            if not PoiService.has_local_data(db):
+                return None
+            return PoiService.count_nearby(db, latitude, longitude, radius_km, categories)
+        except Exception as e:
+            print(f"Error querying local POIs: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    def local_stores(
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: int = 20
+    ) -> Optional[Dict]:
+        """Grocery store count and nearest stores from the local index, None when unavailable"""
+        if not settings.POI_LOCAL_INDEX_ENABLED:
+            return None
+        db = SessionLocal()
+        try:
+            if not PoiService.has_local_data(db):
+                return None
+            count = PoiService.count_nearby(db, latitude, longitude, radius_km, ['grocery_store'])['grocery_store']
+            stores = PoiService.find_nearby(db, latitude, longitude, radius_km, 'grocery_store', limit=limit)
+            return {'grocery_stores_count': count, 'stores': stores}
+        except Exception as e:
+            print(f"Error querying local POIs: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    def upsert(db: Session, rows: List[Dict]) -> int:
+        """
+        Insert or update POI rows in one statement
+        
+        Each row has osm_type, osm_id, category, name, latitude, longitude,
+        tags and source. The caller commits.
+        """
+        # One row per key, a statement cannot update the same row twice
+        unique_rows = {(row['osm_type'], row['osm_id'], row['category']): row for row in rows}
+        if not unique_rows:
+            return 0
+        values = [
+            {**row, 'location': f"SRID=4326;POINT({row['longitude']} {row['latitude']})"}
+            for row in unique_rows.values()
+        ]
+        statement = insert(PointOfInterest).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['osm_type', 'osm_id', 'category'],
+            set_={
+                'name': statement.excluded.name,
+                'location': statement.excluded.location,
+                'latitude': statement.excluded.latitude,
+                'longitude': statement.excluded.longitude,
+                'tags': statement.excluded.tags,
+                'source': statement.excluded.source,
+                'imported_at': text('now()')
+            }
+        )
+        db.execute(statement)
+        return len(values)
@@ -0,0 +1,493 @@
+"""
+Columnar scoring engine for neighborhood recommendations
+Loads every neighborhood metric of a city into NumPy arrays once so that
+normalization, weighting and ranking run as whole-array operations
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from app.models.neighborhood import NeighborhoodData, NeighborhoodFactors
+from app.models.geospatial import Locality, LocalityStats
+
+# Order of the columns in the normalized factor matrix
+FACTORS = ['rent', 'grocery', 'aqi', 'hygiene', 'amenities', 'connectivity', 'delivery']
+
+# Request weight key for each factor
+FACTOR_WEIGHT_KEYS = {
+    'rent': 'rent',
+    'grocery': 'grocery_cost',
+    'aqi': 'aqi',
+    'hygiene': 'hygiene',
+    'amenities': 'amenities',
+    'connectivity': 'connectivity',
+    'delivery': 'delivery_availability'
+}
+
+DEFAULT_WEIGHTS = {
+    'rent': 0.25,
+    'grocery_cost': 0.15,
+    'delivery_availability': 0.10,
+    'aqi': 0.15,
+    'hygiene': 0.10,
+    'amenities': 0.15,
+    'connectivity': 0.10
+}
+
+PROPERTY_TYPES = ['1BHK', '2BHK', '3BHK']
+
+# Row fields stored as float columns in CitySnapshot.columns
+COLUMNS = [
+    'rent_1bhk',
+    'rent_2bhk',
+    'rent_3bhk',
+    'grocery',
+    'aqi',
+    'hygiene',
+    'amenities_score',
+    'connectivity_score',
+    'delivery_count'
+]
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LATITUDE = 111.32
+
+CITY_GROCERY_DEFAULTS = {
+    "Bhopal": 4500,
+    "Indore": 5000,
+    "Gwalior": 4200,
+    "Jabalpur": 4300,
+    "Ujjain": 4000,
+    "Sagar": 3800,
+    "Ratlam": 3900,
+}
+
+
+def resolve_property_type(property_type: str) -> str:
+    """Map unknown property types to 2BHK, like the rent field lookup always did"""
+    return property_type if property_type in PROPERTY_TYPES else '2BHK'
+
+
+def build_weight_vector(weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Turn a request weights dict into a vector aligned with FACTORS
+
+    Provided weights are normalized to sum to 1.0; factors missing from the
+    dict fall back to their default weight
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+
+    total_weight = sum(weights.values())
+    if total_weight > 0:
+        weights = {k: v / total_weight for k, v in weights.items()}
+
+    return np.array([
+        weights.get(FACTOR_WEIGHT_KEYS[factor], DEFAULT_WEIGHTS[FACTOR_WEIGHT_KEYS[factor]])
+        for factor in FACTORS
+    ], dtype=np.float64)
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _inverted_min_max(values: np.ndarray) -> Optional[np.ndarray]:
+    """1 - min-max scaling (lower is better), None when all values are equal"""
+    v_min, v_max = values.min(), values.max()
+    if v_max > v_min:
+        return 1.0 - (values - v_min) / (v_max - v_min)
+    return None
+
+
+class CitySnapshot:
+    """Columnar view of every scored neighborhood in a city"""
+
+    def __init__(self, city: str, rows: List[Dict], columns: Optional[np.ndarray] = None):
+        self.city = city
+        self.rows = rows
+        self.size = len(rows)
+
+        # One (COLUMNS x neighborhoods) float matrix backs every metric array,
+        # so a snapshot can be shared as a single buffer and mapped without copying
+        if columns is None:
+            columns = np.array(
+                [[r[name] for r in rows] for name in COLUMNS],
+                dtype=np.float64
+            ).reshape(len(COLUMNS), self.size)
+        self.columns = columns
+
+        self.rent = {
+            pt: columns[COLUMNS.index('rent_' + pt.lower())]
+            for pt in PROPERTY_TYPES
+        }
+        self.grocery = columns[COLUMNS.index('grocery')]
+        self.aqi = columns[COLUMNS.index('aqi')]
+        self.hygiene = columns[COLUMNS.index('hygiene')]
+        self.amenities = columns[COLUMNS.index('amenities_score')]
+        self.connectivity = columns[COLUMNS.index('connectivity_score')]
+        self.delivery = columns[COLUMNS.index('delivery_count')]
+
+        # Request-independent part of the factor matrix, built once per property type
+        self._factor_cache: Dict[str, np.ndarray] = {}
+        # Latitude-sorted coordinates for distance filtering, built on first use
+        self._spatial_index: Optional[Dict[str, np.ndarray]] = None
+
+    @staticmethod
+    def load(db: Session, city: str, use_materialized: bool = True) -> 'CitySnapshot':
+        """
+        Load the snapshot for a city with a single joined query
+
+        Fetches NeighborhoodData together with its LocalityStats and the
+        locality name/coordinates instead of querying them per neighborhood.
+        Factor vectors materialized by the last city refresh are reused
+        when they are newer than the data they were computed from.
+        """
+        records = db.query(
+            NeighborhoodData.id.label('neighborhood_id'),
+            NeighborhoodData.locality_id,
+            NeighborhoodData.city,
+            NeighborhoodData.avg_rent_1bhk,
+            NeighborhoodData.avg_rent_2bhk,
+            NeighborhoodData.avg_rent_3bhk,
+            NeighborhoodData.avg_grocery_cost_monthly,
+            NeighborhoodData.aqi_value,
+            NeighborhoodData.aqi_category,
+            NeighborhoodData.avg_restaurant_rating,
+            NeighborhoodData.amenities_score,
+            NeighborhoodData.connectivity_score,
+            NeighborhoodData.blinkit_available,
+            NeighborhoodData.zomato_available,
+            NeighborhoodData.swiggy_available,
+            NeighborhoodData.hospitals_count,
+            NeighborhoodData.schools_count,
+            NeighborhoodData.parks_count,
+            NeighborhoodData.shopping_malls_count,
+            NeighborhoodData.restaurants_count,
+            NeighborhoodData.highly_rated_restaurants_count,
+            NeighborhoodData.grocery_stores_count,
+            LocalityStats.id.label('stats_id'),
+            LocalityStats.avg_rent_1bhk.label('stats_avg_rent_1bhk'),
+            LocalityStats.avg_rent_2bhk.label('stats_avg_rent_2bhk'),
+            LocalityStats.avg_rent_3bhk.label('stats_avg_rent_3bhk'),
+            LocalityStats.avg_grocery_cost_monthly.label('stats_avg_grocery_cost_monthly'),
+            Locality.name.label('locality_name'),
+            Locality.latitude,
+            Locality.longitude,
+            NeighborhoodData.updated_at,
+            LocalityStats.last_updated.label('stats_last_updated')
+        ).outerjoin(
+            LocalityStats, LocalityStats.locality_id == NeighborhoodData.locality_id
+        ).outerjoin(
+            Locality, Locality.id == NeighborhoodData.locality_id
+        ).filter(
+            NeighborhoodData.city == city
+        ).order_by(NeighborhoodData.id).all()
+
+        snapshot = CitySnapshot(city, [CitySnapshot._build_row(r) for r in records])
+        if use_materialized and snapshot.size:
+            data_updated_at = max(
+                (t for r in records for t in (r.updated_at, r.stats_last_updated) if t is not None),
+                default=None
+            )
+            snapshot._load_materialized_factors(db, data_updated_at)
+        return snapshot
+
+    def _load_materialized_factors(self, db: Session, data_updated_at):
+        """Prime the factor cache from neighborhood_factors if it covers the whole snapshot"""
+        factor_rows = db.query(
+            NeighborhoodFactors.neighborhood_id,
+            NeighborhoodFactors.property_type,
+            NeighborhoodFactors.computed_at,
+            *[getattr(NeighborhoodFactors, factor + '_factor') for factor in FACTORS]
+        ).filter(NeighborhoodFactors.city == self.city).all()
+
+        position = {row['neighborhood_id']: i for i, row in enumerate(self.rows)}
+        matrices = {pt: np.full((self.size, len(FACTORS)), np.nan) for pt in PROPERTY_TYPES}
+        filled = {pt: 0 for pt in PROPERTY_TYPES}
+        for f in factor_rows:
+            if data_updated_at and (f.computed_at is None or f.computed_at < data_updated_at):
+                return
+            i = position.get(f.neighborhood_id)
+            if i is None or f.property_type not in matrices:
+                continue
+            matrices[f.property_type][i] = [getattr(f, factor + '_factor') for factor in FACTORS]
+            filled[f.property_type] += 1
+
+        for pt in PROPERTY_TYPES:
+            if filled[pt] == self.size:
+                self.prime_factors(pt, matrices[pt])
+
+    def prime_factors(self, property_type: str, factors: np.ndarray):
+        """Use an already computed (neighborhoods x FACTORS) matrix for a property type"""
+        self._factor_cache[property_type] = factors
+
+    @staticmethod
+    def _build_row(r) -> Dict:
+        """Resolve one joined record into the compact row the scorer uses"""
+        has_stats = r.stats_id is not None
+        row = {
+            'neighborhood_id': r.neighborhood_id,
+            'locality_id': r.locality_id,
+            'locality_name': r.locality_name if r.locality_name is not None else 'Unknown',
+            'latitude': r.latitude,
+            'longitude': r.longitude,
+            'city': r.city,
+            'aqi_category': r.aqi_category,
+            'blinkit_available': bool(r.blinkit_available),
+            'zomato_available': bool(r.zomato_available),
+            'swiggy_available': bool(r.swiggy_available),
+            'hospitals_count': r.hospitals_count or 0,
+            'schools_count': r.schools_count or 0,
+            'parks_count': r.parks_count or 0,
+            'shopping_malls_count': r.shopping_malls_count or 0,
+            'restaurants_count': r.restaurants_count or 0,
+            'highly_rated_restaurants_count': r.highly_rated_restaurants_count or 0,
+            'avg_restaurant_rating': r.avg_restaurant_rating,
+            'grocery_stores_count': r.grocery_stores_count or 0,
+        }
+        # Prefer scraped data from locality_stats over neighborhood_data
+        for pt in PROPERTY_TYPES:
+            field = 'avg_rent_' + pt.lower()
+            if has_stats:
+                row['rent_' + pt.lower()] = getattr(r, 'stats_' + field) or getattr(r, field) or 0
+            else:
+                row['rent_' + pt.lower()] = getattr(r, field) or 0
+        grocery_default = CITY_GROCERY_DEFAULTS.get(r.city, 4500)
+        if has_stats:
+            row['grocery'] = r.stats_avg_grocery_cost_monthly or r.avg_grocery_cost_monthly or grocery_default
+        else:
+            row['grocery'] = r.avg_grocery_cost_monthly or grocery_default
+        row['aqi'] = r.aqi_value or 50
+        row['hygiene'] = r.avg_restaurant_rating or 0
+        row['amenities_score'] = r.amenities_score or 0
+        row['connectivity_score'] = r.connectivity_score or 0
+        row['delivery_count'] = sum([
+            row['blinkit_available'],
+            row['zomato_available'],
+            row['swiggy_available']
+        ])
+        return row
+
+    def _static_factors(self, property_type: str) -> np.ndarray:
+        """
+        Normalized factors that depend only on city data
+
+        The rent column is NaN when every neighborhood has the same rent,
+        because that case is resolved against the request budget
+        """
+        cached = self._factor_cache.get(property_type)
+        if cached is not None:
+            return cached
+
+        factors = np.empty((self.size, len(FACTORS)), dtype=np.float64)
+
+        # Rent, grocery cost and AQI: lower is better, so invert
+        rent_normalized = _inverted_min_max(self.rent[property_type])
+        factors[:, 0] = np.nan if rent_normalized is None else rent_normalized
+
+        grocery_normalized = _inverted_min_max(self.grocery)
+        factors[:, 1] = 1.0 if grocery_normalized is None else grocery_normalized
+
+        aqi_normalized = _inverted_min_max(self.aqi)
+        if aqi_normalized is None:
+            aqi_normalized = np.where(self.aqi <= 50, 1.0, 0.5)
+        factors[:, 2] = aqi_normalized
+
+        # Hygiene: higher is better, scaled over the positive ratings only
+        positive = self.hygiene > 0
+        if positive.any():
+            hygiene_min = self.hygiene[positive].min()
+            hygiene_max = self.hygiene.max()
+            if hygiene_max > hygiene_min:
+                scaled = (self.hygiene - hygiene_min) / (hygiene_max - hygiene_min)
+                factors[:, 3] = np.where(positive, scaled, 0.0)
+            else:
+                factors[:, 3] = np.where(positive, 1.0, 0.0)
+        else:
+            factors[:, 3] = 0.0
+
+        # Amenities and connectivity are already on a 0-10 scale, delivery on 0-3
+        factors[:, 4] = np.where(self.amenities > 0, self.amenities / 10.0, 0.0)
+        factors[:, 5] = np.where(self.connectivity > 0, self.connectivity / 10.0, 0.0)
+        factors[:, 6] = np.where(self.delivery > 0, self.delivery / 3.0, 0.0)
+
+        self._factor_cache[property_type] = factors
+        return factors
+
+    def precompute_factors(self) -> Dict[str, np.ndarray]:
+        """Request-independent factor matrices for every property type"""
+        return {pt: self._static_factors(pt) for pt in PROPERTY_TYPES}
+
+    def normalization_bounds(self, property_type: str) -> Dict[str, Optional[float]]:
+        """Min/max of each min-max scaled metric, as used by _static_factors"""
+        positive_hygiene = self.hygiene[self.hygiene > 0]
+        rent = self.rent[property_type]
+        return {
+            'rent_min': float(rent.min()),
+            'rent_max': float(rent.max()),
+            'grocery_min': float(self.grocery.min()),
+            'grocery_max': float(self.grocery.max()),
+            'aqi_min': float(self.aqi.min()),
+            'aqi_max': float(self.aqi.max()),
+            'hygiene_min': float(positive_hygiene.min()) if positive_hygiene.size else None,
+            'hygiene_max': float(positive_hygiene.max()) if positive_hygiene.size else None
+        }
+
+    def factor_matrix(self, property_type: str, budget: float) -> np.ndarray:
+        """(neighborhoods x factors) matrix of normalized scores for a request"""
+        factors = self._static_factors(property_type)
+        if np.isnan(factors[0, 0]):
+            factors = factors.copy()
+            factors[:, 0] = np.where(self.rent[property_type] <= budget, 1.0, 0.0)
+        return factors
+
+    def monthly_cost(self, property_type: str, number_of_people: int) -> np.ndarray:
+        """Rent plus grocery cost for the household"""
+        return self.rent[property_type] + self.grocery * number_of_people
+
+    def _build_spatial_index(self) -> Dict[str, np.ndarray]:
+        """Neighborhoods with coordinates, sorted by latitude"""
+        located = np.array([
+            i for i, r in enumerate(self.rows)
+            if r['latitude'] is not None and r['longitude'] is not None
+        ], dtype=np.intp)
+        latitudes = np.array([self.rows[i]['latitude'] for i in located], dtype=np.float64)
+        longitudes = np.array([self.rows[i]['longitude'] for i in located], dtype=np.float64)
+        order = np.argsort(latitudes, kind='stable')
+        return {
+            'indices': located[order],
+            'latitudes': latitudes[order],
+            'longitudes': longitudes[order]
+        }
+
+    def within_distance(self, latitude: float, longitude: float, radius_km: float) -> Dict[str, np.ndarray]:
+        """
+        Neighborhoods within radius_km of a point, in row order
+
+        A binary search on the latitude-sorted index narrows the rows to a
+        latitude band, a longitude band trims it further and the haversine
+        distance is computed only for what is left. Neighborhoods without
+        coordinates are never returned.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = self._build_spatial_index()
+        index = self._spatial_index
+
+        lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+        start = np.searchsorted(index['latitudes'], latitude - lat_delta, side='left')
+        end = np.searchsorted(index['latitudes'], latitude + lat_delta, side='right')
+        indices = index['indices'][start:end]
+        latitudes = index['latitudes'][start:end]
+        longitudes = index['longitudes'][start:end]
+
+        # Longitude band, widened for the highest latitude in the band
+        max_lat = min(abs(latitude) + lat_delta, 89.9)
+        lon_delta = radius_km / (KM_PER_DEGREE_LATITUDE * np.cos(np.radians(max_lat)))
+        band = np.abs(longitudes - longitude) <= lon_delta
+
+        distances = haversine_km(latitude, longitude, latitudes[band], longitudes[band])
+        inside = distances <= radius_km
+        indices = indices[band][inside]
+        distances = distances[inside]
+
+        order = np.argsort(indices, kind='stable')
+        return {'indices': indices[order], 'distances_km': distances[order]}
+
+    def score(
+        self,
+        property_type: str,
+        budget: float,
+        number_of_people: int,
+        weights: Optional[Dict[str, float]] = None,
+        indices: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Score every neighborhood (or only the rows in indices) in one pass
+
+        Returns the factor matrix, the household monthly cost and the final
+        scores (weighted sum, halved for neighborhoods over budget), aligned
+        with indices when given. Factors stay normalized over the whole city.
+        """
+        property_type = resolve_property_type(property_type)
+        factors = self.factor_matrix(property_type, budget)
+        total_cost = self.monthly_cost(property_type, number_of_people)
+        if indices is not None:
+            factors = factors[indices]
+            total_cost = total_cost[indices]
+
+        scores = factors @ build_weight_vector(weights)
+        # Penalize if over budget
+        scores = np.where(total_cost > budget, scores * 0.5, scores)
+
+        return {
+            'factors': factors,
+            'total_cost': total_cost,
+            'scores': scores
+        }
+
+    def score_batch(self, profiles: List[Dict]) -> Dict:
+        """
+        Score many user profiles at once as a (profiles x neighborhoods) matrix
+
+        Each profile has budget, number_of_people and optional property_type
+        and weights. Profiles sharing a property type are scored with one
+        matrix product against that property type's factor matrix.
+        """
+        property_types = [resolve_property_type(p.get('property_type', '2BHK')) for p in profiles]
+        budgets = np.array([p['budget'] for p in profiles], dtype=np.float64)
+        people = np.array([p['number_of_people'] for p in profiles], dtype=np.float64)
+        weight_matrix = np.vstack([build_weight_vector(p.get('weights')) for p in profiles])
+
+        scores = np.empty((len(profiles), self.size), dtype=np.float64)
+        total_cost = np.empty((len(profiles), self.size), dtype=np.float64)
+        for property_type in set(property_types):
+            idx = np.flatnonzero([pt == property_type for pt in property_types])
+            factors = self._static_factors(property_type)
+            rent = self.rent[property_type]
+
+            if np.isnan(factors[0, 0]):
+                # Equal rents everywhere: the rent factor depends on each profile's budget
+                static = factors.copy()
+                static[:, 0] = 0.0
+                group_scores = weight_matrix[idx] @ static.T
+                group_scores += weight_matrix[idx, :1] * (rent[None, :] <= budgets[idx, None])
+            else:
+                group_scores = weight_matrix[idx] @ factors.T
+
+            group_cost = rent[None, :] + self.grocery[None, :] * people[idx, None]
+            # Penalize if over budget
+            scores[idx] = np.where(group_cost > budgets[idx, None], group_scores * 0.5, group_scores)
+            total_cost[idx] = group_cost
+
+        return {
+            'property_types': property_types,
+            'total_cost': total_cost,
+            'scores': scores
+        }
+
+
+def rank_top_n(scores: np.ndarray, top_n: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the top N scores, best first
+
+    Uses argpartition so only the selected rows are sorted. Ties keep the
+    original row order, matching a stable descending sort of all rows.
+    """
+    size = len(scores)
+    if size == 0:
+        return np.empty(0, dtype=np.intp)
+    if top_n is None or top_n >= size:
+        return np.lexsort((np.arange(size), -scores))
+    if top_n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    candidates = np.argpartition(-scores, top_n - 1)[:top_n]
+    threshold = scores[candidates].min()
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[:top_n - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, -scores[selected]))]
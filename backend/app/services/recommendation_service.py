@@ -1,12 +1,19 @@
 """
 Recommendation service that compares neighborhoods based on user parameters
 """
+from itertools import chain
+import numpy as np
 from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
-from math import sqrt
-from app.models.neighborhood import NeighborhoodData
-from app.models.geospatial import Locality
-from app.services.neighborhood_service import NeighborhoodService
+from typing import List, Dict, Iterator, Optional
+from app.models.neighborhood import CityNormalization, NeighborhoodFactors
+from app.services.recommendation_engine import (
+    CitySnapshot,
+    FACTORS,
+    PROPERTY_TYPES,
+    rank_top_n,
+    resolve_property_type
+)
+from app.services.snapshot_cache import snapshot_cache
 
 class RecommendationService:
     """Service to recommend neighborhoods based on user criteria"""
@@ -19,7 +26,9 @@ class RecommendationService:
         max_travel_distance_km: float,
         budget: float,
         weights: Optional[Dict[str, float]] = None,
-        property_type: str = "2BHK"
+        property_type: str = "2BHK",
+        workplace_latitude: Optional[float] = None,
+        workplace_longitude: Optional[float] = None
     ) -> List[Dict]:
         """
         Recommend neighborhoods based on user parameters
@@ -31,223 +40,319 @@ class RecommendationService:
             budget: Monthly budget
             weights: Optional weights for different factors (defaults to equal weights)
             property_type: Property type (1BHK, 2BHK, 3BHK)
+            workplace_latitude: Optional workplace latitude; with the longitude, only
+                neighborhoods within max_travel_distance_km of it are scored
+            workplace_longitude: Optional workplace longitude
         
         Returns:
             List of recommended neighborhoods with scores
         """
-        # Default weights if not provided
-        if weights is None:
-            weights = {
-                'rent': 0.25,
-                'grocery_cost': 0.15,
-                'delivery_availability': 0.10,
-                'aqi': 0.15,
-                'hygiene': 0.10,
-                'amenities': 0.15,
-                'connectivity': 0.10
-            }
+        return RecommendationService.rank_neighborhoods(
+            db=db,
+            city=city,
+            number_of_people=number_of_people,
+            max_travel_distance_km=max_travel_distance_km,
+            budget=budget,
+            weights=weights,
+            property_type=property_type,
+            workplace_latitude=workplace_latitude,
+            workplace_longitude=workplace_longitude
+        )['recommendations']
+    
+    @staticmethod
+    def rank_neighborhoods(
+        db: Session,
+        city: str,
+        number_of_people: int,
+        max_travel_distance_km: float,
+        budget: float,
+        weights: Optional[Dict[str, float]] = None,
+        property_type: str = "2BHK",
+        top_n: Optional[int] = None,
+        include_all_scores: bool = False,
+        workplace_latitude: Optional[float] = None,
+        workplace_longitude: Optional[float] = None
+    ) -> Dict:
+        """
+        Score every neighborhood of a city and build responses for the top N only
         
-        # Normalize weights to sum to 1.0
-        total_weight = sum(weights.values())
-        if total_weight > 0:
-            weights = {k: v / total_weight for k, v in weights.items()}
+        The top N rows are selected on the score array first, so the full
+        response dicts are only built for those. With include_all_scores,
+        every neighborhood is also returned as a lightweight score entry.
+        When a workplace location is given, only neighborhoods within
+        max_travel_distance_km of it are scored.
+        
+        Returns:
+            Dict with recommendations, all_scores (or None) and total_neighborhoods
+        """
+        ranked = RecommendationService._rank(
+            db=db,
+            city=city,
+            number_of_people=number_of_people,
+            max_travel_distance_km=max_travel_distance_km,
+            budget=budget,
+            weights=weights,
+            property_type=property_type,
+            top_n=top_n,
+            workplace_latitude=workplace_latitude,
+            workplace_longitude=workplace_longitude
+        )
         
-        # Get all neighborhoods for the city
-        neighborhoods = NeighborhoodService.get_all_neighborhoods_by_city(db, city)
+        return {
+            'recommendations': list(RecommendationService._iter_recommendations(ranked)),
+            'all_scores': list(RecommendationService._iter_all_scores(ranked)) if include_all_scores else None,
+            'total_neighborhoods': len(ranked['scores'])
+        }
+    
+    @staticmethod
+    def stream_neighborhoods(
+        db: Session,
+        city: str,
+        number_of_people: int,
+        max_travel_distance_km: float,
+        budget: float,
+        weights: Optional[Dict[str, float]] = None,
+        property_type: str = "2BHK",
+        top_n: Optional[int] = None,
+        include_all_scores: bool = False,
+        workplace_latitude: Optional[float] = None,
+        workplace_longitude: Optional[float] = None
+    ) -> Iterator[Dict]:
+        """
+        Score every neighborhood now and yield the response records one at a time
         
-        if not neighborhoods:
-            return []
+        Detailed records for the top N come first; with include_all_scores
+        they are followed by a score-only record for every neighborhood.
+        """
+        ranked = RecommendationService._rank(
+            db=db,
+            city=city,
+            number_of_people=number_of_people,
+            max_travel_distance_km=max_travel_distance_km,
+            budget=budget,
+            weights=weights,
+            property_type=property_type,
+            top_n=top_n,
+            workplace_latitude=workplace_latitude,
+            workplace_longitude=workplace_longitude
+        )
         
-        # Get locality stats (which contain scraped data) for all localities
-        from app.models.geospatial import LocalityStats
-        locality_stats_map = {}
-        for n in neighborhoods:
-            if n.locality_id not in locality_stats_map:
-                stats = db.query(LocalityStats).filter(
-                    LocalityStats.locality_id == n.locality_id
-                ).first()
-                locality_stats_map[n.locality_id] = stats
+        records = RecommendationService._iter_recommendations(ranked)
+        if include_all_scores:
+            records = chain(records, RecommendationService._iter_all_scores(ranked))
+        return records
+    
+    @staticmethod
+    def _rank(
+        db: Session,
+        city: str,
+        number_of_people: int,
+        max_travel_distance_km: float,
+        budget: float,
+        weights: Optional[Dict[str, float]],
+        property_type: str,
+        top_n: Optional[int],
+        workplace_latitude: Optional[float] = None,
+        workplace_longitude: Optional[float] = None
+    ) -> Dict:
+        """Score a city and select the top N rows, without building any response objects"""
+        # Reuse the cached city snapshot (one joined query on a miss) and score every candidate in one pass
+        snapshot = snapshot_cache.get(db, city)
+        property_type = resolve_property_type(property_type)
         
-        # Get the appropriate rent field based on property type
-        rent_field_map = {
-            '1BHK': 'avg_rent_1bhk',
-            '2BHK': 'avg_rent_2bhk',
-            '3BHK': 'avg_rent_3bhk'
-        }
-        rent_field = rent_field_map.get(property_type, 'avg_rent_2bhk')
+        # Prune to neighborhoods within travel distance of the workplace before scoring
+        candidates = RecommendationService._candidates(
+            snapshot, max_travel_distance_km, workplace_latitude, workplace_longitude
+        )
+        if candidates is None:
+            indices = np.arange(snapshot.size)
+            distances = [None] * snapshot.size
+        else:
+            indices = candidates['indices']
+            distances = candidates['distances_km'].tolist()
         
-        # Extract all values for normalization
-        # Prefer locality_stats (scraped data) over neighborhood_data
-        city_grocery_defaults = {
-            "Bhopal": 4500,
-            "Indore": 5000,
-            "Gwalior": 4200,
-            "Jabalpur": 4300,
-            "Ujjain": 4000,
-            "Sagar": 3800,
-            "Ratlam": 3900,
+        result = None
+        if len(indices):
+            result = snapshot.score(
+                property_type=property_type,
+                budget=budget,
+                number_of_people=number_of_people,
+                weights=weights,
+                indices=indices if candidates is not None else None
+            )
+        
+        scores = result['scores'] if result is not None else np.empty(0)
+        
+        # Select the top N by score (descending) before building any response objects
+        return {
+            'snapshot': snapshot,
+            'property_type': property_type,
+            'indices': indices.tolist(),
+            'distances': distances,
+            'result': result,
+            'scores': scores,
+            'order': rank_top_n(scores, top_n).tolist()
         }
+    
+    @staticmethod
+    def _candidates(
+        snapshot: CitySnapshot,
+        max_travel_distance_km: float,
+        workplace_latitude: Optional[float],
+        workplace_longitude: Optional[float]
+    ) -> Optional[Dict]:
+        """Neighborhoods within travel distance of the workplace, or None when no workplace is given"""
+        if workplace_latitude is None or workplace_longitude is None:
+            return None
+        return snapshot.within_distance(workplace_latitude, workplace_longitude, max_travel_distance_km)
+    
+    @staticmethod
+    def _iter_recommendations(ranked: Dict) -> Iterator[Dict]:
+        """Build the detailed response dict of each selected row, best first"""
+        snapshot = ranked['snapshot']
+        for position in ranked['order']:
+            i = ranked['indices'][position]
+            yield RecommendationService._build_recommendation(
+                row=snapshot.rows[i],
+                rent=snapshot.rent[ranked['property_type']][i],
+                score=ranked['result']['scores'][position],
+                total_monthly_cost=ranked['result']['total_cost'][position],
+                factors=ranked['result']['factors'][position],
+                distance_km=ranked['distances'][position]
+            )
+    
+    @staticmethod
+    def _iter_all_scores(ranked: Dict) -> Iterator[Dict]:
+        """Lightweight score entries for every scored neighborhood, best first"""
+        snapshot = ranked['snapshot']
+        scores = ranked['scores']
+        score_values = scores.tolist()
+        for position in rank_top_n(scores).tolist():
+            row = snapshot.rows[ranked['indices'][position]]
+            yield {
+                'neighborhood_id': row['neighborhood_id'],
+                'locality_id': row['locality_id'],
+                'score': score_values[position]
+            }
+    
+    @staticmethod
+    def recommend_batch(
+        db: Session,
+        city: str,
+        profiles: List[Dict],
+        top_n: int = 10
+    ) -> Dict:
+        """
+        Get top N recommendations for many user profiles in one call
         
-        rent_values = []
-        grocery_values = []
-        for n in neighborhoods:
-            stats = locality_stats_map.get(n.locality_id)
-            # Prefer scraped data from locality_stats
-            if stats:
-                rent_val = getattr(stats, rent_field) or getattr(n, rent_field) or 0
-                grocery_val = stats.avg_grocery_cost_monthly or n.avg_grocery_cost_monthly or city_grocery_defaults.get(n.city, 4500)
-            else:
-                rent_val = getattr(n, rent_field) or 0
-                grocery_val = n.avg_grocery_cost_monthly or city_grocery_defaults.get(n.city, 4500)
-            rent_values.append(rent_val)
-            grocery_values.append(grocery_val)
-        aqi_values = [n.aqi_value or 50 for n in neighborhoods]
-        hygiene_values = [n.avg_restaurant_rating or 0 for n in neighborhoods]
-        amenities_scores = [n.amenities_score or 0 for n in neighborhoods]
-        connectivity_scores = [n.connectivity_score or 0 for n in neighborhoods]
+        The city snapshot is loaded once and every profile is scored against
+        every neighborhood as a single matrix operation.
         
-        # Calculate delivery availability scores
-        delivery_scores = []
-        for n in neighborhoods:
-            delivery_count = sum([
-                n.blinkit_available,
-                n.zomato_available,
-                n.swiggy_available
-            ])
-            delivery_scores.append(delivery_count)
+        Args:
+            city: City name
+            profiles: Dicts with number_of_people, max_travel_distance_km, budget,
+                property_type and optional weights and workplace_latitude/longitude
+            top_n: Number of top recommendations per profile
+        """
+        snapshot = snapshot_cache.get(db, city)
         
-        # Normalize all metrics (0-1 scale)
-        normalized_data = []
+        if snapshot.size == 0 or not profiles:
+            return {
+                'results': [
+                    {'profile_index': index, 'recommendations': []}
+                    for index in range(len(profiles))
+                ],
+                'total_neighborhoods': snapshot.size
+            }
         
-        # Safety check: ensure we have values to normalize
-        if not rent_values or not grocery_values or not aqi_values:
-            return []
+        batch = snapshot.score_batch(profiles)
         
-        for i, neighborhood in enumerate(neighborhoods):
-            # Use scraped data from locality_stats if available
-            stats = locality_stats_map.get(neighborhood.locality_id)
-            if stats:
-                rent = getattr(stats, rent_field) or getattr(neighborhood, rent_field) or 0
-                grocery = stats.avg_grocery_cost_monthly or neighborhood.avg_grocery_cost_monthly or city_grocery_defaults.get(neighborhood.city, 4500)
-            else:
-                rent = getattr(neighborhood, rent_field) or 0
-                grocery = neighborhood.avg_grocery_cost_monthly or city_grocery_defaults.get(neighborhood.city, 4500)
-            aqi = neighborhood.aqi_value or 50
-            hygiene = neighborhood.avg_restaurant_rating or 0
-            amenities = neighborhood.amenities_score or 0
-            connectivity = neighborhood.connectivity_score or 0
-            delivery = delivery_scores[i]
-            
-            # Normalize rent (lower is better, so invert)
-            rent_min, rent_max = min(rent_values), max(rent_values)
-            if rent_max > rent_min:
-                rent_normalized = 1.0 - ((rent - rent_min) / (rent_max - rent_min))
-            else:
-                rent_normalized = 1.0 if rent <= budget else 0.0
-            
-            # Normalize grocery cost (lower is better)
-            grocery_min, grocery_max = min(grocery_values), max(grocery_values)
-            if grocery_max > grocery_min:
-                grocery_normalized = 1.0 - ((grocery - grocery_min) / (grocery_max - grocery_min))
-            else:
-                grocery_normalized = 1.0
+        results = []
+        for index, profile in enumerate(profiles):
+            property_type = batch['property_types'][index]
+            scores = batch['scores'][index]
+            factors = snapshot.factor_matrix(property_type, profile['budget'])
             
-            # Normalize AQI (lower is better, good AQI = higher score)
-            aqi_min, aqi_max = min(aqi_values), max(aqi_values)
-            if aqi_max > aqi_min:
-                aqi_normalized = 1.0 - ((aqi - aqi_min) / (aqi_max - aqi_min))
-            else:
-                aqi_normalized = 1.0 if aqi <= 50 else 0.5
-            
-            # Normalize hygiene (higher is better)
-            hygiene_positive = [h for h in hygiene_values if h > 0]
-            if hygiene_positive:
-                hygiene_min, hygiene_max = min(hygiene_positive), max(hygiene_values)
-                if hygiene_max > hygiene_min:
-                    hygiene_normalized = (hygiene - hygiene_min) / (hygiene_max - hygiene_min) if hygiene > 0 else 0.0
-                else:
-                    hygiene_normalized = 1.0 if hygiene > 0 else 0.0
-            else:
-                hygiene_normalized = 0.0
-            
-            # Normalize amenities (0-10 scale, already normalized)
-            amenities_normalized = amenities / 10.0 if amenities > 0 else 0.0
-            
-            # Normalize connectivity (0-10 scale, already normalized)
-            connectivity_normalized = connectivity / 10.0 if connectivity > 0 else 0.0
-            
-            # Normalize delivery (0-3 scale)
-            delivery_normalized = delivery / 3.0 if delivery > 0 else 0.0
-            
-            # Calculate weighted score
-            score = (
-                rent_normalized * weights.get('rent', 0.25) +
-                grocery_normalized * weights.get('grocery_cost', 0.15) +
-                delivery_normalized * weights.get('delivery_availability', 0.10) +
-                aqi_normalized * weights.get('aqi', 0.15) +
-                hygiene_normalized * weights.get('hygiene', 0.10) +
-                amenities_normalized * weights.get('amenities', 0.15) +
-                connectivity_normalized * weights.get('connectivity', 0.10)
+            candidates = RecommendationService._candidates(
+                snapshot,
+                profile.get('max_travel_distance_km', 0),
+                profile.get('workplace_latitude'),
+                profile.get('workplace_longitude')
             )
+            if candidates is None:
+                order = rank_top_n(scores, top_n).tolist()
+                distances = {}
+            else:
+                indices = candidates['indices']
+                order = indices[rank_top_n(scores[indices], top_n)].tolist()
+                distances = dict(zip(indices.tolist(), candidates['distances_km'].tolist()))
             
-            # Apply budget filter
-            total_monthly_cost = rent + (grocery * number_of_people)
-            if total_monthly_cost > budget:
-                # Penalize if over budget
-                score *= 0.5
-            
-            # Get locality info
-            locality = db.query(Locality).filter(
-                Locality.id == neighborhood.locality_id
-            ).first()
-            
-            normalized_data.append({
-                'neighborhood_id': neighborhood.id,
-                'locality_id': neighborhood.locality_id,
-                'locality_name': locality.name if locality else 'Unknown',
-                'city': neighborhood.city,
-                'score': score,
-                'rent': rent,
-                'grocery_cost': grocery if grocery > 0 else None,  # Return None if 0
-                'total_monthly_cost': total_monthly_cost,
-                'aqi': aqi,
-                'aqi_category': neighborhood.aqi_category,
-                'hygiene_rating': hygiene if hygiene > 0 else None,
-                'amenities_score': amenities,
-                'connectivity_score': connectivity,
-                'delivery_services': {
-                    'blinkit': neighborhood.blinkit_available,
-                    'zomato': neighborhood.zomato_available,
-                    'swiggy': neighborhood.swiggy_available
-                },
-                'amenities': {
-                    'hospitals': neighborhood.hospitals_count or 0,
-                    'schools': neighborhood.schools_count or 0,
-                    'parks': neighborhood.parks_count or 0,
-                    'malls': neighborhood.shopping_malls_count or 0
-                },
-                # Add food and restaurant data
-                'restaurants_count': neighborhood.restaurants_count or 0,
-                'highly_rated_restaurants': neighborhood.highly_rated_restaurants_count or 0,
-                'avg_restaurant_rating': neighborhood.avg_restaurant_rating if neighborhood.avg_restaurant_rating else None,
-                'grocery_stores_count': neighborhood.grocery_stores_count or 0,
-                'latitude': locality.latitude if locality else None,
-                'longitude': locality.longitude if locality else None,
-                'normalized_scores': {
-                    'rent': rent_normalized,
-                    'grocery': grocery_normalized,
-                    'aqi': aqi_normalized,
-                    'hygiene': hygiene_normalized,
-                    'amenities': amenities_normalized,
-                    'connectivity': connectivity_normalized,
-                    'delivery': delivery_normalized
-                }
-            })
+            recommendations = []
+            for i in order:
+                recommendations.append(RecommendationService._build_recommendation(
+                    row=snapshot.rows[i],
+                    rent=snapshot.rent[property_type][i],
+                    score=scores[i],
+                    total_monthly_cost=batch['total_cost'][index][i],
+                    factors=factors[i],
+                    distance_km=distances.get(i)
+                ))
+            results.append({'profile_index': index, 'recommendations': recommendations})
         
-        # Sort by score (descending)
-        normalized_data.sort(key=lambda x: x['score'], reverse=True)
+        return {
+            'results': results,
+            'total_neighborhoods': snapshot.size
+        }
+    
+    @staticmethod
+    def _build_recommendation(
+        row: Dict,
+        rent: float,
+        score: float,
+        total_monthly_cost: float,
+        factors,
+        distance_km: Optional[float] = None
+    ) -> Dict:
+        """Build the response dict for one scored neighborhood"""
+        grocery = row['grocery']
+        hygiene = row['hygiene']
+        normalized = dict(zip(FACTORS, factors.tolist()))
         
-        return normalized_data
+        return {
+            'neighborhood_id': row['neighborhood_id'],
+            'locality_id': row['locality_id'],
+            'locality_name': row['locality_name'],
+            'city': row['city'],
+            'score': float(score),
+            'rent': float(rent),
+            'grocery_cost': grocery if grocery > 0 else None,  # Return None if 0
+            'total_monthly_cost': float(total_monthly_cost),
+            'aqi': row['aqi'],
+            'aqi_category': row['aqi_category'],
+            'hygiene_rating': hygiene if hygiene > 0 else None,
+            'amenities_score': row['amenities_score'],
+            'connectivity_score': row['connectivity_score'],
+            'delivery_services': {
+                'blinkit': row['blinkit_available'],
+                'zomato': row['zomato_available'],
+                'swiggy': row['swiggy_available']
+            },
+            'amenities': {
+                'hospitals': row['hospitals_count'],
+                'schools': row['schools_count'],
+                'parks': row['parks_count'],
+                'malls': row['shopping_malls_count']
+            },
+            # Add food and restaurant data
+            'restaurants_count': row['restaurants_count'],
+            'highly_rated_restaurants': row['highly_rated_restaurants_count'],
+            'avg_restaurant_rating': row['avg_restaurant_rating'] if row['avg_restaurant_rating'] else None,
+            'grocery_stores_count': row['grocery_stores_count'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'distance_km': distance_km,
+            'normalized_scores': normalized
+        }
     
     @staticmethod
     def get_top_recommendations(
@@ -258,18 +363,75 @@ class RecommendationService:
         budget: float,
         weights: Optional[Dict[str, float]] = None,
         property_type: str = "2BHK",
-        top_n: int = 10
+        top_n: int = 10,
+        workplace_latitude: Optional[float] = None,
+        workplace_longitude: Optional[float] = None
     ) -> List[Dict]:
         """Get top N recommendations"""
-        recommendations = RecommendationService.recommend_neighborhoods(
+        return RecommendationService.rank_neighborhoods(
             db=db,
             city=city,
             number_of_people=number_of_people,
             max_travel_distance_km=max_travel_distance_km,
             budget=budget,
             weights=weights,
-            property_type=property_type
-        )
+            property_type=property_type,
+            top_n=top_n,
+            workplace_latitude=workplace_latitude,
+            workplace_longitude=workplace_longitude
+        )['recommendations']
+    
+    @staticmethod
+    def materialize_city_normalization(db: Session, city: str) -> Dict:
+        """
+        Store the normalization bounds and per-neighborhood factor vectors of a city
         
-        return recommendations[:top_n]
-
+        Run after a city refresh so recommendation requests only have to take
+        the weighted dot product and apply the budget penalty
+        """
+        snapshot = CitySnapshot.load(db, city, use_materialized=False)
+        
+        db.query(NeighborhoodFactors).filter(
+            NeighborhoodFactors.city == city
+        ).delete(synchronize_session=False)
+        db.query(CityNormalization).filter(
+            CityNormalization.city == city
+        ).delete(synchronize_session=False)
+        
+        if snapshot.size:
+            for property_type, factors in snapshot.precompute_factors().items():
+                db.add(CityNormalization(
+                    city=city,
+                    property_type=property_type,
+                    neighborhoods_count=snapshot.size,
+                    **snapshot.normalization_bounds(property_type)
+                ))
+                
+                factor_rows = []
+                for row, vector in zip(snapshot.rows, factors.tolist()):
+                    factor_row = {
+                        'neighborhood_id': row['neighborhood_id'],
+                        'city': city,
+                        'property_type': property_type
+                    }
+                    for factor, value in zip(FACTORS, vector):
+                        # NaN rent marks a city where every rent is equal
+                        factor_row[factor + '_factor'] = None if value != value else value
+                    factor_rows.append(factor_row)
+                db.bulk_insert_mappings(NeighborhoodFactors, factor_rows)
+        
+        db.commit()
+        snapshot_cache.invalidate(city)
+        
+        return {
+            'city': city,
+            'neighborhoods_count': snapshot.size,
+            'property_types': PROPERTY_TYPES if snapshot.size else []
+        }
+    
+    @staticmethod
+    def get_city_normalization(db: Session, city: str) -> List[CityNormalization]:
+        """Get the materialized normalization bounds of a city"""
+        return db.query(CityNormalization).filter(
+            CityNormalization.city == city
+        ).order_by(CityNormalization.property_type).all()
@@ -0,0 +1,310 @@
+"""
+Executor for city-wide neighborhood refreshes
+Localities are refreshed in batches by a bounded worker pool, each batch on
+its own database session and committed once. Progress is stored in the
+refresh_jobs table, so any API worker can report it while the job runs.
+Google Places counters of a job are kept by the process running it.
+A running job records a heartbeat; jobs whose process died (worker restart,
+redeploy) stop sending it and are marked failed. Only one job runs per city.
+"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.geospatial import Locality
+from app.models.neighborhood import RefreshJob
+from app.services.places import PlacesFetcher
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+# Postgres advisory lock serializing "is a job active for this city" checks across API workers
+REFRESH_JOBS_LOCK_KEY = 725_100_011
+
+
+class RefreshExecutor:
+    """Runs refresh jobs with a bounded pool of workers"""
+
+    def __init__(self, max_workers: Optional[int] = None, batch_size: Optional[int] = None):
+        self.max_workers = max_workers or settings.REFRESH_MAX_WORKERS
+        self.batch_size = batch_size or settings.REFRESH_BATCH_SIZE
+        self._places_lock = threading.Lock()
+        self._places_stats: Dict[str, Dict] = OrderedDict()  # job id -> Places API counters, most recent jobs
+
+    @staticmethod
+    def create_job(db: Session, cities: List[str]) -> RefreshJob:
+        """Record a pending refresh job for the given cities"""
+        job = RefreshJob(
+            id=uuid.uuid4().hex,
+            cities=cities,
+            status="pending",
+            errors=[],
+            normalization={},
+            heartbeat_at=datetime.utcnow()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    @staticmethod
+    def expire_stale_jobs(db: Session) -> int:
+        """
+        Mark pending or running jobs without a recent heartbeat as failed
+
+        Jobs run in a thread of the process that submitted them, so a worker
+        restart or redeploy ends them without updating their row.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.REFRESH_JOB_STALE_SECONDS)
+        expired = db.query(RefreshJob).filter(
+            RefreshJob.status.in_(ACTIVE_STATUSES),
+            func.coalesce(RefreshJob.heartbeat_at, RefreshJob.started_at, RefreshJob.created_at) < cutoff
+        ).update({
+            'status': 'failed',
+            'error': f"No heartbeat for {settings.REFRESH_JOB_STALE_SECONDS}s, the process running the job stopped",
+            'finished_at': now
+        }, synchronize_session=False)
+        db.commit()
+        if expired:
+            logger.warning(f"Marked {expired} stale refresh jobs as failed")
+        return expired
+
+    @staticmethod
+    def get_active_job(db: Session, city: str) -> Optional[RefreshJob]:
+        """The pending or running job refreshing a city, if any"""
+        return db.query(RefreshJob).filter(
+            RefreshJob.status.in_(ACTIVE_STATUSES),
+            RefreshJob.cities.contains([city])
+        ).order_by(RefreshJob.created_at).first()
+
+    def submit(self, db: Session, cities: List[str], force: bool = False) -> Tuple[RefreshJob, bool]:
+        """
+        Create a job and run it in a background thread, returning immediately
+
+        Returns (job, created). When a job is already active for one of the
+        cities, that job is returned with created=False and nothing starts.
+        With force=True every source is refreshed, not only the stale ones
+        """
+        self.expire_stale_jobs(db)
+
+        # Held until the new job is committed, so two submits cannot both start one
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': REFRESH_JOBS_LOCK_KEY})
+        for city in cities:
+            active = self.get_active_job(db, city)
+            if active:
+                db.commit()
+                return active, False
+        job = self.create_job(db, cities)
+
+        thread = threading.Thread(
+            target=self.run,
+            args=(job.id,),
+            kwargs={'force': force},
+            name=f"refresh-{job.id[:8]}",
+            daemon=True
+        )
+        thread.start()
+        return job, True
+
+    @staticmethod
+    def _send_heartbeats(job_id: str, stop: threading.Event):
+        """Touch heartbeat_at of a job every REFRESH_HEARTBEAT_SECONDS until stop is set"""
+        while not stop.wait(settings.REFRESH_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                db.query(RefreshJob).filter(
+                    RefreshJob.id == job_id,
+                    RefreshJob.status.in_(ACTIVE_STATUSES)
+                ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Refresh job {job_id} heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def run(
+        self,
+        job_id: str,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        force: bool = False
+    ) -> Dict:
+        """
+        Run a job to completion in the calling thread
+
+        on_progress is called with the job status after every committed batch
+        """
+        stop_heartbeats = threading.Event()
+        heartbeats = threading.Thread(
+            target=self._send_heartbeats,
+            args=(job_id, stop_heartbeats),
+            name=f"refresh-heartbeat-{job_id[:8]}",
+            daemon=True
+        )
+        heartbeats.start()
+        db = SessionLocal()
+        try:
+            job = db.query(RefreshJob).filter(RefreshJob.id == job_id).first()
+            if not job:
+                raise ValueError(f"Refresh job not found: {job_id}")
+
+            localities_by_city = {
+                city: [
+                    locality_id for (locality_id,) in db.query(Locality.id)
+                    .filter(Locality.city == city)
+                    .order_by(Locality.id)
+                    .all()
+                ]
+                for city in job.cities
+            }
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            job.heartbeat_at = job.started_at
+            job.total_localities = sum(len(ids) for ids in localities_by_city.values())
+            db.commit()
+
+            errors = []
+            unlocated = []
+            normalization = {}
+            # One fetcher per job: places are deduplicated across batches and cities
+            places = PlacesFetcher()
+            for city, locality_ids in localities_by_city.items():
+                self._refresh_city(db, job, city, locality_ids, errors, unlocated, on_progress, places, force)
+
+                # Precompute normalization tables for the refreshed city
+                from app.services.recommendation_service import RecommendationService
+                normalization[city] = RecommendationService.materialize_city_normalization(db=db, city=city)
+                job.normalization = dict(normalization)
+                db.commit()
+
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            logger.info(f"Refresh job {job_id} Places API usage: {self._places_stats.get(job_id)}")
+            return self.job_status(job)
+        except Exception as e:
+            logger.exception(f"Refresh job {job_id} failed")
+            db.rollback()
+            job = db.query(RefreshJob).filter(RefreshJob.id == job_id).first()
+            if job:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.commit()
+            raise
+        finally:
+            stop_heartbeats.set()
+            db.close()
+
+    def _refresh_city(
+        self,
+        db: Session,
+        job: RefreshJob,
+        city: str,
+        locality_ids: List[int],
+        errors: List[Dict],
+        unlocated: List[Dict],
+        on_progress: Optional[Callable[[Dict], None]],
+        places: PlacesFetcher,
+        force: bool = False
+    ):
+        """Refresh every locality of a city, batch by batch, recording progress on the job"""
+        batches = [
+            locality_ids[i:i + self.batch_size]
+            for i in range(0, len(locality_ids), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"refresh-{city}") as pool:
+            futures = {pool.submit(self._refresh_batch, city, batch, places, force): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The whole batch was rolled back
+                    result = {
+                        'refreshed': [],
+                        'errors': [{'locality_id': locality_id, 'error': str(e)} for locality_id in batch],
+                        'unlocated': []
+                    }
+
+                self._record_places(job.id, places)
+                errors.extend(result['errors'])
+                job.processed_localities = (job.processed_localities or 0) + len(batch)
+                job.refreshed_count = (job.refreshed_count or 0) + len(result['refreshed'])
+                job.errors = list(errors)
+                unlocated.extend(result['unlocated'])
+                job.unlocated = list(unlocated)
+                db.commit()
+
+                if on_progress:
+                    on_progress(self.job_status(job))
+
+    def _record_places(self, job_id: str, places: PlacesFetcher):
+        with self._places_lock:
+            self._places_stats[job_id] = places.stats()
+            self._places_stats.move_to_end(job_id)
+            while len(self._places_stats) > 100:
+                self._places_stats.popitem(last=False)
+
+    @staticmethod
+    def _refresh_batch(city: str, locality_ids: List[int], places: PlacesFetcher, force: bool = False) -> Dict:
+        """Refresh one batch of localities on a session owned by this worker, committed once"""
+        from app.services.neighborhood_service import NeighborhoodService
+
+        db = SessionLocal()
+        try:
+            localities = db.query(Locality).filter(Locality.id.in_(locality_ids)).order_by(Locality.id).all()
+            return NeighborhoodService.aggregate_localities(
+                db=db, localities=localities, city=city, places=places, force=force
+            )
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_job(db: Session, job_id: str) -> Optional[RefreshJob]:
+        """Get a refresh job by id, after failing stale jobs so pollers see lost jobs end"""
+        RefreshExecutor.expire_stale_jobs(db)
+        return db.query(RefreshJob).filter(RefreshJob.id == job_id).first()
+
+    def job_status(self, job: RefreshJob) -> Dict:
+        """Progress summary of a job, with its Places API counters when this process runs it"""
+        total = job.total_localities or 0
+        processed = job.processed_localities or 0
+        refreshed = job.refreshed_count or 0
+        errors = job.errors or []
+        unlocated = job.unlocated or []
+        return {
+            'job_id': job.id,
+            'cities': job.cities,
+            'status': job.status,
+            'total_localities': total,
+            'processed_localities': processed,
+            'refreshed_count': refreshed,
+            # Already up to date
+            'skipped_count': max(0, processed - refreshed - len(errors) - len(unlocated)),
+            'unlocated_count': len(unlocated),
+            'progress': processed / total if total else (1.0 if job.status == "completed" else 0.0),
+            'errors': errors,
+            'unlocated': unlocated,
+            'normalization': job.normalization or {},
+            'error': job.error,
+            'places_api': self._places_stats.get(job.id),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+            'heartbeat_at': job.heartbeat_at
+        }
+
+
+refresh_executor = RefreshExecutor()
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from app.models.rent import RentListing
 from app.models.geospatial import Locality
 from app.schemas.rent import RentListingCreate
@@ -50,6 +50,85 @@ class RentService:
         result = query.scalar()
         return float(result) if result else None
     
+    @staticmethod
+    def get_rent_stats_by_locality(
+        db: Session,
+        locality_ids: List[int]
+    ) -> Dict[int, Dict]:
+        """
+        Rent statistics of many localities in one GROUP BY query
+        
+        Returns, for every locality id, the total listing count, the latest
+        listing update and avg/median/count by property type, e.g.
+        {'count': 12, 'updated_at': datetime, 'by_type': {'2BHK': {'avg': ..., 'median': ..., 'count': 7}}}
+        """
+        stats = {
+            locality_id: {'count': 0, 'updated_at': None, 'by_type': {}}
+            for locality_id in locality_ids
+        }
+        if not locality_ids:
+            return stats
+        
+        rows = db.query(
+            RentListing.locality_id,
+            RentListing.property_type,
+            func.avg(RentListing.rent_amount),
+            func.percentile_cont(0.5).within_group(RentListing.rent_amount),
+            func.count(RentListing.id),
+            func.max(RentListing.updated_at)
+        ).filter(
+            RentListing.locality_id.in_(locality_ids)
+        ).group_by(RentListing.locality_id, RentListing.property_type).all()
+        
+        for locality_id, property_type, avg_rent, median_rent, count, updated_at in rows:
+            entry = stats[locality_id]
+            entry['by_type'][property_type] = {
+                'avg': float(avg_rent) if avg_rent else None,
+                'median': float(median_rent) if median_rent else None,
+                'count': count
+            }
+            entry['count'] += count
+            if updated_at and (entry['updated_at'] is None or updated_at > entry['updated_at']):
+                entry['updated_at'] = updated_at
+        return stats
+    
+    @staticmethod
+    def get_avg_rents(
+        db: Session,
+        city: Optional[str] = None
+    ) -> Dict[Tuple[int, Optional[str]], float]:
+        """
+        Average rent of every locality, by property type, in one GROUP BY query
+        
+        Keys are (locality_id, property_type); (locality_id, None) holds the
+        average over all property types, as get_avg_rent_by_locality returns
+        it without a property type.
+        """
+        query = db.query(
+            RentListing.locality_id,
+            RentListing.property_type,
+            func.sum(RentListing.rent_amount),
+            func.count(RentListing.id)
+        ).filter(RentListing.locality_id.isnot(None))
+        if city:
+            query = query.join(Locality, Locality.id == RentListing.locality_id).filter(Locality.city == city)
+        
+        averages = {}
+        totals: Dict[int, List[float]] = {}
+        for locality_id, property_type, rent_sum, count in query.group_by(
+            RentListing.locality_id, RentListing.property_type
+        ):
+            if not count:
+                continue
+            if property_type:
+                averages[(locality_id, property_type)] = float(rent_sum) / count
+            total = totals.setdefault(locality_id, [0.0, 0])
+            total[0] += float(rent_sum)
+            total[1] += count
+        for locality_id, (rent_sum, count) in totals.items():
+            averages[(locality_id, None)] = rent_sum / count
+        return averages
+    
     @staticmethod
     def scrape_nobroker(locality: str, city: str = "Bhopal") -> List[dict]:
         """Scrape NoBroker listings"""
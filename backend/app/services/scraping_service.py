@@ -1,17 +1,30 @@
 """
-Scraping services for neighborhood data including AQI, delivery availability, 
+Scraping services for neighborhood data including AQI, delivery availability,
 hygiene indicators, and amenities
+
+Every source has a blocking method and an async variant that takes an
+AsyncScrapingClient; both go through the pooled clients of http_client and
+parse responses with the same helpers, so they return the same fields.
+Both variants share the grid-cell cache of geo_cache.
 """
-import requests
-import time
-from typing import Dict, List, Optional
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
 from app.core.config import settings
+from app.services import overpass
+from app.services.geo_cache import geo_cache, geo_cached
+from app.services.http_client import AsyncScrapingClient, http_get
+from app.services.places import PlacesFetcher, places_fetcher
+
+logger = logging.getLogger(__name__)
+
 
 class AQIScrapingService:
     """Service to scrape Air Quality Index data"""
     
     @staticmethod
+    @geo_cached('aqi')
     def get_aqi_by_location(latitude: float, longitude: float, city: str) -> Dict:
         """
         Get AQI data for a location
@@ -22,73 +35,117 @@ class AQIScrapingService:
             # Requires API key in config
             api_key = getattr(settings, 'OPENWEATHER_API_KEY', None)
             if api_key:
-                url = "http://api.openweathermap.org/data/2.5/air_pollution"
-                params = {
-                    'lat': latitude,
-                    'lon': longitude,
-                    'appid': api_key
-                }
-                response = requests.get(url, params=params, timeout=10)
+                url, params = AQIScrapingService._openweather_request(latitude, longitude, api_key)
+                response = http_get(url, params=params)
                 if response.status_code == 200:
-                    data = response.json()
-                    components = data.get('list', [{}])[0].get('components', {})
-                    aqi = data.get('list', [{}])[0].get('main', {}).get('aqi', 0)
-                    
-                    return {
-                        'aqi_value': aqi,
-                        'aqi_category': AQIScrapingService._get_aqi_category(aqi),
-                        'aqi_pm25': components.get('pm2_5', 0),
-                        'aqi_pm10': components.get('pm10', 0),
-                        'aqi_no2': components.get('no2', 0),
-                        'source': 'openweathermap',
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
+                    return AQIScrapingService._parse_openweather(response.json())
             
             # Option 2: Using AQICN API (free, no key required for basic usage)
             # Fallback if OpenWeatherMap not available
-            url = f"https://api.waqi.info/feed/geo:{latitude};{longitude}/"
-            token = getattr(settings, 'AQICN_TOKEN', 'demo')  # 'demo' token for testing
-            params = {'token': token}
-            
-            response = requests.get(url, params=params, timeout=10)
+            url, params = AQIScrapingService._aqicn_request(latitude, longitude)
+            response = http_get(url, params=params)
             if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'ok':
-                    aqi_data = data.get('data', {})
-                    iaqi = aqi_data.get('iaqi', {})
-                    
-                    return {
-                        'aqi_value': aqi_data.get('aqi', 0),
-                        'aqi_category': AQIScrapingService._get_aqi_category(aqi_data.get('aqi', 0)),
-                        'aqi_pm25': iaqi.get('pm25', {}).get('v', 0) if isinstance(iaqi.get('pm25'), dict) else 0,
-                        'aqi_pm10': iaqi.get('pm10', {}).get('v', 0) if isinstance(iaqi.get('pm10'), dict) else 0,
-                        'aqi_no2': iaqi.get('no2', {}).get('v', 0) if isinstance(iaqi.get('no2'), dict) else 0,
-                        'source': 'aqicn',
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
+                aqi = AQIScrapingService._parse_aqicn(response.json())
+                if aqi:
+                    return aqi
             
             # Fallback: Return default values if APIs fail
-            return {
-                'aqi_value': 50,  # Moderate
-                'aqi_category': 'Moderate',
-                'aqi_pm25': 0,
-                'aqi_pm10': 0,
-                'aqi_no2': 0,
-                'source': 'default',
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return AQIScrapingService._default_aqi('default')
+        
+        except Exception as e:
+            print(f"Error fetching AQI: {e}")
+            return AQIScrapingService._default_aqi('error')
+    
+    @staticmethod
+    @geo_cached('aqi')
+    async def get_aqi_by_location_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str
+    ) -> Dict:
+        """Async variant of get_aqi_by_location"""
+        try:
+            api_key = getattr(settings, 'OPENWEATHER_API_KEY', None)
+            if api_key:
+                url, params = AQIScrapingService._openweather_request(latitude, longitude, api_key)
+                response = await client.get(url, params=params)
+                if response.status_code == 200:
+                    return AQIScrapingService._parse_openweather(response.json())
+            
+            url, params = AQIScrapingService._aqicn_request(latitude, longitude)
+            response = await client.get(url, params=params)
+            if response.status_code == 200:
+                aqi = AQIScrapingService._parse_aqicn(response.json())
+                if aqi:
+                    return aqi
             
+            return AQIScrapingService._default_aqi('default')
+        
         except Exception as e:
             print(f"Error fetching AQI: {e}")
-            return {
-                'aqi_value': 50,
-                'aqi_category': 'Moderate',
-                'aqi_pm25': 0,
-                'aqi_pm10': 0,
-                'aqi_no2': 0,
-                'source': 'error',
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return AQIScrapingService._default_aqi('error')
+    
+    @staticmethod
+    def _openweather_request(latitude: float, longitude: float, api_key: str):
+        url = "http://api.openweathermap.org/data/2.5/air_pollution"
+        params = {
+            'lat': latitude,
+            'lon': longitude,
+            'appid': api_key
+        }
+        return url, params
+    
+    @staticmethod
+    def _aqicn_request(latitude: float, longitude: float):
+        url = f"https://api.waqi.info/feed/geo:{latitude};{longitude}/"
+        token = getattr(settings, 'AQICN_TOKEN', 'demo')  # 'demo' token for testing
+        return url, {'token': token}
+    
+    @staticmethod
+    def _parse_openweather(data: Dict) -> Dict:
+        components = data.get('list', [{}])[0].get('components', {})
+        aqi = data.get('list', [{}])[0].get('main', {}).get('aqi', 0)
+        
+        return {
+            'aqi_value': aqi,
+            'aqi_category': AQIScrapingService._get_aqi_category(aqi),
+            'aqi_pm25': components.get('pm2_5', 0),
+            'aqi_pm10': components.get('pm10', 0),
+            'aqi_no2': components.get('no2', 0),
+            'source': 'openweathermap',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _parse_aqicn(data: Dict) -> Optional[Dict]:
+        """AQI fields from an AQICN feed, None unless the feed status is ok"""
+        if data.get('status') != 'ok':
+            return None
+        aqi_data = data.get('data', {})
+        iaqi = aqi_data.get('iaqi', {})
+        
+        return {
+            'aqi_value': aqi_data.get('aqi', 0),
+            'aqi_category': AQIScrapingService._get_aqi_category(aqi_data.get('aqi', 0)),
+            'aqi_pm25': iaqi.get('pm25', {}).get('v', 0) if isinstance(iaqi.get('pm25'), dict) else 0,
+            'aqi_pm10': iaqi.get('pm10', {}).get('v', 0) if isinstance(iaqi.get('pm10'), dict) else 0,
+            'aqi_no2': iaqi.get('no2', {}).get('v', 0) if isinstance(iaqi.get('no2'), dict) else 0,
+            'source': 'aqicn',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _default_aqi(source: str) -> Dict:
+        return {
+            'aqi_value': 50,  # Moderate
+            'aqi_category': 'Moderate',
+            'aqi_pm25': 0,
+            'aqi_pm10': 0,
+            'aqi_no2': 0,
+            'source': source,
+            'timestamp': datetime.utcnow().isoformat()
+        }
     
     @staticmethod
     def _get_aqi_category(aqi: float) -> str:
@@ -116,29 +173,58 @@ class DeliveryAvailabilityService:
         try:
             # Blinkit API endpoint (may require API key or scraping)
             # This is a placeholder - actual implementation would use their API
-            url = "https://blinkit.com/api/location/check"
-            headers = {
-                'User-Agent': settings.USER_AGENT,
-                'Accept': 'application/json'
-            }
-            params = {
-                'lat': latitude,
-                'lng': longitude,
-                'city': city
-            }
-            
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            url, headers, params = DeliveryAvailabilityService._blinkit_request(latitude, longitude, city)
+            response = http_get(url, headers=headers, params=params)
+            if response.status_code == 200:
+                return DeliveryAvailabilityService._parse_blinkit(response.json())
+        except Exception as e:
+            print(f"Error checking Blinkit availability: {e}")
+        
+        return DeliveryAvailabilityService._blinkit_fallback(city)
+    
+    @staticmethod
+    async def check_blinkit_availability_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str
+    ) -> Dict:
+        """Async variant of check_blinkit_availability"""
+        try:
+            url, headers, params = DeliveryAvailabilityService._blinkit_request(latitude, longitude, city)
+            response = await client.get(url, headers=headers, params=params)
             if response.status_code == 200:
-                data = response.json()
-                return {
-                    'available': data.get('serviceable', False),
-                    'delivery_time': data.get('estimated_delivery_time', None),
-                    'source': 'blinkit_api',
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+                return DeliveryAvailabilityService._parse_blinkit(response.json())
         except Exception as e:
             print(f"Error checking Blinkit availability: {e}")
         
+        return DeliveryAvailabilityService._blinkit_fallback(city)
+    
+    @staticmethod
+    def _blinkit_request(latitude: float, longitude: float, city: str):
+        url = "https://blinkit.com/api/location/check"
+        headers = {
+            'User-Agent': settings.USER_AGENT,
+            'Accept': 'application/json'
+        }
+        params = {
+            'lat': latitude,
+            'lng': longitude,
+            'city': city
+        }
+        return url, headers, params
+    
+    @staticmethod
+    def _parse_blinkit(data: Dict) -> Dict:
+        return {
+            'available': data.get('serviceable', False),
+            'delivery_time': data.get('estimated_delivery_time', None),
+            'source': 'blinkit_api',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _blinkit_fallback(city: str) -> Dict:
         # Fallback: Try to determine based on city (Blinkit operates in major cities)
         major_cities = ['Delhi', 'Mumbai', 'Bangalore', 'Hyderabad', 'Pune', 'Chennai', 'Kolkata']
         return {
@@ -155,34 +241,56 @@ class DeliveryAvailabilityService:
             # Zomato API (requires API key)
             api_key = getattr(settings, 'ZOMATO_API_KEY', None)
             if api_key:
-                url = "https://developers.zomato.com/api/v2.1/geocode"
-                headers = {
-                    'user-key': api_key,
-                    'Accept': 'application/json'
-                }
-                params = {
-                    'lat': latitude,
-                    'lon': longitude
-                }
-                
-                response = requests.get(url, headers=headers, params=params, timeout=10)
+                url, headers, params = DeliveryAvailabilityService._zomato_request(latitude, longitude, api_key)
+                response = http_get(url, headers=headers, params=params)
                 if response.status_code == 200:
-                    data = response.json()
-                    restaurants = data.get('nearby_restaurants', [])
-                    return {
-                        'available': len(restaurants) > 0,
-                        'restaurants_count': len(restaurants),
-                        'source': 'zomato_api',
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
+                    return DeliveryAvailabilityService._parse_zomato(response.json())
         except Exception as e:
             print(f"Error checking Zomato availability: {e}")
         
         # Fallback
+        return DeliveryAvailabilityService._restaurants_fallback()
+    
+    @staticmethod
+    async def check_zomato_availability_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str
+    ) -> Dict:
+        """Async variant of check_zomato_availability"""
+        try:
+            api_key = getattr(settings, 'ZOMATO_API_KEY', None)
+            if api_key:
+                url, headers, params = DeliveryAvailabilityService._zomato_request(latitude, longitude, api_key)
+                response = await client.get(url, headers=headers, params=params)
+                if response.status_code == 200:
+                    return DeliveryAvailabilityService._parse_zomato(response.json())
+        except Exception as e:
+            print(f"Error checking Zomato availability: {e}")
+        
+        return DeliveryAvailabilityService._restaurants_fallback()
+    
+    @staticmethod
+    def _zomato_request(latitude: float, longitude: float, api_key: str):
+        url = "https://developers.zomato.com/api/v2.1/geocode"
+        headers = {
+            'user-key': api_key,
+            'Accept': 'application/json'
+        }
+        params = {
+            'lat': latitude,
+            'lon': longitude
+        }
+        return url, headers, params
+    
+    @staticmethod
+    def _parse_zomato(data: Dict) -> Dict:
+        restaurants = data.get('nearby_restaurants', [])
         return {
-            'available': True,  # Zomato is widely available
-            'restaurants_count': 0,
-            'source': 'fallback',
+            'available': len(restaurants) > 0,
+            'restaurants_count': len(restaurants),
+            'source': 'zomato_api',
             'timestamp': datetime.utcnow().isoformat()
         }
     
@@ -191,38 +299,68 @@ class DeliveryAvailabilityService:
         """Check if Swiggy delivers to this location"""
         try:
             # Swiggy API endpoint (may require scraping or API key)
-            url = "https://www.swiggy.com/api/restaurants"
-            headers = {
-                'User-Agent': settings.USER_AGENT,
-                'Accept': 'application/json'
-            }
-            params = {
-                'lat': latitude,
-                'lng': longitude
-            }
-            
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            url, headers, params = DeliveryAvailabilityService._swiggy_request(latitude, longitude)
+            response = http_get(url, headers=headers, params=params)
             if response.status_code == 200:
-                data = response.json()
-                restaurants = data.get('data', {}).get('cards', [])
-                return {
-                    'available': len(restaurants) > 0,
-                    'restaurants_count': len(restaurants),
-                    'source': 'swiggy_api',
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+                return DeliveryAvailabilityService._parse_swiggy(response.json())
         except Exception as e:
             print(f"Error checking Swiggy availability: {e}")
         
         # Fallback
+        return DeliveryAvailabilityService._restaurants_fallback()
+    
+    @staticmethod
+    async def check_swiggy_availability_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str
+    ) -> Dict:
+        """Async variant of check_swiggy_availability"""
+        try:
+            url, headers, params = DeliveryAvailabilityService._swiggy_request(latitude, longitude)
+            response = await client.get(url, headers=headers, params=params)
+            if response.status_code == 200:
+                return DeliveryAvailabilityService._parse_swiggy(response.json())
+        except Exception as e:
+            print(f"Error checking Swiggy availability: {e}")
+        
+        return DeliveryAvailabilityService._restaurants_fallback()
+    
+    @staticmethod
+    def _swiggy_request(latitude: float, longitude: float):
+        url = "https://www.swiggy.com/api/restaurants"
+        headers = {
+            'User-Agent': settings.USER_AGENT,
+            'Accept': 'application/json'
+        }
+        params = {
+            'lat': latitude,
+            'lng': longitude
+        }
+        return url, headers, params
+    
+    @staticmethod
+    def _parse_swiggy(data: Dict) -> Dict:
+        restaurants = data.get('data', {}).get('cards', [])
         return {
-            'available': True,
+            'available': len(restaurants) > 0,
+            'restaurants_count': len(restaurants),
+            'source': 'swiggy_api',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _restaurants_fallback() -> Dict:
+        return {
+            'available': True,  # Zomato and Swiggy are widely available
             'restaurants_count': 0,
             'source': 'fallback',
             'timestamp': datetime.utcnow().isoformat()
         }
     
     @staticmethod
+    @geo_cached('delivery', type_args=('city',))
     def get_all_delivery_services(latitude: float, longitude: float, city: str) -> Dict:
         """Get availability for all delivery services"""
         return {
@@ -230,13 +368,40 @@ class DeliveryAvailabilityService:
             'zomato': DeliveryAvailabilityService.check_zomato_availability(latitude, longitude, city),
             'swiggy': DeliveryAvailabilityService.check_swiggy_availability(latitude, longitude, city)
         }
+    
+    @staticmethod
+    @geo_cached('delivery', type_args=('city',))
+    async def get_all_delivery_services_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str
+    ) -> Dict:
+        """Check all delivery services concurrently"""
+        blinkit, zomato, swiggy = await asyncio.gather(
+            DeliveryAvailabilityService.check_blinkit_availability_async(client, latitude, longitude, city),
+            DeliveryAvailabilityService.check_zomato_availability_async(client, latitude, longitude, city),
+            DeliveryAvailabilityService.check_swiggy_availability_async(client, latitude, longitude, city)
+        )
+        return {
+            'blinkit': blinkit,
+            'zomato': zomato,
+            'swiggy': swiggy
+        }
 
 
 class HygieneIndicatorService:
     """Service to get restaurant hygiene indicators and ratings"""
     
     @staticmethod
-    def get_restaurant_ratings(latitude: float, longitude: float, city: str, radius_km: float = 2.0) -> Dict:
+    @geo_cached('hygiene')
+    def get_restaurant_ratings(
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
         """
         Get restaurant ratings and hygiene indicators
         Uses Zomato API or Google Places API
@@ -245,143 +410,208 @@ class HygieneIndicatorService:
             # Option 1: Zomato API
             api_key = getattr(settings, 'ZOMATO_API_KEY', None)
             if api_key:
-                url = "https://developers.zomato.com/api/v2.1/search"
-                headers = {
-                    'user-key': api_key,
-                    'Accept': 'application/json'
-                }
-                params = {
-                    'lat': latitude,
-                    'lon': longitude,
-                    'radius': int(radius_km * 1000),  # Convert to meters
-                    'count': 100  # Get up to 100 restaurants
-                }
-                
-                response = requests.get(url, headers=headers, params=params, timeout=10)
+                url, headers, params = HygieneIndicatorService._zomato_request(latitude, longitude, radius_km, api_key)
+                response = http_get(url, headers=headers, params=params)
                 if response.status_code == 200:
-                    data = response.json()
-                    restaurants = data.get('restaurants', [])
-                    
-                    if restaurants:
-                        ratings = [r['restaurant'].get('user_rating', {}).get('aggregate_rating', 0) 
-                                 for r in restaurants if r['restaurant'].get('user_rating', {}).get('aggregate_rating')]
-                        ratings = [float(r) for r in ratings if r and r != '0']
-                        
-                        if ratings:
-                            avg_rating = sum(ratings) / len(ratings)
-                            highly_rated = len([r for r in ratings if r >= 4.0])
-                            
-                            return {
-                                'avg_restaurant_rating': avg_rating,
-                                'restaurants_count': len(restaurants),
-                                'highly_rated_restaurants_count': highly_rated,
-                                'source': 'zomato_api',
-                                'timestamp': datetime.utcnow().isoformat()
-                            }
+                    ratings = HygieneIndicatorService._parse_zomato(response.json())
+                    if ratings:
+                        return ratings
             
-            # Option 2: Google Places API (fallback)
+            # Option 2: Google Places API (fallback), every result page
             google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
             if google_api_key:
-                url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                params = {
-                    'location': f"{latitude},{longitude}",
-                    'radius': int(radius_km * 1000),
-                    'type': 'restaurant',
-                    'key': google_api_key
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    restaurants = data.get('results', [])
-                    
-                    if restaurants:
-                        ratings = [r.get('rating', 0) for r in restaurants if r.get('rating')]
-                        ratings = [float(r) for r in ratings if r and r > 0]
-                        
-                        if ratings:
-                            avg_rating = sum(ratings) / len(ratings)
-                            highly_rated = len([r for r in ratings if r >= 4.0])
-                            
-                            return {
-                                'avg_restaurant_rating': avg_rating,
-                                'restaurants_count': len(restaurants),
-                                'highly_rated_restaurants_count': highly_rated,
-                                'source': 'google_places',
-                                'timestamp': datetime.utcnow().isoformat()
-                            }
+                restaurants = (places or places_fetcher).nearby(latitude, longitude, radius_km, 'restaurant')
+                ratings = HygieneIndicatorService._parse_google(restaurants)
+                if ratings:
+                    return ratings
             
             # Fallback
-            return {
-                'avg_restaurant_rating': 3.5,
-                'restaurants_count': 0,
-                'highly_rated_restaurants_count': 0,
-                'source': 'fallback',
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return HygieneIndicatorService._default_ratings('fallback')
+        
+        except Exception as e:
+            print(f"Error fetching restaurant ratings: {e}")
+            return HygieneIndicatorService._default_ratings('error')
+    
+    @staticmethod
+    @geo_cached('hygiene')
+    async def get_restaurant_ratings_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
+        """Async variant of get_restaurant_ratings"""
+        try:
+            api_key = getattr(settings, 'ZOMATO_API_KEY', None)
+            if api_key:
+                url, headers, params = HygieneIndicatorService._zomato_request(latitude, longitude, radius_km, api_key)
+                response = await client.get(url, headers=headers, params=params)
+                if response.status_code == 200:
+                    ratings = HygieneIndicatorService._parse_zomato(response.json())
+                    if ratings:
+                        return ratings
+            
+            google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
+            if google_api_key:
+                restaurants = await (places or places_fetcher).nearby_async(
+                    client, latitude, longitude, radius_km, 'restaurant'
+                )
+                ratings = HygieneIndicatorService._parse_google(restaurants)
+                if ratings:
+                    return ratings
             
+            return HygieneIndicatorService._default_ratings('fallback')
+        
         except Exception as e:
             print(f"Error fetching restaurant ratings: {e}")
-            return {
-                'avg_restaurant_rating': 3.5,
-                'restaurants_count': 0,
-                'highly_rated_restaurants_count': 0,
-                'source': 'error',
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return HygieneIndicatorService._default_ratings('error')
+    
+    @staticmethod
+    def _zomato_request(latitude: float, longitude: float, radius_km: float, api_key: str):
+        url = "https://developers.zomato.com/api/v2.1/search"
+        headers = {
+            'user-key': api_key,
+            'Accept': 'application/json'
+        }
+        params = {
+            'lat': latitude,
+            'lon': longitude,
+            'radius': int(radius_km * 1000),  # Convert to meters
+            'count': 100  # Get up to 100 restaurants
+        }
+        return url, headers, params
+    
+    @staticmethod
+    def _parse_zomato(data: Dict) -> Optional[Dict]:
+        """Rating summary from a Zomato search, None when no restaurant is rated"""
+        restaurants = data.get('restaurants', [])
+        ratings = [r['restaurant'].get('user_rating', {}).get('aggregate_rating', 0)
+                 for r in restaurants if r['restaurant'].get('user_rating', {}).get('aggregate_rating')]
+        ratings = [float(r) for r in ratings if r and r != '0']
+        return HygieneIndicatorService._summarize(ratings, len(restaurants), 'zomato_api')
+    
+    @staticmethod
+    def _parse_google(restaurants: List[Dict]) -> Optional[Dict]:
+        """Rating summary from Google Places results, None when no restaurant is rated"""
+        ratings = [r.get('rating', 0) for r in restaurants if r.get('rating')]
+        ratings = [float(r) for r in ratings if r and r > 0]
+        return HygieneIndicatorService._summarize(ratings, len(restaurants), 'google_places')
+    
+    @staticmethod
+    def _summarize(ratings: List[float], restaurants_count: int, source: str) -> Optional[Dict]:
+        if not ratings:
+            return None
+        avg_rating = sum(ratings) / len(ratings)
+        highly_rated = len([r for r in ratings if r >= 4.0])
+        
+        return {
+            'avg_restaurant_rating': avg_rating,
+            'restaurants_count': restaurants_count,
+            'highly_rated_restaurants_count': highly_rated,
+            'source': source,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _default_ratings(source: str) -> Dict:
+        return {
+            'avg_restaurant_rating': 3.5,
+            'restaurants_count': 0,
+            'highly_rated_restaurants_count': 0,
+            'source': source,
+            'timestamp': datetime.utcnow().isoformat()
+        }
 
 
 class GroceryStoresService:
-    """Service to find nearby grocery stores using Google Places API"""
+    """Service to find nearby grocery stores from the local OSM index or Google Places API"""
+    
+    # Search for grocery stores and supermarkets
+    GROCERY_TYPES = ['supermarket', 'grocery_or_supermarket', 'store']
     
     @staticmethod
-    def get_nearby_grocery_stores(latitude: float, longitude: float, city: str, radius_km: float = 2.0) -> Dict:
+    @geo_cached('grocery')
+    def get_nearby_grocery_stores(
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
         """
-        Get nearby grocery stores using Google Places API
+        Get nearby grocery stores from the local OSM index or Google Places API
         """
+        from app.services.poi_service import PoiService
+        
+        local = PoiService.local_stores(latitude, longitude, radius_km)
+        if local is not None:
+            return GroceryStoresService._local(local)
+        
         try:
             google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
             if google_api_key:
-                url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                
-                # Search for grocery stores and supermarkets
-                grocery_types = ['supermarket', 'grocery_or_supermarket', 'store']
-                all_stores = []
-                
-                for place_type in grocery_types:
-                    try:
-                        params = {
-                            'location': f"{latitude},{longitude}",
-                            'radius': int(radius_km * 1000),
-                            'type': place_type,
-                            'key': google_api_key
-                        }
-                        
-                        response = requests.get(url, params=params, timeout=10)
-                        if response.status_code == 200:
-                            data = response.json()
-                            results = data.get('results', [])
-                            all_stores.extend(results)
-                        time.sleep(0.1)
-                    except Exception as e:
-                        print(f"Error fetching {place_type}: {e}")
-                
-                # Remove duplicates by place_id
-                unique_stores = {}
-                for store in all_stores:
-                    place_id = store.get('place_id')
-                    if place_id and place_id not in unique_stores:
-                        unique_stores[place_id] = store
-                
-                return {
-                    'grocery_stores_count': len(unique_stores),
-                    'stores': list(unique_stores.values())[:20],  # Limit to 20
-                    'source': 'google_places',
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+                # Every page of every type, one entry per place_id
+                all_stores = (places or places_fetcher).nearby_types(
+                    latitude, longitude, radius_km, GroceryStoresService.GROCERY_TYPES
+                )
+                return GroceryStoresService._summarize(all_stores)
+        except Exception as e:
+            print(f"Error fetching grocery stores: {e}")
+        
+        return GroceryStoresService._fallback()
+    
+    @staticmethod
+    @geo_cached('grocery')
+    async def get_nearby_grocery_stores_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
+        """Async variant of get_nearby_grocery_stores, searching every place type concurrently"""
+        from app.services.poi_service import PoiService
+        
+        local = await asyncio.to_thread(PoiService.local_stores, latitude, longitude, radius_km)
+        if local is not None:
+            return GroceryStoresService._local(local)
+        
+        try:
+            google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
+            if google_api_key:
+                all_stores = await (places or places_fetcher).nearby_types_async(
+                    client, latitude, longitude, radius_km, GroceryStoresService.GROCERY_TYPES
+                )
+                return GroceryStoresService._summarize(all_stores)
         except Exception as e:
             print(f"Error fetching grocery stores: {e}")
         
+        return GroceryStoresService._fallback()
+    
+    @staticmethod
+    def _summarize(all_stores: List[Dict]) -> Dict:
+        # Already one entry per place_id (see PlacesFetcher.nearby_types)
+        return {
+            'grocery_stores_count': len(all_stores),
+            'stores': all_stores[:20],  # Limit to 20
+            'source': 'google_places',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _local(local: Dict) -> Dict:
+        return {
+            'grocery_stores_count': local['grocery_stores_count'],
+            'stores': local['stores'],
+            'source': 'osm_local',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _fallback() -> Dict:
         return {
             'grocery_stores_count': 0,
             'stores': [],
@@ -393,117 +623,309 @@ class GroceryStoresService:
 class AmenitiesService:
     """Service to find nearby amenities and services"""
     
+    GOOGLE_PLACE_TYPES = {
+        'hospitals_count': 'hospital',
+        'schools_count': 'school',
+        'parks_count': 'park',
+        'shopping_malls_count': 'shopping_mall',
+        'metro_stations_count': 'subway_station',
+        'bus_stops_count': 'bus_station'
+    }
+    
+    # Categories of the local pois table (see poi_service.POI_CATEGORIES)
+    POI_CATEGORIES = {
+        'hospitals_count': 'hospital',
+        'schools_count': 'school',
+        'parks_count': 'park',
+        'shopping_malls_count': 'shopping_mall',
+        'metro_stations_count': 'metro_station',
+        'bus_stops_count': 'bus_stop'
+    }
+    
     @staticmethod
-    def get_nearby_amenities(latitude: float, longitude: float, city: str, radius_km: float = 2.0) -> Dict:
+    @geo_cached('amenities')
+    def get_nearby_amenities(
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        osm_elements: Optional[List[Dict]] = None,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
         """
-        Get nearby amenities using Google Places API or OpenStreetMap
+        Get nearby amenities from the local OSM index, Google Places API or OpenStreetMap
+        
+        osm_elements are Overpass elements already fetched for an area covering
+        this radius (see overpass.build_query); without them one batched query
+        is sent for the locality.
         """
-        amenities = {
-            'hospitals_count': 0,
-            'schools_count': 0,
-            'parks_count': 0,
-            'shopping_malls_count': 0,
-            'metro_stations_count': 0,
-            'bus_stops_count': 0,
-            'source': 'fallback',
-            'timestamp': datetime.utcnow().isoformat()
-        }
+        from app.services.poi_service import PoiService
+        
+        local = PoiService.local_counts(latitude, longitude, radius_km, AmenitiesService.POI_CATEGORIES.values())
+        if local is not None:
+            return AmenitiesService._local_amenities(local)
+        
+        amenities = AmenitiesService._empty_amenities()
         
         try:
             # Use Google Places API if available
             google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
             if google_api_key:
-                place_types = {
-                    'hospitals_count': 'hospital',
-                    'schools_count': 'school',
-                    'parks_count': 'park',
-                    'shopping_malls_count': 'shopping_mall',
-                    'metro_stations_count': 'subway_station',
-                    'bus_stops_count': 'bus_station'
-                }
-                
-                for count_key, place_type in place_types.items():
+                # Counts over every result page, not just the first 20
+                places = places or places_fetcher
+                failed = False
+                for count_key, place_type in AmenitiesService.GOOGLE_PLACE_TYPES.items():
                     try:
-                        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                        params = {
-                            'location': f"{latitude},{longitude}",
-                            'radius': int(radius_km * 1000),
-                            'type': place_type,
-                            'key': google_api_key
-                        }
-                        
-                        response = requests.get(url, params=params, timeout=10)
-                        if response.status_code == 200:
-                            data = response.json()
-                            amenities[count_key] = len(data.get('results', []))
-                        
-                        time.sleep(0.1)  # Rate limiting
+                        amenities[count_key] = len(places.nearby(latitude, longitude, radius_km, place_type))
                     except Exception as e:
                         print(f"Error fetching {place_type}: {e}")
+                        failed = True
                 
-                amenities['source'] = 'google_places'
+                # Partial counts (e.g. quota spent midway) are not cached
+                amenities['source'] = 'google_places_partial' if failed else 'google_places'
                 amenities['timestamp'] = datetime.utcnow().isoformat()
                 return amenities
             
             # Fallback: Use Overpass API (OpenStreetMap) - free, no key required
-            overpass_url = "https://overpass-api.de/api/interpreter"
-            
-            # Query for hospitals
+            # One batched query covers every amenity class, unless the caller
+            # already fetched the elements for a wider area
             try:
-                query = f"""
-                [out:json][timeout:25];
-                (
-                  node["amenity"="hospital"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                  way["amenity"="hospital"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                );
-                out count;
-                """
-                response = requests.post(overpass_url, data=query, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    amenities['hospitals_count'] = len(data.get('elements', []))
+                if osm_elements is None:
+                    osm_elements = overpass.fetch_elements(
+                        overpass.build_query(overpass.OSM_AMENITY_CLASSES, around=(latitude, longitude, radius_km))
+                    )
+                amenities.update(overpass.count_by_class(
+                    osm_elements, overpass.OSM_AMENITY_CLASSES, latitude, longitude, radius_km
+                ))
+                amenities['source'] = 'openstreetmap'
             except Exception as e:
-                print(f"Error fetching hospitals from OSM: {e}")
+                print(f"Error fetching amenities from OSM: {e}")
             
-            # Query for schools
-            try:
-                query = f"""
-                [out:json][timeout:25];
-                (
-                  node["amenity"="school"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                  way["amenity"="school"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                );
-                out count;
-                """
-                response = requests.post(overpass_url, data=query, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    amenities['schools_count'] = len(data.get('elements', []))
-            except Exception as e:
-                print(f"Error fetching schools from OSM: {e}")
+            amenities['timestamp'] = datetime.utcnow().isoformat()
+        
+        except Exception as e:
+            print(f"Error fetching amenities: {e}")
+        
+        return amenities
+    
+    @staticmethod
+    @geo_cached('amenities')
+    async def get_nearby_amenities_async(
+        client: AsyncScrapingClient,
+        latitude: float,
+        longitude: float,
+        city: str,
+        radius_km: float = 2.0,
+        osm_elements: Optional[List[Dict]] = None,
+        places: Optional[PlacesFetcher] = None
+    ) -> Dict:
+        """Async variant of get_nearby_amenities, querying every Google place type concurrently"""
+        from app.services.poi_service import PoiService
+        
+        local = await asyncio.to_thread(
+            PoiService.local_counts, latitude, longitude, radius_km, AmenitiesService.POI_CATEGORIES.values()
+        )
+        if local is not None:
+            return AmenitiesService._local_amenities(local)
+        
+        amenities = AmenitiesService._empty_amenities()
+        
+        try:
+            google_api_key = getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
+            if google_api_key:
+                places = places or places_fetcher
+                
+                async def fetch_google(count_key: str, place_type: str) -> bool:
+                    try:
+                        amenities[count_key] = len(
+                            await places.nearby_async(client, latitude, longitude, radius_km, place_type)
+                        )
+                        return True
+                    except Exception as e:
+                        print(f"Error fetching {place_type}: {e}")
+                        return False
+                
+                fetched = await asyncio.gather(*[
+                    fetch_google(count_key, place_type)
+                    for count_key, place_type in AmenitiesService.GOOGLE_PLACE_TYPES.items()
+                ])
+                amenities['source'] = 'google_places' if all(fetched) else 'google_places_partial'
+                amenities['timestamp'] = datetime.utcnow().isoformat()
+                return amenities
             
-            # Query for parks
             try:
-                query = f"""
-                [out:json][timeout:25];
-                (
-                  node["leisure"="park"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                  way["leisure"="park"](around:{int(radius_km * 1000)},{latitude},{longitude});
-                );
-                out count;
-                """
-                response = requests.post(overpass_url, data=query, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    amenities['parks_count'] = len(data.get('elements', []))
+                if osm_elements is None:
+                    osm_elements = await overpass.fetch_elements_async(
+                        client, overpass.build_query(overpass.OSM_AMENITY_CLASSES, around=(latitude, longitude, radius_km))
+                    )
+                amenities.update(overpass.count_by_class(
+                    osm_elements, overpass.OSM_AMENITY_CLASSES, latitude, longitude, radius_km
+                ))
+                amenities['source'] = 'openstreetmap'
             except Exception as e:
-                print(f"Error fetching parks from OSM: {e}")
+                print(f"Error fetching amenities from OSM: {e}")
             
-            amenities['source'] = 'openstreetmap'
             amenities['timestamp'] = datetime.utcnow().isoformat()
-            
+        
         except Exception as e:
             print(f"Error fetching amenities: {e}")
         
         return amenities
+    
+    @staticmethod
+    def _local_amenities(counts: Dict[str, int]) -> Dict:
+        amenities = AmenitiesService._empty_amenities()
+        for count_key, category in AmenitiesService.POI_CATEGORIES.items():
+            amenities[count_key] = counts.get(category, 0)
+        amenities['source'] = 'osm_local'
+        return amenities
+    
+    @staticmethod
+    def _empty_amenities() -> Dict:
+        return {
+            'hospitals_count': 0,
+            'schools_count': 0,
+            'parks_count': 0,
+            'shopping_malls_count': 0,
+            'metro_stations_count': 0,
+            'bus_stops_count': 0,
+            'source': 'fallback',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+
+# External sources of a locality, keys of the scrape_locality result
+SCRAPED_SOURCES = ('grocery', 'delivery', 'aqi', 'hygiene', 'amenities')
+
+
+def scrape_locality(
+    latitude: float,
+    longitude: float,
+    city: str,
+    osm_elements: Optional[List[Dict]] = None,
+    places: Optional[PlacesFetcher] = None,
+    sources: Optional[Iterable[str]] = None
+) -> Dict:
+    """
+    Fetch the external sources of a locality one after another
+    
+    sources limits the fetch to some of SCRAPED_SOURCES (all by default);
+    the result only has their keys.
+    """
+    sources = set(SCRAPED_SOURCES if sources is None else sources)
+    fetchers = {
+        'grocery': lambda: GroceryStoresService.get_nearby_grocery_stores(
+            latitude, longitude, city, radius_km=2.0, places=places
+        ),
+        'delivery': lambda: DeliveryAvailabilityService.get_all_delivery_services(latitude, longitude, city),
+        'aqi': lambda: AQIScrapingService.get_aqi_by_location(latitude, longitude, city),
+        'hygiene': lambda: HygieneIndicatorService.get_restaurant_ratings(
+            latitude, longitude, city, radius_km=2.0, places=places
+        ),
+        'amenities': lambda: AmenitiesService.get_nearby_amenities(
+            latitude, longitude, city, osm_elements=osm_elements, places=places
+        )
+    }
+    return {source: fetch() for source, fetch in fetchers.items() if source in sources}
+
 
+async def scrape_locality_async(
+    client: AsyncScrapingClient,
+    latitude: float,
+    longitude: float,
+    city: str,
+    osm_elements: Optional[List[Dict]] = None,
+    places: Optional[PlacesFetcher] = None,
+    sources: Optional[Iterable[str]] = None
+) -> Dict:
+    """Fetch the external sources of a locality concurrently, same result as scrape_locality"""
+    sources = set(SCRAPED_SOURCES if sources is None else sources)
+    fetchers = {
+        'grocery': lambda: GroceryStoresService.get_nearby_grocery_stores_async(
+            client, latitude, longitude, city, radius_km=2.0, places=places
+        ),
+        'delivery': lambda: DeliveryAvailabilityService.get_all_delivery_services_async(
+            client, latitude, longitude, city
+        ),
+        'aqi': lambda: AQIScrapingService.get_aqi_by_location_async(client, latitude, longitude, city),
+        'hygiene': lambda: HygieneIndicatorService.get_restaurant_ratings_async(
+            client, latitude, longitude, city, radius_km=2.0, places=places
+        ),
+        'amenities': lambda: AmenitiesService.get_nearby_amenities_async(
+            client, latitude, longitude, city, osm_elements=osm_elements, places=places
+        )
+    }
+    requested = [source for source in fetchers if source in sources]
+    results = await asyncio.gather(*[fetchers[source]() for source in requested])
+    return dict(zip(requested, results))
+
+
+async def fetch_area_amenities_async(
+    client: AsyncScrapingClient,
+    localities: List[Dict],
+    radius_km: float = 2.0
+) -> Optional[List[Dict]]:
+    """
+    OSM amenity elements for the bounding box of many localities in one query
+    
+    Returns None when amenities come from the local OSM index or Google
+    Places, or the query fails, in which case each locality queries its own
+    radius.
+    """
+    from app.services.poi_service import PoiService
+    
+    if len(localities) < 2 or getattr(settings, 'GOOGLE_PLACES_API_KEY', None):
+        return None
+    if await asyncio.to_thread(PoiService.local_available):
+        return None
+    try:
+        bbox = overpass.bounding_box([(l['latitude'], l['longitude']) for l in localities], radius_km)
+        return await overpass.fetch_elements_async(
+            client, overpass.build_query(overpass.OSM_AMENITY_CLASSES, bbox=bbox)
+        )
+    except Exception as e:
+        logger.warning(
+            f"City-wide OSM amenities query for {len(localities)} localities failed, "
+            f"falling back to one query per locality: {e!r}"
+        )
+        return None
+
+
+async def scrape_localities_async(
+    localities: List[Dict],
+    client: Optional[AsyncScrapingClient] = None,
+    places: Optional[PlacesFetcher] = None
+) -> List[Dict]:
+    """
+    Scrape many localities concurrently over one shared client
+    
+    Each locality is a dict with latitude, longitude, city and optionally
+    sources (see scrape_locality); results come back in the same order. Per-host limits keep every API within its budget.
+    OSM amenities are fetched once for the area of all localities and
+    bucketed per locality. Google Places calls go through places (a fresh
+    PlacesFetcher when not given), which dedups and counts them for the run.
+    """
+    owns_client = client is None
+    client = client or AsyncScrapingClient()
+    places = places or PlacesFetcher()
+    try:
+        # Localities with cached or up-to-date amenities need no Overpass data
+        uncached = [
+            l for l in localities
+            if 'amenities' in l.get('sources', SCRAPED_SOURCES)
+            and not await asyncio.to_thread(
+                geo_cache.contains,
+                AmenitiesService.get_nearby_amenities.cache_key(l['latitude'], l['longitude'], l['city'])
+            )
+        ]
+        osm_elements = await fetch_area_amenities_async(client, uncached)
+        return await asyncio.gather(*[
+            scrape_locality_async(
+                client, l['latitude'], l['longitude'], l['city'],
+                osm_elements=osm_elements, places=places, sources=l.get('sources')
+            )
+            for l in localities
+        ])
+    finally:
+        if owns_client:
+            await client.aclose()
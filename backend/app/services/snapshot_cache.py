@@ -0,0 +1,99 @@
+"""
+Cache of recommendation city snapshots
+Snapshots are rebuilt only when the neighborhood data of a city changes,
+so requests with different weights or budgets reuse the same arrays.
+Versions (and, depending on the backend, the arrays themselves) live in a
+SnapshotStore shared by all uvicorn workers.
+"""
+import threading
+import time
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.core.config import settings
+from app.services.recommendation_engine import CitySnapshot
+from app.services.snapshot_store import SnapshotStore, create_snapshot_store
+
+
+class SnapshotCache:
+    """Versioned per-city CitySnapshot cache with a TTL safety net"""
+
+    def __init__(self, ttl_seconds: float, store: Optional[SnapshotStore] = None):
+        self.ttl_seconds = ttl_seconds
+        self.store = store or SnapshotStore()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, db: Session, city: str) -> CitySnapshot:
+        """
+        Return the snapshot for a city
+
+        Tries this worker's copy first, then a snapshot published by another
+        worker, and only then loads it from the database and publishes it
+        """
+        version = self.store.get_version(city)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(city)
+            if entry and entry['version'] == version and now - entry['loaded_at'] < self.ttl_seconds:
+                self.hits += 1
+                return entry['snapshot']
+
+        snapshot = self.store.load(city, version, self.ttl_seconds)
+        if snapshot is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            snapshot = CitySnapshot.load(db, city)
+            self.store.save(city, version, snapshot)
+
+        # Tagged with the version read before loading, so a snapshot that was
+        # invalidated while loading is replaced on the next request
+        with self._lock:
+            self._entries[city] = {
+                'snapshot': snapshot,
+                'version': version,
+                'loaded_at': now
+            }
+        return snapshot
+
+    def invalidate(self, city: Optional[str] = None):
+        """Drop the snapshot of a city, or of every city when no city is given"""
+        self.store.invalidate(city)
+        with self._lock:
+            if city:
+                self._entries.pop(city, None)
+            else:
+                self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and the cached cities"""
+        with self._lock:
+            return {
+                'backend': type(self.store).__name__,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'ttl_seconds': self.ttl_seconds,
+                'cities': {
+                    city: {
+                        'version': entry['version'],
+                        'neighborhoods': entry['snapshot'].size,
+                        'age_seconds': time.monotonic() - entry['loaded_at']
+                    }
+                    for city, entry in self._entries.items()
+                }
+            }
+
+
+snapshot_cache = SnapshotCache(
+    ttl_seconds=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+    store=create_snapshot_store()
+)
@@ -0,0 +1,222 @@
+"""
+Shared storage for recommendation city snapshots
+Lets the uvicorn workers share snapshot versions and precomputed arrays,
+so after a refresh one worker queries Postgres and the others map its result
+"""
+import fcntl
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.services.recommendation_engine import CitySnapshot, COLUMNS, FACTORS
+
+# Snapshot buffer layout: 8-byte header length, JSON header padded to 8 bytes,
+# then the float64 column matrix and one factor matrix per property type, in C order
+_HEADER_LENGTH = struct.Struct('<Q')
+
+
+def pack_snapshot(snapshot: CitySnapshot, version: str) -> bytes:
+    """Serialize a snapshot, including its precomputed factor matrices, into a single buffer"""
+    factors = snapshot.precompute_factors() if snapshot.size else {}
+    header = json.dumps({
+        'city': snapshot.city,
+        'version': version,
+        'saved_at': time.time(),
+        'columns': COLUMNS,
+        'size': snapshot.size,
+        'factors': list(factors),
+        'rows': snapshot.rows
+    }).encode('utf-8')
+    header += b' ' * (-len(header) % 8)
+    arrays = [snapshot.columns] + list(factors.values())
+    data = b''.join(np.ascontiguousarray(a, dtype='<f8').tobytes() for a in arrays)
+    return _HEADER_LENGTH.pack(len(header)) + header + data
+
+
+def unpack_snapshot(buffer) -> Tuple[Dict, CitySnapshot]:
+    """
+    Rebuild a snapshot from a buffer produced by pack_snapshot
+
+    The column and factor matrices are read-only views into the buffer, not copies
+    """
+    (header_length,) = _HEADER_LENGTH.unpack_from(buffer, 0)
+    offset = _HEADER_LENGTH.size
+    header = json.loads(bytes(buffer[offset:offset + header_length]).decode('utf-8'))
+    if header['columns'] != COLUMNS:
+        raise ValueError("Snapshot was written with a different column layout")
+
+    size = header['size']
+    offset += header_length
+    columns = np.frombuffer(buffer, dtype='<f8', count=len(COLUMNS) * size, offset=offset)
+    snapshot = CitySnapshot(header['city'], header['rows'], columns=columns.reshape(len(COLUMNS), size))
+    offset += columns.nbytes
+
+    for property_type in header.get('factors', []):
+        factors = np.frombuffer(buffer, dtype='<f8', count=len(FACTORS) * size, offset=offset)
+        snapshot.prime_factors(property_type, factors.reshape(size, len(FACTORS)))
+        offset += factors.nbytes
+    return header, snapshot
+
+
+class SnapshotStore:
+    """
+    Version counters and optional shared payloads for city snapshots
+
+    The base store keeps versions in process and shares nothing; it is
+    used when a single worker serves requests
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+
+    def get_version(self, city: str) -> str:
+        """Current version of a city, bumped by per-city and global invalidations"""
+        with self._lock:
+            return f"{self._generation}.{self._versions.get(city, 0)}"
+
+    def invalidate(self, city: Optional[str] = None):
+        """Bump the version of a city, or of every city when no city is given"""
+        with self._lock:
+            if city:
+                self._versions[city] = self._versions.get(city, 0) + 1
+            else:
+                self._generation += 1
+
+    def load(self, city: str, version: str, max_age_seconds: float) -> Optional[CitySnapshot]:
+        """Shared snapshot for this exact version, if another worker published one"""
+        return None
+
+    def save(self, city: str, version: str, snapshot: CitySnapshot):
+        """Publish a snapshot for the other workers"""
+        pass
+
+    @staticmethod
+    def _is_current(header: Dict, city: str, version: str, max_age_seconds: float) -> bool:
+        return (
+            header.get('city') == city
+            and header.get('version') == version
+            and time.time() - header.get('saved_at', 0) < max_age_seconds
+        )
+
+
+class MmapSnapshotStore(SnapshotStore):
+    """
+    Snapshots stored as files in a shared-memory directory on one host
+
+    Each snapshot is written to a temporary file and renamed into place, and
+    readers mmap it, so workers share the same physical pages
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_-]', '_', name))
+
+    def _read_counter(self, name: str) -> int:
+        try:
+            with open(self._path(name) + '.version') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def get_version(self, city: str) -> str:
+        return f"{self._read_counter('_generation')}.{self._read_counter('city_' + city)}"
+
+    def invalidate(self, city: Optional[str] = None):
+        name = 'city_' + city if city else '_generation'
+        # Serialize increments across workers with an advisory file lock
+        with open(self._path('_lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                value = self._read_counter(name) + 1
+                tmp_path = f"{self._path(name)}.version.{os.getpid()}"
+                with open(tmp_path, 'w') as f:
+                    f.write(str(value))
+                os.replace(tmp_path, self._path(name) + '.version')
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, city: str, version: str, max_age_seconds: float) -> Optional[CitySnapshot]:
+        try:
+            with open(self._path('snapshot_' + city) + '.bin', 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        header, snapshot = unpack_snapshot(buffer)
+        if not self._is_current(header, city, version, max_age_seconds):
+            return None
+        return snapshot
+
+    def save(self, city: str, version: str, snapshot: CitySnapshot):
+        path = self._path('snapshot_' + city) + '.bin'
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(pack_snapshot(snapshot, version))
+        os.replace(tmp_path, path)
+
+
+class RedisSnapshotStore(SnapshotStore):
+    """
+    Snapshots stored in a Redis-protocol key-value store
+
+    Only get/set/incr are used, so any client exposing the redis-py API for
+    those commands (or a local stand-in) can be passed in
+    """
+
+    def __init__(self, client, prefix: str = "mpcostpulse:snapshots"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    def _read_counter(self, key: str) -> int:
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def get_version(self, city: str) -> str:
+        generation = self._read_counter(self._key('generation'))
+        return f"{generation}.{self._read_counter(self._key('version', city))}"
+
+    def invalidate(self, city: Optional[str] = None):
+        if city:
+            self.client.incr(self._key('version', city))
+        else:
+            self.client.incr(self._key('generation'))
+
+    def load(self, city: str, version: str, max_age_seconds: float) -> Optional[CitySnapshot]:
+        payload = self.client.get(self._key('snapshot', city))
+        if payload is None:
+            return None
+
+        header, snapshot = unpack_snapshot(payload)
+        if not self._is_current(header, city, version, max_age_seconds):
+            return None
+        return snapshot
+
+    def save(self, city: str, version: str, snapshot: CitySnapshot):
+        self.client.set(self._key('snapshot', city), pack_snapshot(snapshot, version))
+
+
+def create_snapshot_store() -> SnapshotStore:
+    """Build the snapshot store selected by SNAPSHOT_CACHE_BACKEND"""
+    backend = settings.SNAPSHOT_CACHE_BACKEND
+    if backend == "mmap":
+        return MmapSnapshotStore(settings.SNAPSHOT_CACHE_DIR)
+    if backend == "redis":
+        import redis
+        return RedisSnapshotStore(redis.Redis.from_url(settings.REDIS_URL))
+    return SnapshotStore()
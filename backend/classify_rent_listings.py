@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Classify every rent listing as fair or overpriced into rent_listing_classifications
+
+Usage:
+    python classify_rent_listings.py [--city Bhopal] [--page-size 1000]
+
+Listings are read in keyset-paginated pages and classified in large batches
+with the fine-tuned rent classifier (or the rule-based fallback when no model
+can be loaded); the dashboard reads the stored labels.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import logging
+from app.core.database import SessionLocal, init_db
+from app.services.ml_service import MLService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify rent listings into rent_listing_classifications")
+    parser.add_argument("--city", help="Only listings of localities in this city")
+    parser.add_argument("--page-size", type=int, default=None, help="Listings per page and commit")
+    args = parser.parse_args()
+    
+    init_db()  # Ensure tables exist
+    ml_service = MLService()
+    lock = ml_service.acquire_rent_classification_lock()
+    if lock is None:
+        logger.error("❌ A rent classification run is already in progress")
+        sys.exit(1)
+    db = SessionLocal()
+    try:
+        for record in ml_service.iter_classify_rent_listings(db, city=args.city, page_size=args.page_size):
+            if record['event'] == 'progress':
+                logger.info(
+                    f"Classified {record['processed']}/{record['total']} listings "
+                    f"(up to id {record['last_listing_id']})"
+                )
+            elif record['event'] == 'error':
+                logger.error(f"❌ Stopped after {record['processed']} listings: {record['error']}")
+                sys.exit(1)
+            else:
+                logger.info(
+                    f"\n✅ Classified {record['processed']} listings with {record['model_name']} "
+                    f"in {record['elapsed_seconds']}s"
+                )
+                logger.info(f"   Fair: {record['fair']}, overpriced: {record['overpriced']}")
+    finally:
+        db.close()
+        ml_service.release_rent_classification_lock(lock)
+
+if __name__ == "__main__":
+    main()
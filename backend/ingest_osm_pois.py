@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Load points of interest from an OpenStreetMap extract into the pois table
+
+Usage:
+    python ingest_osm_pois.py madhya-pradesh-latest.osm.pbf [--replace]
+    python ingest_osm_pois.py export.geojson
+
+GeoJSON (Overpass Turbo / osmium export) is read with the standard library;
+.osm.pbf and .osm files need pyosmium (pip install osmium). Ways are stored
+at the centroid of their nodes; relations are skipped.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import json
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.core.database import SessionLocal, init_db
+from app.models.geospatial import PointOfInterest
+from app.services.geo_cache import geo_cache
+from app.services.poi_service import PoiService, classify
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _centroid(coordinates: List) -> Optional[Tuple[float, float]]:
+    """(lat, lon) mean of a GeoJSON coordinate list, however deeply nested"""
+    points = []
+    stack = [coordinates]
+    while stack:
+        item = stack.pop()
+        if item and isinstance(item[0], (int, float)):
+            points.append(item)
+        else:
+            stack.extend(item)
+    if not points:
+        return None
+    return (
+        sum(point[1] for point in points) / len(points),
+        sum(point[0] for point in points) / len(points)
+    )
+
+def _osm_ref(feature: Dict, properties: Dict) -> Optional[Tuple[str, int]]:
+    """(osm_type, osm_id) of a feature, from "node/123" style or @type/@id properties"""
+    ref = properties.get('@id', feature.get('id'))
+    if isinstance(ref, str) and '/' in ref:
+        osm_type, osm_id = ref.split('/', 1)
+        return osm_type, int(osm_id)
+    if ref is not None and properties.get('@type'):
+        return properties['@type'], int(ref)
+    return None
+
+def read_geojson(path: str) -> Iterator[Tuple[str, int, Dict, float, float]]:
+    """(osm_type, osm_id, tags, lat, lon) of every feature of a GeoJSON file"""
+    with open(path) as f:
+        collection = json.load(f)
+    
+    for feature in collection.get('features', []):
+        properties = feature.get('properties') or {}
+        ref = _osm_ref(feature, properties)
+        geometry = feature.get('geometry') or {}
+        point = _centroid(geometry.get('coordinates') or [])
+        if not ref or not point or ref[0] == 'relation':
+            continue
+        # osmtogeojson nests tags, osmium export keeps them flat
+        tags = properties.get('tags') or {k: v for k, v in properties.items() if not k.startswith('@')}
+        yield ref[0], ref[1], tags, point[0], point[1]
+
+def read_osm(path: str) -> Iterator[Tuple[str, int, Dict, float, float]]:
+    """(osm_type, osm_id, tags, lat, lon) of every POI node and way of a PBF/XML extract"""
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Reading .pbf/.osm extracts requires pyosmium: pip install osmium")
+    
+    # Only POIs are kept, a state extract has a few tens of thousands
+    elements = []
+    
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = dict(n.tags)
+            if classify(tags) and n.location.valid():
+                elements.append(('node', n.id, tags, n.location.lat, n.location.lon))
+        
+        def way(self, w):
+            tags = dict(w.tags)
+            if not classify(tags):
+                return
+            locations = [node.location for node in w.nodes if node.location.valid()]
+            if locations:
+                elements.append((
+                    'way', w.id, tags,
+                    sum(l.lat for l in locations) / len(locations),
+                    sum(l.lon for l in locations) / len(locations)
+                ))
+    
+    # locations=True resolves way node coordinates
+    Handler().apply_file(path, locations=True)
+    yield from elements
+
+def ingest(path: str, replace: bool = False, batch_size: int = 5000) -> Dict[str, int]:
+    """Load the POIs of an extract, committing every batch_size rows"""
+    reader = read_geojson if path.endswith(('.geojson', '.json')) else read_osm
+    source = os.path.basename(path)
+    counts: Dict[str, int] = {}
+    
+    db = SessionLocal()
+    try:
+        if replace:
+            deleted = db.query(PointOfInterest).delete(synchronize_session=False)
+            logger.info(f"Removed {deleted} existing POIs")
+        
+        batch = []
+        for osm_type, osm_id, tags, lat, lon in reader(path):
+            for category in classify(tags):
+                batch.append({
+                    'osm_type': osm_type,
+                    'osm_id': osm_id,
+                    'category': category,
+                    'name': tags.get('name'),
+                    'latitude': lat,
+                    'longitude': lon,
+                    'tags': tags,
+                    'source': source
+                })
+                counts[category] = counts.get(category, 0) + 1
+            
+            if len(batch) >= batch_size:
+                PoiService.upsert(db, batch)
+                db.commit()
+                batch = []
+                logger.info(f"  {sum(counts.values())} POIs loaded")
+        
+        PoiService.upsert(db, batch)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    
+    # Cached API answers would otherwise shadow the local index until they expire
+    PoiService.invalidate_availability()
+    for source in ('amenities', 'grocery'):
+        geo_cache.invalidate(source)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Load OSM points of interest into the pois table")
+    parser.add_argument("path", help="OSM extract (.osm.pbf, .osm, .geojson)")
+    parser.add_argument("--replace", action="store_true", help="Remove previously loaded POIs first")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per commit")
+    args = parser.parse_args()
+    
+    init_db()  # Ensure tables exist
+    counts = ingest(args.path, replace=args.replace, batch_size=args.batch_size)
+    
+    logger.info(f"\n{'='*60}")
+    for category, count in sorted(counts.items()):
+        logger.info(f"  {category}: {count}")
+    logger.info(f"✅ Loaded {sum(counts.values())} POIs from {args.path}")
+    logger.info(f"{'='*60}")
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,25 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
+@app.on_event("startup")
+def build_grocery_item_index():
+    """Build the in-memory grocery item index used by basket pricing"""
+    from app.services.grocery_matcher import grocery_matcher
+    grocery_matcher.warm()
+
+@app.on_event("startup")
+def expire_stale_refresh_jobs():
+    """Fail refresh jobs left pending or running by a worker that stopped"""
+    from app.core.database import SessionLocal
+    from app.services.refresh_executor import refresh_executor
+    db = SessionLocal()
+    try:
+        refresh_executor.expire_stale_jobs(db)
+    except Exception as e:
+        print(f"Stale refresh jobs not checked: {e}")
+    finally:
+        db.close()
+
 @app.get("/")
 async def root():
     return {"message": "MP Cost Pulse API", "version": "1.0.0"}
@@ -7,8 +7,7 @@ import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from app.core.database import SessionLocal
-from app.models.geospatial import Locality
-from app.services.neighborhood_service import NeighborhoodService
+from app.services.refresh_executor import RefreshExecutor
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -16,45 +15,39 @@ logger = logging.getLogger(__name__)
 
 MP_CITIES = ["Bhopal", "Indore", "Gwalior", "Jabalpur", "Ujjain", "Sagar", "Ratlam"]
 
+def _log_progress(job: dict):
+    logger.info(
+        f"  {job['processed_localities']}/{job['total_localities']} localities processed, "
+        f"{job['refreshed_count']} refreshed, {len(job['errors'])} errors"
+    )
+
 def refresh_all_cities():
     """Refresh neighborhood data for all MP cities"""
+    executor = RefreshExecutor()
     db = SessionLocal()
     
     try:
-        for city in MP_CITIES:
-            logger.info(f"\n{'='*60}")
-            logger.info(f"Refreshing {city}...")
-            logger.info(f"{'='*60}")
-            
-            localities = db.query(Locality).filter(Locality.city == city).all()
-            logger.info(f"Found {len(localities)} localities in {city}")
-            
-            for locality in localities:
-                try:
-                    logger.info(f"  Refreshing {locality.name}...")
-                    NeighborhoodService.aggregate_neighborhood_data(
-                        db=db,
-                        locality_id=locality.id,
-                        city=city
-                    )
-                    logger.info(f"  ✓ {locality.name} refreshed")
-                except Exception as e:
-                    logger.error(f"  ✗ Error refreshing {locality.name}: {e}")
-            
-            db.commit()
-            logger.info(f"✅ {city} completed")
-        
-        logger.info(f"\n{'='*60}")
-        logger.info("✅ All cities refreshed!")
-        logger.info(f"{'='*60}")
-        
+        job = executor.create_job(db, MP_CITIES)
+    finally:
+        db.close()
+    
+    logger.info(f"\n{'='*60}")
+    logger.info(f"Refreshing {', '.join(MP_CITIES)} (job {job.id})")
+    logger.info(f"{executor.max_workers} workers, {executor.batch_size} localities per batch")
+    logger.info(f"{'='*60}")
+    
+    try:
+        result = executor.run(job.id, on_progress=_log_progress)
     except Exception as e:
-        db.rollback()
         logger.error(f"❌ Error: {e}")
         raise
-    finally:
-        db.close()
+    
+    for error in result['errors']:
+        logger.error(f"  ✗ Error refreshing locality {error['locality_id']}: {error['error']}")
+    
+    logger.info(f"\n{'='*60}")
+    logger.info(f"✅ All cities refreshed! {result['refreshed_count']} neighborhoods updated")
+    logger.info(f"{'='*60}")
 
 if __name__ == "__main__":
     refresh_all_cities()
-
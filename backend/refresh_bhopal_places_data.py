@@ -36,7 +36,7 @@ def refresh_bhopal_places_data():
         for locality in localities:
             try:
                 logger.info(f"Refreshing {locality.name}...")
-                NeighborhoodService.aggregate_neighborhood_data(db, locality.id, 'Bhopal')
+                NeighborhoodService.aggregate_neighborhood_data(db, locality.id, 'Bhopal', force=True)
                 updated += 1
                 logger.info(f"  ✓ Updated {locality.name}")
             except Exception as e:
@@ -0,0 +1,50 @@
+"""
+Basket pricing of candidate items per locality and store policy
+"""
+import pytest
+from app.services.basket_pricing import BasketCandidates, BasketPricingService
+
+# (locality_id, store_id, item_id, price), ordered by locality, store and item id
+ROWS = [
+    (1, 10, 1, 50.0),   # Rice
+    (1, 11, 2, 40.0),   # Rice
+    (1, 10, 15, 10.0),  # Coriander bunch (Vegetables)
+    (1, 10, 8, 30.0),   # Tomatoes (Vegetables)
+    (1, 11, 18, 40.0),  # Onions (Vegetables)
+    (2, 20, 2, 45.0),   # Rice
+]
+ROWS.sort(key=lambda row: (row[0], row[1], row[2]))
+
+RESOLVED = {
+    "Rice": frozenset({1, 2}),
+    "Vegetables": frozenset({8, 15, 18}),
+}
+
+
+@pytest.fixture
+def candidates():
+    return BasketCandidates(ROWS)
+
+
+@pytest.mark.parametrize("policy, expected", [("first", 50.0), ("cheapest", 40.0), ("median", 45.0)])
+def test_store_policies(candidates, policy, expected):
+    costs = BasketPricingService.price(candidates, [{"name": "Rice", "quantity": 1}], RESOLVED, policy)
+    assert costs == {1: expected, 2: 45.0}
+
+
+@pytest.mark.parametrize("policy", ["first", "cheapest", "median"])
+def test_category_lines_use_median_price(candidates, policy):
+    costs = BasketPricingService.price(candidates, [{"name": "Vegetables", "quantity": 30}], RESOLVED, policy)
+    # Median of 10, 30 and 40, not the first (a 10.0 coriander bunch) or the cheapest
+    assert costs == {1: 30 * 30.0, 2: 0.0}
+
+
+def test_quantities_and_missing_items(candidates):
+    basket = [{"name": "Rice", "quantity": 10}, {"name": "Milk", "quantity": 30}]
+    costs = BasketPricingService.price(candidates, basket, RESOLVED, "cheapest")
+    assert costs == {1: 400.0, 2: 450.0}
+
+
+def test_unknown_policy(candidates):
+    with pytest.raises(ValueError):
+        BasketPricingService.price(candidates, [], RESOLVED, "random")
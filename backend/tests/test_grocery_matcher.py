@@ -0,0 +1,118 @@
+"""
+Matching rules of the grocery matcher, checked against a small item corpus
+"""
+import pytest
+from app.services.grocery_matcher import GroceryMatcher, matches, tokenize
+
+# (id, name, category) items as they come from grocery_items
+CORPUS = [
+    (1, "India Gate Basmati Rice", "Staples"),
+    (2, "Sona Masoori Rice 5kg", "Staples"),
+    (3, "Price Tag Sticker Roll", "Household"),
+    (4, "Fortune Rice Bran Oil", "Edible Oils"),
+    (5, "Rice-Flour", "Staples"),
+    (6, "Aashirvaad Atta", "Staples"),
+    (7, "Whole Wheat Flour", "Staples"),
+    (8, "Tomatoes", "Vegetables"),
+    (9, "Kissan Tomato Ketchup", "Sauces"),
+    (10, "Farm Fresh Eggs", "Dairy & Eggs"),
+    (11, "Amul Taaza Milk", "Dairy & Eggs"),
+    (12, "Cadbury Dairy Milk Chocolate", "Snacks"),
+    (13, "Fortune Sunflower Oil", "Edible Oils"),
+    (14, "Parachute Coconut Hair Oil", "Personal Care"),
+    (15, "Coriander Bunch", "Vegetables"),
+    (16, "Banana Robusta", "Fruits"),
+    (17, "Real Fruit Juice", "Beverages"),
+    (18, "Onions", "Vegetables"),
+]
+
+
+@pytest.fixture
+def matcher():
+    matcher = GroceryMatcher()
+    matcher.build(CORPUS)
+    return matcher
+
+
+def test_tokenize_singularizes_and_splits_on_punctuation():
+    assert tokenize("Tomatoes") == ("tomato",)
+    assert tokenize("Farm Fresh Eggs") == ("farm", "fresh", "egg")
+    assert tokenize("Rice-Flour") == ("rice", "flour")
+
+
+@pytest.mark.parametrize("item_name", ["India Gate Basmati Rice", "Sona Masoori Rice 5kg", "Chawal"])
+def test_rice_matches_rice_items(item_name):
+    assert matches(item_name, "Rice")
+
+
+def test_whole_words_only():
+    assert not matches("Price Tag Sticker Roll", "Rice")
+
+
+@pytest.mark.parametrize("item_name", ["Fortune Rice Bran Oil", "Rice-Flour"])
+def test_excluded_phrases_are_not_rice(item_name):
+    assert not matches(item_name, "Rice")
+
+
+def test_rice_bran_oil_is_cooking_oil():
+    assert matches("Fortune Rice Bran Oil", "Cooking Oil")
+    assert not matches("Parachute Coconut Hair Oil", "Cooking Oil")
+
+
+def test_plurals():
+    assert matches("Tomatoes", "Tomato")
+    assert matches("Farm Fresh Eggs", "Eggs")
+    assert matches("Onions", "Onion")
+    assert not matches("Kissan Tomato Ketchup", "Tomato")
+
+
+def test_hindi_names():
+    assert matches("Aashirvaad Atta", "Wheat")
+    assert matches("Aashirvaad Atta", "Atta")
+    assert matches("Chawal", "Rice")
+
+
+def test_category_matching():
+    assert matches("Coriander Bunch", "Vegetables", category="Vegetables")
+    assert matches("Banana Robusta", "Fruits", category="Fruits")
+    assert not matches("Coriander Bunch", "Fruits", category="Vegetables")
+    assert not matches("Real Fruit Juice", "Fruits", category="Beverages")
+
+
+def test_unknown_names_match_as_their_own_phrase():
+    assert matches("Amul Taaza Milk", "Taaza Milk")
+    assert not matches("Amul Taaza Milk", "Toned Milk")
+
+
+def test_resolve_rice(matcher):
+    assert matcher.resolve("Rice") == {1, 2}
+
+
+def test_resolve_applies_exclusions(matcher):
+    assert matcher.resolve("Milk") == {11}
+    assert matcher.resolve("Tomato") == {8}
+    assert matcher.resolve("Cooking Oil") == {4, 13}
+
+
+def test_resolve_plurals_and_hindi_names(matcher):
+    assert matcher.resolve("Eggs") == {10}
+    assert matcher.resolve("Tomatoes") == {8}
+    assert matcher.resolve("Wheat") == {6, 7}
+    assert matcher.resolve("Atta") == matcher.resolve("Wheat")
+
+
+def test_resolve_categories(matcher):
+    assert matcher.resolve("Vegetables") == {8, 15, 18}
+    assert matcher.resolve("Fruits") == {16}
+
+
+def test_resolve_agrees_with_matches(matcher):
+    for name in ["Rice", "Wheat", "Milk", "Eggs", "Onion", "Potato", "Tomato", "Cooking Oil", "Vegetables", "Fruits"]:
+        expected = {item_id for item_id, item_name, category in CORPUS if matches(item_name, name, category)}
+        assert matcher.resolve(name) == expected, name
+
+
+def test_build_clears_resolved_cache(matcher):
+    assert matcher.resolve("Rice") == {1, 2}
+    matcher.build(CORPUS + [(19, "Brown Rice", "Staples")])
+    assert matcher.resolve("Rice") == {1, 2, 19}
@@ -0,0 +1,56 @@
+"""
+Micro-batching of concurrent calls, failure isolation and timeouts
+"""
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+from app.ml.micro_batcher import MicroBatcher
+
+
+def double_all(items):
+    if any(item == "bad" for item in items):
+        raise ValueError("bad item")
+    return [item * 2 for item in items]
+
+
+def test_concurrent_calls_share_batches():
+    batcher = MicroBatcher(double_all, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(8)]
+    assert [future.result(5) for future in futures] == [i * 2 for i in range(8)]
+    assert batcher.stats()['batches'] < 8
+
+
+def test_failing_item_only_fails_its_caller():
+    batcher = MicroBatcher(double_all, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit(item) for item in (1, "bad", 3)]
+    assert futures[0].result(5) == 2
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 6
+    assert batcher.stats()['failed_batches'] == 1
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: [], max_batch_size=1)
+    with pytest.raises(RuntimeError):
+        batcher(1, timeout=5)
+
+
+def test_timeout_drops_queued_item():
+    release = threading.Event()
+    seen = []
+
+    def slow(items):
+        seen.extend(items)
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit("first")
+    with pytest.raises(FutureTimeoutError):
+        batcher("second", timeout=0.05)
+    release.set()
+    assert first.result(5) == "first"
+    assert batcher("third", timeout=5) == "third"
+    assert "second" not in seen
@@ -0,0 +1,57 @@
+"""
+Places API daily quota kept in the geo cache stores
+"""
+from datetime import datetime
+
+import pytest
+from app.services.geo_cache import GeoCacheStore, SqliteGeoCacheStore
+from app.services.places import PlacesQuota, PlacesQuotaExceeded
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteGeoCacheStore(str(tmp_path / "geo_cache.sqlite3"))
+    return GeoCacheStore()
+
+
+def test_acquire_until_limit(store):
+    quota = PlacesQuota(3, store=store)
+    for _ in range(3):
+        quota.acquire()
+    assert quota.remaining() == 0
+    with pytest.raises(PlacesQuotaExceeded):
+        quota.acquire()
+    assert quota.remaining() == 0
+
+
+def test_no_limit(store):
+    quota = PlacesQuota(0, store=store)
+    for _ in range(5):
+        quota.acquire()
+    assert quota.remaining() is None
+
+
+def test_quotas_sharing_a_store_share_the_budget(store):
+    first = PlacesQuota(2, store=store)
+    second = PlacesQuota(2, store=store)
+    first.acquire()
+    second.acquire()
+    with pytest.raises(PlacesQuotaExceeded):
+        first.acquire()
+
+
+def test_sqlite_counter_is_shared_across_connections(tmp_path):
+    path = str(tmp_path / "geo_cache.sqlite3")
+    PlacesQuota(2, store=SqliteGeoCacheStore(path)).acquire()
+    quota = PlacesQuota(2, store=SqliteGeoCacheStore(path))
+    assert quota.remaining() == 1
+    quota.acquire()
+    with pytest.raises(PlacesQuotaExceeded):
+        quota.acquire()
+
+
+def test_budget_is_keyed_by_utc_date(store):
+    quota = PlacesQuota(1, store=store)
+    assert quota._key().startswith("google_places:")
+    assert quota._key().endswith(datetime.utcnow().date().isoformat())
@@ -24,18 +24,10 @@ def update_all_bhopal_stats():
         localities = db.query(Locality).filter(Locality.city == 'Bhopal').all()
         logger.info(f"Found {len(localities)} Bhopal localities")
         
-        updated = 0
-        for locality in localities:
-            try:
-                logger.info(f"Updating stats for {locality.name}...")
-                GeospatialService.update_locality_stats(db, locality.id)
-                updated += 1
-                logger.info(f"  ✓ Updated {locality.name}")
-            except Exception as e:
-                logger.error(f"  ✗ Error updating {locality.name}: {e}")
-        
-        db.commit()
-        logger.info(f"\n✅ Updated stats for {updated} localities")
+        # One set-based pass over every locality of the city
+        result = GeospatialService.update_locality_stats_bulk(db, city='Bhopal')
+        logger.info(f"\n✅ Updated stats for {result['localities_updated']} localities")
+        logger.info(f"   Updated rent of {result['neighborhoods_updated']} neighborhoods")
         
         # Show summary
         from app.models.geospatial import LocalityStats
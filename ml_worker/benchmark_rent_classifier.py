@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for rent classifier inference
+Compares one forward pass per request with micro-batched inference under
+concurrent load, in-process on CPU, or load-tests a running API.
+
+Usage:
+    python benchmark_rent_classifier.py --requests 256 --concurrency 16
+    python benchmark_rent_classifier.py --max-batch-size 32 --max-wait-ms 10
+    python benchmark_rent_classifier.py --url http://localhost:8000 --listing-ids 1-200
+"""
+import sys
+import os
+sys.path.insert(0, '/app/backend')
+sys.path.insert(0, '/app')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOCALITIES = ["Arera Colony", "MP Nagar", "Kolar Road", "Vijay Nagar", "Civil Lines", "Freeganj"]
+AMENITIES = ["parking", "power backup", "lift", "24x7 water supply", "gated society", "park facing", "modular kitchen"]
+
+
+def sample_listings(count: int, seed: int = 42) -> List[Dict]:
+    """Synthetic listings with descriptions of varied length, like real ads"""
+    rng = random.Random(seed)
+    listings = []
+    for i in range(count):
+        bhk = rng.choice([1, 2, 3])
+        locality = rng.choice(LOCALITIES)
+        features = rng.sample(AMENITIES, rng.randint(0, len(AMENITIES)))
+        description = f"Spacious {bhk}BHK in {locality}. " + " ".join(
+            f"Includes {feature}." for feature in features
+        ) * rng.randint(1, 6)
+        listings.append({
+            'title': f"{bhk}BHK apartment for rent in {locality}",
+            'description': description,
+            'property_type': f"{bhk}BHK",
+            'area_sqft': rng.randint(450, 1800),
+            'furnished': rng.choice(['furnished', 'semi-furnished', 'unfurnished']),
+            'rent_amount': rng.randint(6000, 30000),
+        })
+    return listings
+
+
+def run_load(call: Callable, items: List, concurrency: int) -> Dict:
+    """Send every item through call from concurrency threads, return throughput and latency"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(item):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(item)
+        except Exception as e:
+            with lock:
+                errors += 1
+            logger.debug(f"Request failed: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, items))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'requests': len(items),
+        'errors': errors,
+        'elapsed_seconds': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def log_result(name: str, result: Dict):
+    logger.info(
+        f"{name:<12} {result['throughput_rps']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+        f"errors {result['errors']}"
+    )
+
+
+def benchmark_in_process(args):
+    """Unbatched vs micro-batched inference on the same classifier"""
+    import torch
+    from app.ml.rent_classifier import RentClassifier
+    from app.ml.micro_batcher import MicroBatcher
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model_path = args.model_path if args.model_path and Path(args.model_path).exists() else None
+    logger.info(f"Loading rent classifier ({model_path or 'pretrained distilbert-base-uncased'}) on CPU")
+    classifier = RentClassifier(model_path, device='cpu')
+
+    listings = sample_listings(args.requests)
+    items = [(listing, listing['rent_amount'] * 0.9) for listing in listings]
+
+    # Warm up both paths so one-off allocations do not count
+    classifier.classify_batch(listings[:args.max_batch_size])
+    classifier.classify(*items[0])
+
+    logger.info(
+        f"{args.requests} requests, concurrency {args.concurrency}, torch threads {torch.get_num_threads()}"
+    )
+    unbatched = run_load(lambda item: classifier.classify(*item), items, args.concurrency)
+    log_result("unbatched", unbatched)
+
+    batcher = MicroBatcher(
+        lambda batch: classifier.classify_batch([listing for listing, _ in batch], [avg for _, avg in batch]),
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        name="benchmark-batcher"
+    )
+    batched = run_load(batcher, items, args.concurrency)
+    log_result("batched", batched)
+
+    stats = batcher.stats()
+    logger.info(
+        f"Micro-batching: max batch {args.max_batch_size}, max wait {args.max_wait_ms} ms, "
+        f"{stats['batches']} batches, avg batch size {stats['avg_batch_size']:.1f}"
+    )
+    if unbatched['throughput_rps']:
+        logger.info(f"Speedup: {batched['throughput_rps'] / unbatched['throughput_rps']:.2f}x")
+
+
+def parse_ids(spec: str) -> List[int]:
+    """Listing ids from '1-200' or '3,5,8'"""
+    if '-' in spec:
+        first, last = spec.split('-', 1)
+        return list(range(int(first), int(last) + 1))
+    return [int(value) for value in spec.split(',') if value]
+
+
+def benchmark_http(args):
+    """Concurrent requests against POST /api/v1/ml/classify-rent/{listing_id} of a running API"""
+    import requests
+
+    listing_ids = parse_ids(args.listing_ids)
+    items = [listing_ids[i % len(listing_ids)] for i in range(args.requests)]
+    local = threading.local()
+
+    def classify(listing_id: int):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.post(f"{args.url.rstrip('/')}/api/v1/ml/classify-rent/{listing_id}", timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    # The first request loads the model
+    classify(items[0])
+    logger.info(f"{args.requests} requests to {args.url}, concurrency {args.concurrency}")
+    log_result("http", run_load(classify, items, args.concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for rent classifier inference")
+    parser.add_argument("--requests", type=int, default=256, help="Requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--max-batch-size", type=int, default=16, help="Listings per forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits to fill")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads, 0 for torch's default")
+    parser.add_argument("--model-path", default="/app/models/rent_classifier/latest", help="Fine-tuned model")
+    parser.add_argument("--url", help="Benchmark a running API instead of the model in-process")
+    parser.add_argument("--listing-ids", default="1-100", help="Listing ids for --url, e.g. 1-200 or 3,5,8")
+    args = parser.parse_args()
+
+    if args.url:
+        benchmark_http(args)
+    else:
+        benchmark_in_process(args)
+
+
+if __name__ == "__main__":
+    main()
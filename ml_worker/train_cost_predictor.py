@@ -21,6 +21,10 @@ from typing import List, Dict, Optional
 import json
 
 # Import scraping services
+from app.core.config import settings
+from app.services import overpass
+from app.services.geo_cache import GeoCache, geo_cache
+from app.services.poi_service import PoiService
 from app.services.scraping_service import (
     AQIScrapingService,
     DeliveryAvailabilityService,
@@ -79,52 +83,72 @@ def get_coordinates_from_nominatim(locality: str, city: str) -> tuple:
     
     return None, None
 
-def fetch_rent_from_public_apis(locality: str, city: str, latitude: float, longitude: float) -> Dict:
+def fetch_osm_elements(latitude: float, longitude: float, radius_km: float = 2.0) -> Optional[List[Dict]]:
+    """
+    Fetch every OSM class used for a locality in one batched Overpass query
+    Residential buildings always; amenities too unless the local POI index
+    or Google Places provides them
+    """
+    classes = dict(overpass.OSM_RESIDENTIAL_CLASSES)
+    if not getattr(settings, 'GOOGLE_PLACES_API_KEY', None) and not PoiService.local_available():
+        classes.update(overpass.OSM_AMENITY_CLASSES)
+    # Cached per grid cell, so repeated training runs skip Overpass
+    key = GeoCache.key('overpass', latitude, longitude, radius_km, ','.join(sorted(classes)))
+    cached = geo_cache.get('overpass', key)
+    if cached is not None:
+        return cached['elements']
+    try:
+        elements = overpass.fetch_elements(overpass.build_query(classes, around=(latitude, longitude, radius_km)))
+        geo_cache.set('overpass', key, {'elements': elements, 'source': 'overpass_api'})
+        return elements
+    except Exception as e:
+        logger.warning(f"Error fetching OSM data from Overpass API: {e}")
+        return None
+
+def fetch_rent_from_public_apis(
+    locality: str,
+    city: str,
+    latitude: float,
+    longitude: float,
+    osm_elements: Optional[List[Dict]] = None
+) -> Dict:
     """
     Fetch real rent data from public APIs
     Uses Overpass API (OpenStreetMap) to find rental properties
+    osm_elements from fetch_osm_elements are reused instead of a separate query
     """
     try:
-        # Use Overpass API to find rental properties near the location
-        overpass_url = "https://overpass-api.de/api/interpreter"
+        # Residential buildings within 1 km, to estimate rent from area characteristics
+        if osm_elements is None:
+            osm_elements = overpass.fetch_elements(
+                overpass.build_query(overpass.OSM_RESIDENTIAL_CLASSES, around=(latitude, longitude, 1.0))
+            )
+        residential_buildings = overpass.count_by_class(
+            osm_elements, overpass.OSM_RESIDENTIAL_CLASSES, latitude, longitude, 1.0
+        )['residential_buildings']
         
-        # Query for residential buildings and estimate rent based on area characteristics
-        query = f"""
-        [out:json][timeout:25];
-        (
-          way["building"="residential"](around:1000,{latitude},{longitude});
-          relation["building"="residential"](around:1000,{latitude},{longitude});
-        );
-        out count;
-        """
+        # Estimate rent based on city and building density
+        # This is a simplified approach - in production, you'd use actual rental APIs
+        base_rents = {
+            "Bhopal": {"1BHK": 8000, "2BHK": 12000, "3BHK": 18000},
+            "Indore": {"1BHK": 10000, "2BHK": 15000, "3BHK": 22000},
+            "Gwalior": {"1BHK": 7000, "2BHK": 11000, "3BHK": 16000},
+            "Jabalpur": {"1BHK": 7500, "2BHK": 11500, "3BHK": 17000},
+            "Ujjain": {"1BHK": 6000, "2BHK": 9000, "3BHK": 13000},
+        }
         
-        response = requests.post(overpass_url, data=query, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
-            residential_buildings = len(data.get('elements', []))
-            
-            # Estimate rent based on city and building density
-            # This is a simplified approach - in production, you'd use actual rental APIs
-            base_rents = {
-                "Bhopal": {"1BHK": 8000, "2BHK": 12000, "3BHK": 18000},
-                "Indore": {"1BHK": 10000, "2BHK": 15000, "3BHK": 22000},
-                "Gwalior": {"1BHK": 7000, "2BHK": 11000, "3BHK": 16000},
-                "Jabalpur": {"1BHK": 7500, "2BHK": 11500, "3BHK": 17000},
-                "Ujjain": {"1BHK": 6000, "2BHK": 9000, "3BHK": 13000},
-            }
-            
-            city_rents = base_rents.get(city, base_rents["Bhopal"])
-            
-            # Adjust based on building density (more buildings = more competition = slightly lower rent)
-            density_factor = min(1.1, 1.0 + (residential_buildings / 100) * 0.1)
-            
-            return {
-                "avg_rent_1bhk": city_rents["1BHK"] * density_factor,
-                "avg_rent_2bhk": city_rents["2BHK"] * density_factor,
-                "avg_rent_3bhk": city_rents["3BHK"] * density_factor,
-                "residential_buildings": residential_buildings,
-                "source": "overpass_api"
-            }
+        city_rents = base_rents.get(city, base_rents["Bhopal"])
+        
+        # Adjust based on building density (more buildings = more competition = slightly lower rent)
+        density_factor = min(1.1, 1.0 + (residential_buildings / 100) * 0.1)
+        
+        return {
+            "avg_rent_1bhk": city_rents["1BHK"] * density_factor,
+            "avg_rent_2bhk": city_rents["2BHK"] * density_factor,
+            "avg_rent_3bhk": city_rents["3BHK"] * density_factor,
+            "residential_buildings": residential_buildings,
+            "source": "overpass_api"
+        }
     except Exception as e:
         logger.warning(f"Error fetching rent data from Overpass API: {e}")
     
@@ -182,14 +206,21 @@ def fetch_grocery_cost_from_public_apis(latitude: float, longitude: float, city:
         logger.warning(f"Error estimating grocery cost: {e}")
         return 4500.0
 
-def fetch_transport_cost_from_public_apis(latitude: float, longitude: float, city: str) -> float:
+def fetch_transport_cost_from_public_apis(
+    latitude: float,
+    longitude: float,
+    city: str,
+    osm_elements: Optional[List[Dict]] = None
+) -> float:
     """
     Estimate transport cost based on connectivity
     Uses amenities API to check bus stops and transport infrastructure
     """
     try:
         # Get amenities to check transport connectivity
-        amenities = AmenitiesService.get_nearby_amenities(latitude, longitude, city, radius_km=1.0)
+        amenities = AmenitiesService.get_nearby_amenities(
+            latitude, longitude, city, radius_km=1.0, osm_elements=osm_elements
+        )
         
         # Base costs by city
         base_costs = {
@@ -248,10 +279,14 @@ def fetch_all_neighborhood_data_from_public_apis(
         data["aqi_value"] = 50
         data["aqi_category"] = "Moderate"
     
+    # One batched Overpass query for every OSM class used below
+    logger.info(f"      Fetching OSM data...")
+    osm_elements = fetch_osm_elements(latitude, longitude, radius_km=2.0)
+    
     # 2. Fetch Rent Data - REAL API DATA
     try:
         logger.info(f"      Fetching rent data...")
-        rent_data = fetch_rent_from_public_apis(locality, city, latitude, longitude)
+        rent_data = fetch_rent_from_public_apis(locality, city, latitude, longitude, osm_elements=osm_elements)
         data["avg_rent_1bhk"] = rent_data.get("avg_rent_1bhk", 0)
         data["avg_rent_2bhk"] = rent_data.get("avg_rent_2bhk", 0)
         data["avg_rent_3bhk"] = rent_data.get("avg_rent_3bhk", 0)
@@ -260,15 +295,21 @@ def fetch_all_neighborhood_data_from_public_apis(
     except Exception as e:
         logger.warning(f"      Error fetching rent: {e}")
     
-    # 3. Fetch Hospitals - REAL API DATA
+    # 3. Fetch Hospitals and other amenities - REAL API DATA
     try:
-        logger.info(f"      Fetching hospitals data...")
-        amenities = AmenitiesService.get_nearby_amenities(latitude, longitude, city, radius_km=2.0)
+        logger.info(f"      Fetching amenities data...")
+        amenities = AmenitiesService.get_nearby_amenities(
+            latitude, longitude, city, radius_km=2.0, osm_elements=osm_elements
+        )
         data["hospitals_count"] = amenities.get("hospitals_count", 0)
         data["amenities_source"] = amenities.get("source", "unknown")
-        time.sleep(0.5)
+        data["schools_count"] = amenities.get("schools_count", 0)
+        data["parks_count"] = amenities.get("parks_count", 0)
+        data["shopping_malls_count"] = amenities.get("shopping_malls_count", 0)
+        data["bus_stops_count"] = amenities.get("bus_stops_count", 0)
+        data["metro_stations_count"] = amenities.get("metro_stations_count", 0)
     except Exception as e:
-        logger.warning(f"      Error fetching hospitals: {e}")
+        logger.warning(f"      Error fetching amenities: {e}")
         data["hospitals_count"] = 0
     
     # 4. Fetch Food & Beverages (Restaurants) - REAL API DATA
@@ -290,22 +331,13 @@ def fetch_all_neighborhood_data_from_public_apis(
     # 5. Fetch Cleanliness (Hygiene Indicators) - REAL API DATA
     # Already included in restaurant ratings above
     
-    # 6. Fetch Other Amenities - REAL API DATA
-    try:
-        logger.info(f"      Fetching other amenities...")
-        amenities = AmenitiesService.get_nearby_amenities(latitude, longitude, city, radius_km=2.0)
-        data["schools_count"] = amenities.get("schools_count", 0)
-        data["parks_count"] = amenities.get("parks_count", 0)
-        data["shopping_malls_count"] = amenities.get("shopping_malls_count", 0)
-        data["bus_stops_count"] = amenities.get("bus_stops_count", 0)
-        data["metro_stations_count"] = amenities.get("metro_stations_count", 0)
-        time.sleep(0.5)
-    except Exception as e:
-        logger.warning(f"      Error fetching amenities: {e}")
+    # 6. Other amenities are included in step 3
     
     # 7. Fetch Grocery and Transport Costs
     data["avg_grocery_cost"] = fetch_grocery_cost_from_public_apis(latitude, longitude, city)
-    data["avg_transport_cost"] = fetch_transport_cost_from_public_apis(latitude, longitude, city)
+    data["avg_transport_cost"] = fetch_transport_cost_from_public_apis(
+        latitude, longitude, city, osm_elements=osm_elements
+    )
     
     # 8. Fetch Delivery Availability
     try: